@@ -10,32 +10,111 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import glob
 import os
+import sys
+from importlib.util import find_spec
 from pathlib import Path
-from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-load_dotenv(BASE_DIR / ".env")
+# Everything below is configured from the environment. A .env file is only
+# read (and python-dotenv only imported) when one exists; real deployments
+# set the variables directly.
+if (BASE_DIR / ".env").exists() and find_spec("dotenv"):
+    from dotenv import load_dotenv
 
-OWM_API_KEY = os.getenv("OWM_API_KEY")
-if not OWM_API_KEY:
-    raise RuntimeError("OWM_API_KEY not found in environment or .env file")
+    load_dotenv(BASE_DIR / ".env")
+
+
+def env_bool(name, default):
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_list(name, default=""):
+    return [item.strip() for item in os.getenv(name, default).split(",") if item.strip()]
+
+
+# Only import_precipitation needs the key; it checks for it when it runs
+OWM_API_KEY = os.getenv("OWM_API_KEY", "")
+
+# Daily forecast endpoint; point it at a local stub for benchmarks
+OWM_FORECAST_URL = os.getenv(
+    "OWM_FORECAST_URL", "https://pro.openweathermap.org/data/2.5/forecast/daily"
+)
+
+# OWM request budget of one import run, shared by all of its shards and
+# worker processes (each of n concurrent shards gets 1/n of it): requests in
+# flight and request starts per second (0: no pacing).
+OWM_MAX_CONCURRENT = int(os.getenv("OWM_MAX_CONCURRENT", "50"))
+OWM_REQUESTS_PER_SECOND = float(os.getenv("OWM_REQUESTS_PER_SECOND", "50"))
+
+# Jobs for `manage.py run_scheduler` (cron syntax, local time)
+SCHEDULER_JOBS = [
+    {
+        "name": "import_precipitation",
+        "schedule": os.getenv("IMPORT_SCHEDULE", "5 * * * *"),
+        "command": "import_precipitation",
+        "args": ["--record-history"],
+        "overlap": "skip",
+    },
+]
+
+# Which watershed aggregation drives Watershed.warning_level: "mean" (plain
+# mean of its cities), "population" or "area" (Voronoi-area weighted).
+# The weighted levels are always stored alongside.
+WATERSHED_WARNING_MODE = os.getenv("WATERSHED_WARNING_MODE", "mean")
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = "django-insecure-=n-7w5vr$z#l$^6)u$9sacp)^=3hko*nl#)jcjeh3-yrp4*-g+"
+SECRET_KEY = os.getenv(
+    "DJANGO_SECRET_KEY",
+    "django-insecure-=n-7w5vr$z#l$^6)u$9sacp)^=3hko*nl#)jcjeh3-yrp4*-g+",
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
-
-ALLOWED_HOSTS = []
-
-GDAL_LIBRARY_PATH = r"C:\Program Files\PostgreSQL\17\bin\libgdal-35.dll"
-GEOS_LIBRARY_PATH = r"C:\Program Files\PostgreSQL\17\bin\libgeos_c.dll"
+DEBUG = env_bool("DJANGO_DEBUG", True)
+
+ALLOWED_HOSTS = env_list("DJANGO_ALLOWED_HOSTS")
+
+
+def find_library(env_var, patterns, windows_default):
+    """
+    GDAL/GEOS shared library: the env var if set, else the first match of
+    `patterns` in the usual library directories (cheaper than Django's
+    ctypes.util.find_library, which shells out to ldconfig on Linux), else
+    None to let Django search itself.
+    """
+    if os.getenv(env_var):
+        return os.getenv(env_var)
+    if os.name == "nt":
+        return windows_default if os.path.exists(windows_default) else None
+    prefixes = [sys.prefix, os.getenv("CONDA_PREFIX", "")]
+    directories = [os.path.join(p, "lib") for p in prefixes if p] + [
+        "/usr/lib/x86_64-linux-gnu", "/usr/lib/aarch64-linux-gnu", "/usr/local/lib",
+        "/usr/lib64", "/usr/lib", "/opt/homebrew/lib",
+    ]
+    for directory in directories:
+        for pattern in patterns:
+            matches = sorted(glob.glob(os.path.join(directory, pattern)))
+            if matches:
+                return matches[-1]
+    return None
+
+
+GDAL_LIBRARY_PATH = find_library(
+    "GDAL_LIBRARY_PATH",
+    ["libgdal.so", "libgdal.so.[0-9]*", "libgdal.dylib"],
+    r"C:\Program Files\PostgreSQL\17\bin\libgdal-35.dll",
+)
+GEOS_LIBRARY_PATH = find_library(
+    "GEOS_LIBRARY_PATH",
+    ["libgeos_c.so", "libgeos_c.so.[0-9]*", "libgeos_c.dylib"],
+    r"C:\Program Files\PostgreSQL\17\bin\libgeos_c.dll",
+)
 
 # Application definition
 
@@ -55,6 +134,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware', 
+    "dashboard_app.middleware.PerformanceMiddleware",
+    # brotli/gzip; below PerformanceMiddleware so the recorded size is the wire size
+    "dashboard_app.middleware.CompressionMiddleware",
+    "dashboard_app.middleware.ReadYourWritesMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -90,16 +173,58 @@ WSGI_APPLICATION = "dashboard.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    "default": {
+# Connection reuse: with psycopg 3 + psycopg_pool installed every worker keeps a
+# pool of open connections per alias (required for the async views, where
+# persistent connections are not reused across requests). Otherwise fall back
+# to persistent psycopg2 connections kept open for CONN_MAX_AGE seconds.
+HAS_PSYCOPG_POOL = bool(find_spec("psycopg") and find_spec("psycopg_pool"))
+
+
+def database(prefix, fallback="DB_"):
+    """
+    One DATABASES entry from `<prefix>NAME/USER/PASSWORD/HOST/PORT` and
+    `<prefix>POOL_MIN_SIZE/POOL_MAX_SIZE/POOL_TIMEOUT/CONN_MAX_AGE`; unset
+    values fall back to the `<fallback>…` variables, then to the defaults.
+    """
+    def get(name, default):
+        return os.getenv(prefix + name, os.getenv(fallback + name, default))
+
+    db = {
         "ENGINE": "django.contrib.gis.db.backends.postgis",
-        "NAME": "dashboard_db",
-        "USER": "postgres",
-        "PASSWORD": "password",
-        "HOST": "localhost",
-        "PORT": 5432,
+        "NAME": get("NAME", "dashboard_db"),
+        "USER": get("USER", "postgres"),
+        "PASSWORD": get("PASSWORD", "password"),
+        "HOST": get("HOST", "localhost"),
+        "PORT": int(get("PORT", "5432")),
+        "CONN_HEALTH_CHECKS": True,
     }
-}
+    pool_max_size = int(get("POOL_MAX_SIZE", "10"))
+    if pool_max_size > 0 and HAS_PSYCOPG_POOL:
+        db["CONN_MAX_AGE"] = 0
+        db["OPTIONS"] = {
+            "pool": {
+                "min_size": int(get("POOL_MIN_SIZE", "2")),
+                "max_size": pool_max_size,
+                "timeout": float(get("POOL_TIMEOUT", "10")),
+            }
+        }
+    else:
+        db["CONN_MAX_AGE"] = int(get("CONN_MAX_AGE", "60"))
+    return db
+
+
+DATABASES = {"default": database("DB_")}
+
+# Optional read replica (set DB_REPLICA_HOST, plus any DB_REPLICA_* override).
+# The read-only API views read from it (see dashboard_app.routers); writes,
+# management commands and clients that just wrote stay on the primary.
+REPLICA_DATABASE = "replica"
+REPLICA_PIN_SECONDS = int(os.getenv("DB_REPLICA_PIN_SECONDS", "10"))
+if os.getenv("DB_REPLICA_HOST"):
+    DATABASES[REPLICA_DATABASE] = database("DB_REPLICA_")
+    DATABASES[REPLICA_DATABASE]["TEST"] = {"MIRROR": "default"}
+
+DATABASE_ROUTERS = ["dashboard_app.routers.PrimaryReplicaRouter"]
 
 
 # Password validation
@@ -138,6 +263,16 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# Observability. Both expose internals (query counts/timings, per-view
+# traffic), so they are off unless DEBUG or explicitly enabled. Set
+# METRICS_TOKEN to require `Authorization: Bearer <token>` on /metrics.
+METRICS_ENABLED = env_bool("METRICS_ENABLED", DEBUG)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+SERVER_TIMING_ENABLED = env_bool("SERVER_TIMING_ENABLED", DEBUG)
+
+# Versioned bulk exports written by `manage.py export_snapshot`
+SNAPSHOT_ROOT = os.getenv("SNAPSHOT_ROOT", str(BASE_DIR / "snapshots"))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -18,7 +18,10 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from dashboard_app.views import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('dashboard_app.urls')),  # ⬅️ This is key
+    path('metrics', metrics_view, name='metrics'),
 ]
\ No newline at end of file
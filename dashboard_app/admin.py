@@ -1,3 +1,107 @@
 from django.contrib import admin
+from django.contrib.gis.admin import GISModelAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
-# Register your models here.
+from .models import AfricanCity, ImportRun, PrecipitationRecords, WarningRule, Watershed
+
+
+def estimated_count(model, using="default"):
+    """
+    Planner's row estimate from pg_class (kept current by (auto)ANALYZE);
+    None if the table has never been analyzed.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return row[0] if row and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Unfiltered changelists of big tables are paginated on the pg_class
+    estimate instead of an exact COUNT(*); filtered ones (usually small and
+    index-backed) still count exactly.
+    """
+    EXACT_BELOW = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model, using=queryset.db)
+            if estimate is not None and estimate >= self.EXACT_BELOW:
+                return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Defaults for tables with millions of rows: estimated page counts, no
+    "N total" count query, and the fields in `changelist_defer` (geometries)
+    loaded only by the change form, the one admin view that displays them;
+    the changelist, autocomplete lookups, delete and history pages skip them.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+    changelist_defer = ()
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        match = getattr(request, "resolver_match", None)
+        change_form = match is not None and (match.url_name or "").endswith("_change")
+        if self.changelist_defer and not change_form:
+            queryset = queryset.defer(*self.changelist_defer)
+        return queryset
+
+
+@admin.register(Watershed)
+class WatershedAdmin(LargeTableAdmin, GISModelAdmin):
+    list_display = ("name", "warning_level", "population_warning_level", "area_warning_level", "updated_version")
+    list_filter = ("warning_level",)
+    search_fields = ("name",)
+    ordering = ("name",)
+    changelist_defer = ("geom",)
+
+
+@admin.register(AfricanCity)
+class AfricanCityAdmin(LargeTableAdmin, GISModelAdmin):
+    list_display = ("city", "country", "country_code", "population", "warning_level", "watershed")
+    list_select_related = ("watershed",)
+    list_filter = ("warning_level", "country_code")
+    search_fields = ("city",)
+    ordering = ("city",)
+    autocomplete_fields = ("watershed",)
+    changelist_defer = ("location", "watershed__geom")
+
+
+@admin.register(PrecipitationRecords)
+class PrecipitationRecordsAdmin(LargeTableAdmin):
+    list_display = ("city", "date", "precipitation")
+    # __str__ of the record and of its city use the city row
+    list_select_related = ("city",)
+    search_fields = ("city__city",)
+    autocomplete_fields = ("city",)
+    changelist_defer = ("city__location",)
+
+
+@admin.register(WarningRule)
+class WarningRuleAdmin(admin.ModelAdmin):
+    list_display = ("name", "scope", "country_code", "watershed", "window_days",
+                    "orange_threshold", "red_threshold", "active")
+    list_filter = ("scope", "active")
+    list_select_related = ("watershed",)
+    autocomplete_fields = ("watershed",)
+
+
+@admin.register(ImportRun)
+class ImportRunAdmin(admin.ModelAdmin):
+    list_display = ("command", "started_at", "status", "duration_seconds")
+    list_filter = ("command", "status")
+    date_hierarchy = "started_at"
+    readonly_fields = ("run_id", "command", "status", "started_at", "finished_at", "duration_seconds", "report")
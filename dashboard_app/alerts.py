@@ -0,0 +1,417 @@
+# dashboard_app/alerts.py
+"""
+Warning-level recomputation for cities and watersheds.
+
+Thresholds and window lengths come from the WarningRule table (most
+specific rule wins: watershed → country → global → the defaults below).
+Evaluation is vectorized: the active precipitation records are read once
+into a city × day matrix, rolling-window maxima are computed with one
+cumulative sum for every row at once (each row with its own window length),
+and watershed series are the per-day means of their cities' rows.
+
+Watersheds get three levels: the plain mean of their cities, a
+population-weighted and a Voronoi-area-weighted mean (weights from
+weights.py); settings.WATERSHED_WARNING_MODE picks the one stored in
+`warning_level`, the others are kept alongside.
+
+Changed rows are written in a single UPDATE … FROM unnest, every
+warning_level transition is appended to the WarningChange log in a single
+INSERT, and changed rows are stamped with the dataset version (bumped on
+first change if the caller didn't pass one). The number of SQL statements is
+therefore independent of how many cities/watersheds exist.
+"""
+
+from collections import Counter, namedtuple
+from datetime import date
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import (
+    AfricanCity,
+    DatasetVersion,
+    PrecipitationRecords,
+    WarningChange,
+    WarningRule,
+    Watershed,
+)
+from .summary import rebuild_country_summaries
+from .weights import area_weights, refresh_area_weights
+
+WINDOW_DAYS = 4
+ORANGE_THRESHOLD = 10  # mm over the window
+RED_THRESHOLD = 40
+LEVELS = ("green", "orange", "red")
+WATERSHED_MODES = {"mean": "warning_level", "population": "population_warning_level", "area": "area_warning_level"}
+
+CHUNK_SIZE = 10_000
+
+Thresholds = namedtuple("Thresholds", "window_days orange red")
+DEFAULT_THRESHOLDS = Thresholds(WINDOW_DAYS, ORANGE_THRESHOLD, RED_THRESHOLD)
+
+
+def level_for(max_sum, thresholds=DEFAULT_THRESHOLDS):
+    if max_sum > thresholds.red:
+        return "red"
+    if max_sum > thresholds.orange:
+        return "orange"
+    return "green"
+
+
+# ── rules ─────────────────────────────────────────────────────────────────
+
+class RuleSet:
+    """The active WarningRules, indexed by scope for per-row resolution."""
+
+    def __init__(self, rules=()):
+        self.default = DEFAULT_THRESHOLDS
+        self.by_country = {}
+        self.by_watershed = {}
+        for rule in rules:
+            self.add(rule)
+
+    @classmethod
+    def load(cls, exclude=None):
+        rules = WarningRule.objects.filter(active=True).order_by("updated_at", "id")
+        if exclude is not None:
+            rules = rules.exclude(pk=exclude)
+        return cls(rules)
+
+    def add(self, rule):
+        """Add (or override with) one WarningRule; later rules win ties."""
+        thresholds = Thresholds(rule.window_days, rule.orange_threshold, rule.red_threshold)
+        if rule.scope == "watershed":
+            self.by_watershed[rule.watershed_id] = thresholds
+        elif rule.scope == "country":
+            self.by_country[rule.country_code] = thresholds
+        else:
+            self.default = thresholds
+
+    def for_city(self, country_code, watershed_id):
+        return (
+            self.by_watershed.get(watershed_id)
+            or self.by_country.get(country_code)
+            or self.default
+        )
+
+    def for_watershed(self, watershed_id):
+        return self.by_watershed.get(watershed_id) or self.default
+
+
+def _vectors(thresholds):
+    """[Thresholds] → (windows, orange, red) arrays."""
+    if not thresholds:
+        return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0)
+    windows, orange, red = zip(*thresholds)
+    return np.array(windows, dtype=np.int64), np.array(orange, dtype=float), np.array(red, dtype=float)
+
+
+# ── vectorized evaluation ─────────────────────────────────────────────────
+
+class PrecipitationMatrix:
+    """
+    Active precipitation records of `city_ids` as a city × day matrix
+    (`values`, missing days are 0) plus a mask of the cells that had a record.
+    """
+
+    def __init__(self, city_ids, values, present, first_day=None):
+        self.city_ids = city_ids
+        self.values = values
+        self.present = present
+        self.first_day = first_day
+
+    @classmethod
+    def load(cls, city_ids):
+        index = {pk: i for i, pk in enumerate(city_ids)}
+        rows, days, values = [], [], []
+        records = (
+            PrecipitationRecords.objects
+                .filter(precipitation__isnull=False)
+                .values_list("city_id", "date", "precipitation")
+                .iterator(chunk_size=CHUNK_SIZE)
+        )
+        for city_id, day, precip in records:
+            i = index.get(city_id)
+            if i is not None:
+                rows.append(i)
+                days.append(day.toordinal())
+                values.append(precip)
+
+        if not days:
+            shape = (len(city_ids), 0)
+            return cls(city_ids, np.zeros(shape), np.zeros(shape, dtype=bool))
+        first = min(days)
+        cols = np.array(days) - first
+        matrix = np.zeros((len(city_ids), int(cols.max()) + 1))
+        present = np.zeros(matrix.shape, dtype=bool)
+        matrix[rows, cols] = values
+        present[rows, cols] = True
+        return cls(city_ids, matrix, present, date.fromordinal(first))
+
+    def group_means(self, groups, n_groups, weights=None):
+        """
+        Per-day mean over the rows of each group (`groups[i]` is row i's group
+        index, -1 for none), counting only cells that had a record. With
+        `weights` (one per row) the mean is weighted; group-days whose rows
+        all have zero weight fall back to the plain mean.
+        """
+        member = groups >= 0
+        row_weights = np.ones(len(groups)) if weights is None else weights
+        cell_weights = self.present[member] * row_weights[member, None]
+        sums = np.zeros((n_groups, self.values.shape[1]))
+        totals = np.zeros_like(sums)
+        np.add.at(sums, groups[member], self.values[member] * cell_weights)
+        np.add.at(totals, groups[member], cell_weights)
+        means = np.divide(sums, totals, out=np.zeros_like(sums), where=totals > 0)
+        if weights is not None:
+            means = np.where(totals > 0, means, self.group_means(groups, n_groups))
+        return means
+
+
+def window_maxima(values, windows):
+    """
+    Largest rolling sum of each row of `values`, row i using a window of
+    `windows[i]` days (shorter prefixes included, never below 0).
+    """
+    n_rows, n_days = values.shape
+    if n_days == 0:
+        return np.zeros(n_rows)
+    csum = np.zeros((n_rows, n_days + 1))
+    np.cumsum(values, axis=1, out=csum[:, 1:])
+    ends = np.arange(1, n_days + 1)
+    starts = np.maximum(ends[None, :] - windows[:, None], 0)
+    sums = csum[:, 1:] - np.take_along_axis(csum, starts, axis=1)
+    # differences of cumulative sums carry float noise; keep the thresholds exact
+    return np.maximum(np.round(sums.max(axis=1), 6), 0.0)
+
+
+def classify(maxima, orange, red):
+    """Vectorized level_for: array of indexes into LEVELS."""
+    return np.where(maxima > red, 2, np.where(maxima > orange, 1, 0))
+
+
+def evaluate_cities(cities, matrix, rules):
+    """
+    cities: [(id, country_code, watershed_id)] in matrix row order.
+    Returns {city_id: level}.
+    """
+    windows, orange, red = _vectors([rules.for_city(code, ws) for _, code, ws in cities])
+    levels = classify(window_maxima(matrix.values, windows), orange, red)
+    return {pk: LEVELS[lvl] for (pk, _, _), lvl in zip(cities, levels.tolist())}
+
+
+def evaluate_watersheds(cities, matrix, rules, weights=None):
+    """
+    Levels of every watershed holding at least one of `cities` (same shape
+    as for evaluate_cities), from the daily mean of its cities, weighted by
+    `weights` ({city_id: weight}) if given.
+    """
+    watershed_ids = sorted({ws for _, _, ws in cities if ws is not None})
+    position = {ws: i for i, ws in enumerate(watershed_ids)}
+    groups = np.array([position.get(ws, -1) for _, _, ws in cities], dtype=np.int64)
+    row_weights = None
+    if weights is not None:
+        row_weights = np.array([weights.get(pk) or 0.0 for pk, _, _ in cities], dtype=float)
+    means = matrix.group_means(groups, len(watershed_ids), row_weights)
+    windows, orange, red = _vectors([rules.for_watershed(ws) for ws in watershed_ids])
+    levels = classify(window_maxima(means, windows), orange, red)
+    return {ws: LEVELS[lvl] for ws, lvl in zip(watershed_ids, levels.tolist())}
+
+
+# ── writing ───────────────────────────────────────────────────────────────
+
+def _apply_levels(model, entity_type, current, new_levels, version=None):
+    """
+    Write the levels that differ from `current` ({id: (name, {field: level})});
+    `new_levels` is {id: {field: level}} with the same fields for every row.
+    Changed rows are written in one UPDATE … FROM unnest and each
+    warning_level transition is logged. Returns the number of rows changed.
+    """
+    changed = {}
+    log = []
+    for pk, levels in new_levels.items():
+        if pk not in current:
+            continue  # row created after `current` was read
+        name, old = current[pk]
+        if any(old[field] != level for field, level in levels.items()):
+            changed[pk] = levels
+        if "warning_level" in levels and old["warning_level"] != levels["warning_level"]:
+            log.append(WarningChange(
+                entity_type=entity_type,
+                entity_id=pk,
+                entity_name=name,
+                old_level=old["warning_level"],
+                new_level=levels["warning_level"],
+            ))
+
+    if not changed:
+        return 0
+    if version is None:
+        version = DatasetVersion.bump()
+
+    ids = list(changed)
+    fields = list(changed[ids[0]])
+    qn = connection.ops.quote_name
+    assignments = ", ".join(f"{qn(f)} = v.{qn(f)}" for f in fields)
+    arrays = ", ".join("%s::varchar[]" for _ in fields)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {qn(model._meta.db_table)} AS t "
+            f"SET {assignments}, updated_version = %s "
+            f"FROM unnest(%s::bigint[], {arrays}) AS v(id, {', '.join(qn(f) for f in fields)}) "
+            f"WHERE t.id = v.id",
+            [version, ids, *([changed[pk][f] for pk in ids] for f in fields)],
+        )
+        total = cursor.rowcount
+    if log:
+        WarningChange.objects.bulk_create(log)
+    return total
+
+
+def recompute_city_warnings(version=None, rules=None):
+    """Recompute every city's warning_level under its WarningRule."""
+    rows = list(AfricanCity.objects.values_list("id", "warning_level", "city", "country_code", "watershed_id"))
+    current = {pk: (name, {"warning_level": level}) for pk, level, name, _, _ in rows}
+    cities = [(pk, code, ws) for pk, _, _, code, ws in rows]
+
+    rules = rules or RuleSet.load()
+    matrix = PrecipitationMatrix.load([pk for pk, _, _ in cities])
+    new_levels = {
+        pk: {"warning_level": level}
+        for pk, level in evaluate_cities(cities, matrix, rules).items()
+    }
+    return _apply_levels(AfricanCity, "city", current, new_levels, version)
+
+
+def watershed_mode():
+    """The aggregation stored in Watershed.warning_level (settings.WATERSHED_WARNING_MODE)."""
+    return getattr(settings, "WATERSHED_WARNING_MODE", "mean")
+
+
+def watershed_weights(mode, populations):
+    """City weights of a watershed mode: None for the plain mean, else {city_id: weight}."""
+    if mode == "population":
+        return populations
+    if mode == "area":
+        return area_weights()
+    return None
+
+
+def recompute_watershed_warnings(version=None, rules=None):
+    """
+    Recompute each watershed's plain, population-weighted and area-weighted
+    levels from the daily means of its cities; `warning_level` takes the one
+    selected by settings.WATERSHED_WARNING_MODE. Watersheds without any city
+    keep their current levels. Area weights must be fresh
+    (weights.refresh_area_weights).
+    """
+    fields = list(WATERSHED_MODES.values())
+    current = {
+        row[0]: (row[1], dict(zip(fields, row[2:])))
+        for row in Watershed.objects.values_list("id", "name", *fields)
+    }
+    rows = list(
+        AfricanCity.objects
+            .filter(watershed__isnull=False)
+            .values_list("id", "country_code", "watershed_id", "population")
+    )
+    cities = [(pk, code, ws) for pk, code, ws, _ in rows]
+
+    rules = rules or RuleSet.load()
+    matrix = PrecipitationMatrix.load([pk for pk, _, _ in cities])
+    populations = {pk: pop for pk, _, _, pop in rows}
+    by_mode = {
+        mode: evaluate_watersheds(cities, matrix, rules, watershed_weights(mode, populations))
+        for mode in WATERSHED_MODES
+    }
+    mode = watershed_mode()
+    new_levels = {
+        ws: {
+            "warning_level": by_mode[mode][ws],
+            "population_warning_level": by_mode["population"][ws],
+            "area_warning_level": by_mode["area"][ws],
+        }
+        for ws in by_mode["mean"]
+    }
+    return _apply_levels(Watershed, "watershed", current, new_levels, version)
+
+
+def run_warning_phases(report, rules=None):
+    """
+    The warning phases shared by import_precipitation and recompute_warnings,
+    each timed in `report` and run in its own short transaction: city levels,
+    area weights, watershed levels, country summaries. The warning phases
+    bump the dataset version inside their transaction, and only if they
+    change rows; the summaries get the version current in theirs.
+    """
+    rules = rules or RuleSet.load()
+
+    # each city's own warning_level under its rule
+    with report.phase("city_warnings") as phase, transaction.atomic():
+        phase["warnings_changed"] = recompute_city_warnings(rules=rules)
+
+    # cached Voronoi area weights of basins whose geometry changed
+    with report.phase("area_weights") as phase, transaction.atomic():
+        phase["watersheds_rebuilt"] = refresh_area_weights()
+
+    # each watershed's levels from its cities' daily (weighted) means
+    with report.phase("watershed_warnings") as phase, transaction.atomic():
+        phase["warnings_changed"] = recompute_watershed_warnings(rules=rules)
+
+    # the per-country rollups served by /api/summary/
+    with report.phase("summary") as phase, transaction.atomic():
+        phase["countries"] = rebuild_country_summaries(DatasetVersion.current())
+
+
+# ── rule preview ──────────────────────────────────────────────────────────
+
+PREVIEW_CHANGE_LIMIT = 500
+
+
+def _diff(before, after, names, limit):
+    changes = [
+        {"id": pk, "name": names.get(pk, ""), "from": before[pk], "to": level}
+        for pk, level in after.items()
+        if before.get(pk) != level
+    ]
+    return {
+        "current": {level: Counter(before.values())[level] for level in LEVELS},
+        "proposed": {level: Counter(after.values())[level] for level in LEVELS},
+        "changed": len(changes),
+        "changes": changes[:limit],
+    }
+
+
+def preview_rule(proposed, limit=PREVIEW_CHANGE_LIMIT):
+    """
+    Evaluate every city and watershed under the active rules and again with
+    `proposed` (an unsaved or edited WarningRule) in place, without writing.
+    Watersheds are aggregated as for their stored warning_level (the
+    configured WATERSHED_WARNING_MODE). Returns per-level counts
+    before/after and the entities that would change.
+    """
+    rows = list(AfricanCity.objects.values_list("id", "city", "country_code", "watershed_id", "population"))
+    cities = [(pk, code, ws) for pk, _, code, ws, _ in rows]
+    city_names = {pk: name for pk, name, _, _, _ in rows}
+    weights = watershed_weights(watershed_mode(), {pk: pop for pk, _, _, _, pop in rows})
+    watershed_names = dict(Watershed.objects.values_list("id", "name"))
+    matrix = PrecipitationMatrix.load([pk for pk, _, _ in cities])
+
+    baseline = RuleSet.load()
+    candidate = RuleSet.load(exclude=proposed.pk)
+    if proposed.active:
+        candidate.add(proposed)
+
+    return {
+        "cities": _diff(
+            evaluate_cities(cities, matrix, baseline),
+            evaluate_cities(cities, matrix, candidate),
+            city_names, limit,
+        ),
+        "watersheds": _diff(
+            evaluate_watersheds(cities, matrix, baseline, weights),
+            evaluate_watersheds(cities, matrix, candidate, weights),
+            watershed_names, limit,
+        ),
+    }
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class DashboardAppConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "dashboard_app"
+
+    def ready(self):
+        from . import signals  # noqa: F401  (registers the tombstone receivers)
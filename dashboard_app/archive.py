@@ -0,0 +1,110 @@
+# dashboard_app/archive.py
+"""
+Long-term precipitation history.
+
+When import_precipitation prunes the hot PrecipitationRecords table, past
+rows are moved (DELETE … RETURNING → INSERT in one statement) into
+PrecipitationArchive, and the per-city monthly rollups of the months touched
+are refreshed. The archive keeps one row per city and day: a day archived
+again (re-imported after it was pruned) replaces the earlier value. The history API answers from the rollups, or
+from the archive's BRIN-indexed date ranges for daily detail, so the hot
+table only ever holds the ~11-day forecast window.
+"""
+
+from datetime import date
+
+from django.db import connection, transaction
+
+from .models import PrecipitationArchive, PrecipitationMonthlyRollup
+
+
+def move_batch(lower_cutoff, upper_cutoff, batch_size):
+    """
+    Delete up to `batch_size` records outside [lower_cutoff, upper_cutoff];
+    the ones before lower_cutoff are archived. Returns (rows deleted, months
+    archived into) — the caller owns the transaction.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            WITH moved AS (
+                DELETE FROM dashboard_app_precipitationrecords
+                WHERE id IN (
+                    SELECT id FROM dashboard_app_precipitationrecords
+                    WHERE date < %(lower)s OR date > %(upper)s
+                    LIMIT %(limit)s
+                )
+                RETURNING city_id, date, precipitation
+            ), archived AS (
+                INSERT INTO dashboard_app_precipitationarchive (city_id, date, precipitation, archived_at)
+                SELECT city_id, date, precipitation, now() FROM moved
+                WHERE date < %(lower)s
+                ON CONFLICT (city_id, date)
+                DO UPDATE SET precipitation = EXCLUDED.precipitation, archived_at = EXCLUDED.archived_at
+                RETURNING date
+            )
+            SELECT
+                (SELECT count(*) FROM moved),
+                (SELECT array_agg(DISTINCT date_trunc('month', date)::date) FROM archived);
+        """, {"lower": lower_cutoff, "upper": upper_cutoff, "limit": batch_size})
+        deleted, months = cursor.fetchone()
+    return deleted, set(months or ())
+
+
+def _month_after(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def refresh_rollups(months):
+    """Recompute the monthly rollups of every city for the given months."""
+    if not months:
+        return 0
+    refreshed = 0
+    with connection.cursor() as cursor:
+        for month in sorted(months):
+            cursor.execute("""
+                INSERT INTO dashboard_app_precipitationmonthlyrollup
+                    (city_id, month, days, wet_days, total, mean, max)
+                SELECT city_id, %(month)s, count(*),
+                       count(*) FILTER (WHERE precipitation > 0),
+                       coalesce(sum(precipitation), 0), avg(precipitation), max(precipitation)
+                FROM dashboard_app_precipitationarchive
+                WHERE date >= %(month)s AND date < %(next)s
+                GROUP BY city_id
+                ON CONFLICT (city_id, month) DO UPDATE SET
+                    days = EXCLUDED.days, wet_days = EXCLUDED.wet_days, total = EXCLUDED.total,
+                    mean = EXCLUDED.mean, max = EXCLUDED.max;
+            """, {"month": month, "next": _month_after(month)})
+            refreshed += cursor.rowcount
+    return refreshed
+
+
+def archive_and_prune(lower_cutoff, upper_cutoff, batch_size):
+    """
+    Move out-of-window records in batches (one short transaction each), then
+    refresh the rollups of the archived months. Returns (pruned, archived months).
+    """
+    pruned = 0
+    months = set()
+    while True:
+        with transaction.atomic():
+            deleted, batch_months = move_batch(lower_cutoff, upper_cutoff, batch_size)
+        pruned += deleted
+        months |= batch_months
+        if deleted < batch_size:
+            break
+    with transaction.atomic():
+        refresh_rollups(months)
+    return pruned, months
+
+
+def monthly_history(city_id, start, end):
+    first_month = start.replace(day=1)
+    return PrecipitationMonthlyRollup.objects.filter(
+        city_id=city_id, month__gte=first_month, month__lte=end
+    ).order_by("month")
+
+
+def daily_history(city_id, start, end):
+    return PrecipitationArchive.objects.filter(
+        city_id=city_id, date__gte=start, date__lte=end
+    ).order_by("date")
@@ -0,0 +1,9 @@
+"""
+Reproducible performance benchmarks.
+
+  * synthetic.py  – fills PostGIS with synthetic cities, watersheds and records
+  * owm_stub.py   – local aiohttp stand-in for the OWM forecast/daily API
+  * scenarios.py  – timed scenarios (import end-to-end, each phase, each endpoint)
+
+Driven by the `generate_synthetic_data` and `run_benchmarks` management commands.
+"""
@@ -0,0 +1,117 @@
+# dashboard_app/benchmarks/owm_stub.py
+"""
+Local stand-in for OWM's `forecast/daily` endpoint.
+
+Runs an aiohttp server on its own event loop in a background thread so it can
+be used from synchronous benchmark code:
+
+    with OWMStub(latency_ms=80, error_rate=0.02) as stub:
+        with override_settings(OWM_FORECAST_URL=stub.url):
+            call_command("import_precipitation")
+
+Responses are deterministic for a given (lat, lon, seed), so two runs against
+the same dataset produce the same records.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from aiohttp import web
+
+
+class OWMStub:
+    def __init__(self, latency_ms=50.0, jitter_ms=10.0, error_rate=0.0,
+                 rate_limit_rate=0.0, host="127.0.0.1", port=0, seed=42):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.host = host
+        self.port = port
+        self.seed = seed
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._loop = None
+        self._runner = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/data/2.5/forecast/daily"
+
+    async def _handle(self, request):
+        self.requests += 1
+        delay = max(0.0, self._rng.gauss(self.latency_ms, self.jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+
+        roll = self._rng.random()
+        if roll < self.rate_limit_rate:
+            return web.json_response({"cod": 429, "message": "rate limited"}, status=429)
+        if roll < self.rate_limit_rate + self.error_rate:
+            return web.json_response({"cod": 500, "message": "stub error"}, status=500)
+
+        lat = float(request.query.get("lat", 0))
+        lon = float(request.query.get("lon", 0))
+        cnt = int(request.query.get("cnt", 7))
+        city_rng = random.Random(f"{self.seed}:{lat:.4f}:{lon:.4f}")
+        midday = datetime.now(timezone.utc).replace(hour=12, minute=0, second=0, microsecond=0)
+
+        days = []
+        for i in range(cnt):
+            day = {"dt": int((midday + timedelta(days=i)).timestamp())}
+            if city_rng.random() < 0.6:
+                day["rain"] = round(city_rng.expovariate(1 / 6.0), 2)
+            days.append(day)
+        return web.json_response({
+            "city": {"coord": {"lat": lat, "lon": lon}, "population": city_rng.randint(1_000, 5_000_000)},
+            "cnt": cnt,
+            "list": days,
+        })
+
+    def _serve(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        app = web.Application()
+        app.router.add_get("/data/2.5/forecast/daily", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, self.host, self.port)
+        self._loop.run_until_complete(site.start())
+        # resolve the ephemeral port when port=0
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._runner.cleanup())
+        self._loop.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._serve, name="owm-stub", daemon=True)
+        self._thread.start()
+        if not self._ready.wait(timeout=10):
+            raise RuntimeError("OWM stub failed to start")
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=10)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    stub = OWMStub().start()
+    print(f"OWM stub listening on {stub.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
@@ -0,0 +1,154 @@
+# dashboard_app/benchmarks/scenarios.py
+"""
+Benchmark scenarios. Each scenario returns a dict of measurements that
+run_benchmarks writes to a JSON results file.
+"""
+
+import io
+import json
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from dashboard_app.import_report import ImportReport, percentile
+from dashboard_app.management.commands import import_precipitation
+from dashboard_app.models import AfricanCity, PrecipitationRecords
+from dashboard_app.sharding import stage_records
+
+from .owm_stub import OWMStub
+
+
+def _timings(samples):
+    samples = sorted(samples)
+    return {
+        "runs": len(samples),
+        "min_s": round(samples[0], 4),
+        "median_s": round(statistics.median(samples), 4),
+        "p95_s": round(percentile(samples, 95), 4),
+        "max_s": round(samples[-1], 4),
+    }
+
+
+BULK_FORECAST_IDS = 1000
+
+
+def endpoint_paths():
+    """The API endpoints to benchmark, keyed by scenario name."""
+    city_id = AfricanCity.objects.values_list("id", flat=True).order_by("id").first()
+    paths = {
+        "cities": "/api/cities/",
+        "watersheds": "/api/watersheds/",
+        "cities_async": "/api/async/cities/",
+        "watersheds_async": "/api/async/watersheds/",
+        "summary": "/api/summary/",
+    }
+    if city_id is not None:
+        paths["forecast"] = f"/api/cities/{city_id}/forecast/"
+        paths["forecast_async"] = f"/api/async/cities/{city_id}/forecast/"
+        paths["forecast_columnar"] = f"/api/cities/{city_id}/forecast/?format=columnar"
+    bulk_ids = AfricanCity.objects.order_by("id").values_list("id", flat=True)[:BULK_FORECAST_IDS]
+    if bulk_ids:
+        paths["forecasts_bulk"] = f"/api/forecasts/?ids={','.join(map(str, bulk_ids))}"
+    return paths
+
+
+def bench_endpoint(path, repeat=5):
+    client = Client(SERVER_NAME="localhost")
+    samples = []
+    queries = None
+    size = None
+    status = None
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as ctx:
+            t0 = time.perf_counter()
+            response = client.get(path)
+            body = b"".join(response.streaming_content) if response.streaming else response.content
+            samples.append(time.perf_counter() - t0)
+        queries = len(ctx.captured_queries)
+        size = len(body)
+        status = response.status_code
+    return {"path": path, "status": status, "queries": queries, "bytes": size, **_timings(samples)}
+
+
+def _seed_write_work(run_id, today, stale_days=7):
+    """
+    Give every write phase real work: a staged forecast changing each active
+    record (upsert), a population for every city (populations) and
+    `stale_days` rows per city from before the retention window (prune).
+    """
+    records = PrecipitationRecords.objects.values_list("city_id", "date", "precipitation")
+    city_ids = list(AfricanCity.objects.values_list("id", flat=True))
+    stage_records(
+        run_id,
+        [(city_id, day, (precip or 0.0) + 1.0) for city_id, day, precip in records],
+        {pk: 100_000 + pk for pk in city_ids},
+    )
+    import_precipitation.bulk_upsert([
+        (pk, today - timedelta(days=4 + offset), 1.0)
+        for pk in city_ids
+        for offset in range(stale_days)
+    ])
+
+
+def bench_write_phases(repeat=3):
+    """
+    Time the import's write phases (merge of the staged rows, prune and
+    archive, populations, warnings and summaries) on the data already in the
+    database, without fetching. Each run first stages a changed forecast and
+    populations for every city and adds out-of-window rows to prune (not
+    timed); everything is rolled back so repeats see the same starting state.
+    """
+    runs = []
+    for _ in range(repeat):
+        report = ImportReport("bench_write_phases")
+        try:
+            with transaction.atomic():
+                _seed_write_work(report.run_id, date.today())
+                import_precipitation.Command().write_phases(report, run_id=report.run_id)
+                transaction.set_rollback(True)
+        finally:
+            report.finish()
+        runs.append(report.phases)
+    return _phase_stats(runs)
+
+
+def bench_import(latency_ms=50.0, jitter_ms=10.0, error_rate=0.0, rate_limited=False):
+    """Run import_precipitation end-to-end against the local OWM stub."""
+    pacing = {} if rate_limited else {"OWM_REQUESTS_PER_SECOND": 0}
+    stub = OWMStub(latency_ms=latency_ms, jitter_ms=jitter_ms, error_rate=error_rate)
+    with stub, tempfile.TemporaryDirectory() as tmp:
+        report_path = Path(tmp) / "report.jsonl"
+        with override_settings(OWM_FORECAST_URL=stub.url, OWM_API_KEY="benchmark", **pacing):
+            t0 = time.perf_counter()
+            call_command("import_precipitation", report_file=str(report_path), stdout=io.StringIO())
+            elapsed = time.perf_counter() - t0
+        lines = [json.loads(line) for line in report_path.read_text().splitlines()]
+
+    summary = lines[-1]
+    phases = {line["phase"]: {k: v for k, v in line.items() if k not in ("event", "run_id", "phase")}
+              for line in lines[:-1]}
+    return {
+        "seconds": round(elapsed, 3),
+        "stub_requests": stub.requests,
+        "queries": summary.get("queries"),
+        "phases": phases,
+    }
+
+
+def _phase_stats(runs):
+    by_phase = {}
+    for phases in runs:
+        for phase in phases:
+            entry = by_phase.setdefault(phase["phase"], {"samples": [], "queries": phase["queries"]})
+            entry["samples"].append(phase["seconds"])
+    return {
+        name: {"queries": entry["queries"], **_timings(entry["samples"])}
+        for name, entry in by_phase.items()
+    }
@@ -0,0 +1,90 @@
+# dashboard_app/benchmarks/startup.py
+"""
+Cold-start benchmark: wall time and peak RSS of fresh interpreters running
+`manage.py <command>` and booting the WSGI app the way a gunicorn worker
+does (import dashboard.wsgi, then load the URLconf and views). Every sample
+is a new process, so nothing is cached in memory between runs.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+
+from .scenarios import _timings
+
+MANAGE_COMMANDS = (
+    ("check",),
+    ("help", "import_precipitation"),
+)
+
+_WSGI_BOOT = """
+import json, os, resource, time
+t0 = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "dashboard.settings")
+from dashboard.wsgi import application
+t1 = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+t2 = time.perf_counter()
+print(json.dumps({
+    "setup_s": t1 - t0,
+    "urlconf_s": t2 - t1,
+    "maxrss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+"""
+
+
+def _env():
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SETTINGS_MODULE", "dashboard.settings")
+    return env
+
+
+def bench_manage(args, repeat=5):
+    """Time `python manage.py <args>` in fresh processes."""
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "manage.py", *args],
+            cwd=settings.BASE_DIR, env=_env(), check=True,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        samples.append(time.perf_counter() - t0)
+    return _timings(samples)
+
+
+def bench_wsgi_boot(repeat=5):
+    """Time a worker-style WSGI boot in fresh processes (total and by stage)."""
+    totals, setups, urlconfs, rss = [], [], [], []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = subprocess.run(
+            [sys.executable, "-c", _WSGI_BOOT],
+            cwd=settings.BASE_DIR, env=_env(), check=True, capture_output=True, text=True,
+        ).stdout
+        totals.append(time.perf_counter() - t0)
+        stages = json.loads(out.strip().splitlines()[-1])
+        setups.append(stages["setup_s"])
+        urlconfs.append(stages["urlconf_s"])
+        rss.append(stages["maxrss_kb"])
+    return {
+        **_timings(totals),
+        "setup_median_s": round(statistics.median(setups), 4),
+        "urlconf_median_s": round(statistics.median(urlconfs), 4),
+        "maxrss_kb": max(rss),
+    }
+
+
+def bench_startup(repeat=5):
+    results = {
+        f"manage {' '.join(args)}": bench_manage(args, repeat=repeat)
+        for args in MANAGE_COMMANDS
+    }
+    results["wsgi boot"] = bench_wsgi_boot(repeat=repeat)
+    return results
@@ -0,0 +1,124 @@
+# dashboard_app/benchmarks/synthetic.py
+"""
+Synthetic dataset generator.
+
+Watersheds are laid out as a regular grid of square basins over Africa's
+bounding box; cities are random points inside that box and are assigned to
+the basin whose cell contains them. Every synthetic row is named with the
+SYNTHETIC_PREFIX so it can be removed again without touching real data.
+"""
+
+import math
+import random
+from datetime import date, timedelta
+
+from django.contrib.gis.geos import MultiPolygon, Point, Polygon
+from django.db import transaction
+
+from dashboard_app.models import AfricanCity, DatasetVersion, PrecipitationRecords, Watershed
+
+SYNTHETIC_PREFIX = "SYN_"
+
+# lon_min, lat_min, lon_max, lat_max
+AFRICA_BBOX = (-18.0, -35.0, 52.0, 37.0)
+
+COUNTRIES = [("KE", "Kenya"), ("NG", "Nigeria"), ("ZA", "South Africa"), ("EG", "Egypt"),
+             ("SN", "Senegal"), ("CD", "Congo (Kinshasa)"), ("ET", "Ethiopia"), ("MA", "Morocco")]
+
+BATCH_SIZE = 5000
+
+
+def _grid_shape(n_watersheds):
+    lon_min, lat_min, lon_max, lat_max = AFRICA_BBOX
+    aspect = (lon_max - lon_min) / (lat_max - lat_min)
+    cols = max(1, round(math.sqrt(n_watersheds * aspect)))
+    rows = max(1, math.ceil(n_watersheds / cols))
+    return cols, rows
+
+
+def clear():
+    """Delete all synthetic rows (records go with their cities via CASCADE)."""
+    cities, _ = AfricanCity.objects.filter(city__startswith=SYNTHETIC_PREFIX).delete()
+    watersheds, _ = Watershed.objects.filter(name__startswith=SYNTHETIC_PREFIX).delete()
+    return cities, watersheds
+
+
+def generate(cities=1000, watersheds=100, days_back=3, days_ahead=7, seed=42):
+    """
+    Create `watersheds` basin polygons, `cities` points and one precipitation
+    record per city per day in [today - days_back, today + days_ahead].
+    Returns a dict of row counts.
+    """
+    rng = random.Random(seed)
+    lon_min, lat_min, lon_max, lat_max = AFRICA_BBOX
+    cols, rows = _grid_shape(watersheds)
+    cell_w = (lon_max - lon_min) / cols
+    cell_h = (lat_max - lat_min) / rows
+
+    with transaction.atomic():
+        # bulk_create bypasses save(), so stamp the rows ourselves
+        version = DatasetVersion.bump()
+        basins = []
+        for idx in range(watersheds):
+            col, row = idx % cols, idx // cols
+            x0 = lon_min + col * cell_w
+            y0 = lat_min + row * cell_h
+            ring = ((x0, y0), (x0 + cell_w, y0), (x0 + cell_w, y0 + cell_h), (x0, y0 + cell_h), (x0, y0))
+            basins.append(Watershed(
+                name=f"{SYNTHETIC_PREFIX}BV_{idx:05d}",
+                geom=MultiPolygon(Polygon(ring, srid=4326), srid=4326),
+                updated_version=version,
+            ))
+        basins = Watershed.objects.bulk_create(basins, batch_size=BATCH_SIZE)
+
+        # Only the cells that actually got a basin can hold cities
+        city_objs = []
+        for idx in range(cities):
+            cell = rng.randrange(len(basins)) if basins else None
+            if cell is None:
+                lon = rng.uniform(lon_min, lon_max)
+                lat = rng.uniform(lat_min, lat_max)
+            else:
+                col, row = cell % cols, cell // cols
+                lon = lon_min + (col + rng.random()) * cell_w
+                lat = lat_min + (row + rng.random()) * cell_h
+            code, country = COUNTRIES[idx % len(COUNTRIES)]
+            city_objs.append(AfricanCity(
+                city=f"{SYNTHETIC_PREFIX}{idx:06d}",
+                country_code=code,
+                country=country,
+                location=Point(lon, lat, srid=4326),
+                population=rng.randint(1_000, 5_000_000),
+                watershed=basins[cell] if cell is not None else None,
+                updated_version=version,
+            ))
+        city_objs = AfricanCity.objects.bulk_create(city_objs, batch_size=BATCH_SIZE)
+
+        today = date.today()
+        dates = [today + timedelta(days=d) for d in range(-days_back, days_ahead + 1)]
+        records = [
+            (c.id, d, round(rng.expovariate(1 / 6.0), 1) if rng.random() < 0.6 else 0.0)
+            for c in city_objs
+            for d in dates
+        ]
+        # Reuse the import's COPY-based upsert: much faster than bulk_create here
+        from dashboard_app.management.commands.import_precipitation import bulk_upsert
+        upserted = bulk_upsert(records)
+
+    return {"watersheds": len(basins), "cities": len(city_objs), "records": upserted}
+
+
+def has_real_data():
+    """True if the database contains non-synthetic cities or watersheds."""
+    return (
+        AfricanCity.objects.exclude(city__startswith=SYNTHETIC_PREFIX).exists()
+        or Watershed.objects.exclude(name__startswith=SYNTHETIC_PREFIX).exists()
+    )
+
+
+def counts():
+    return {
+        "cities": AfricanCity.objects.count(),
+        "watersheds": Watershed.objects.count(),
+        "records": PrecipitationRecords.objects.count(),
+    }
@@ -0,0 +1,170 @@
+# dashboard_app/import_report.py
+"""
+Structured per-phase timing for import runs.
+
+    report = ImportReport("import_precipitation")
+    with report.phase("prune") as phase:
+        phase["rows_pruned"] = prune()
+    report.emit(stream)          # one JSON line per phase + a summary line
+    report.save()                # optional: append to the ImportRun table
+    report.write("-", stdout, record_history=True)   # both, as the commands do
+"""
+
+import json
+import math
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from django.db import connection
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list (None if empty)."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class FetchStats:
+    """Counters for the HTTP fetch phase, filled in by the fetch coroutines."""
+
+    def __init__(self):
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.retries = 0
+        self.skipped = 0
+        self.latencies = []
+
+    def merge(self, other):
+        """Add the counters of another FetchStats (e.g. from a shard worker)."""
+        self.requests += other.requests
+        self.successes += other.successes
+        self.failures += other.failures
+        self.retries += other.retries
+        self.skipped += other.skipped
+        self.latencies.extend(other.latencies)
+
+    def as_dict(self):
+        lat = sorted(self.latencies)
+        return {
+            "requests": self.requests,
+            "successes": self.successes,
+            "failures": self.failures,
+            "retries": self.retries,
+            "skipped": self.skipped,
+            "latency_p50_ms": _ms(percentile(lat, 50)),
+            "latency_p90_ms": _ms(percentile(lat, 90)),
+            "latency_p99_ms": _ms(percentile(lat, 99)),
+            "latency_max_ms": _ms(lat[-1] if lat else None),
+        }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+class ImportReport:
+    def __init__(self, command):
+        self.command = command
+        self.run_id = uuid.uuid4().hex
+        self.started_at = datetime.now(timezone.utc)
+        self.finished_at = None
+        self.status = "running"
+        self.phases = []
+        self._t0 = time.perf_counter()
+        self._seconds = None
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time a phase. The yielded dict collects the phase's counters
+        (rows_upserted, rows_pruned, …); the number of SQL statements the
+        phase ran is recorded as `queries`.
+        """
+        counters = {}
+        queries = [0]
+
+        def count_query(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        t0 = time.perf_counter()
+        try:
+            with connection.execute_wrapper(count_query):
+                yield counters
+        finally:
+            self.phases.append({
+                "phase": name,
+                "seconds": round(time.perf_counter() - t0, 3),
+                "queries": queries[0],
+                **counters,
+            })
+
+    def finish(self, status="success"):
+        self.status = status
+        self.finished_at = datetime.now(timezone.utc)
+        self._seconds = time.perf_counter() - self._t0
+
+    @property
+    def duration(self):
+        seconds = self._seconds if self._seconds is not None else time.perf_counter() - self._t0
+        return round(seconds, 3)
+
+    def summary(self):
+        totals = {}
+        for phase in self.phases:
+            for key, value in phase.items():
+                if key in ("phase", "seconds") or key.endswith("_ms"):
+                    continue
+                if not isinstance(value, (int, float)):
+                    continue
+                totals[key] = totals.get(key, 0) + value
+        return {
+            "event": "import_run",
+            "run_id": self.run_id,
+            "command": self.command,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "seconds": self.duration,
+            "phases": {p["phase"]: p["seconds"] for p in self.phases},
+            **totals,
+        }
+
+    def lines(self):
+        for phase in self.phases:
+            yield json.dumps({"event": "import_phase", "run_id": self.run_id, **phase})
+        yield json.dumps(self.summary())
+
+    def emit(self, stream):
+        for line in self.lines():
+            stream.write(line + "\n")
+
+    def write(self, path, stdout, record_history=False):
+        """Emit to `path` ('-' for `stdout`) and optionally save() the run."""
+        if path == "-":
+            self.emit(stdout)
+        else:
+            with open(path, "a", encoding="utf-8") as fh:
+                self.emit(fh)
+        if record_history:
+            self.save()
+
+    def save(self):
+        """Append this run to the ImportRun history table."""
+        from .models import ImportRun
+
+        summary = self.summary()
+        return ImportRun.objects.create(
+            run_id=self.run_id,
+            command=self.command,
+            status=self.status,
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            duration_seconds=summary["seconds"],
+            report={"summary": summary, "phases": self.phases},
+        )
@@ -0,0 +1,231 @@
+# dashboard_app/instrumentation.py
+"""
+Lightweight request instrumentation.
+
+Every request handled by PerformanceMiddleware gets a RequestStats object stored
+in a context variable. Database queries (through an execute wrapper installed on
+each connection) and view-level phases such as serialization add their timings
+to it. When the response goes out the stats are:
+
+  * written to a `Server-Timing` header, and
+  * folded into per-view Prometheus histograms exposed at /metrics.
+
+With several worker processes behind one port a scrape reaches a random
+worker, so per-process counters would jump around. When
+PROMETHEUS_MULTIPROC_DIR is set (gunicorn.conf.py does so), the histograms are
+backed by prometheus_client's multiprocess mode: every worker writes its
+samples to files in that directory and /metrics merges all of them. Without
+it the histograms live in this process's memory, which is only meaningful
+for a single-process server (runserver, one worker).
+
+/metrics and the database detail of Server-Timing are only served when
+settings.METRICS_ENABLED / SERVER_TIMING_ENABLED are on (see views.metrics_view).
+"""
+
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from importlib.util import find_spec
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.signals import connection_created
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+_current = ContextVar("request_stats", default=None)
+
+
+class RequestStats:
+    """Timings collected while handling one request."""
+
+    __slots__ = ("start", "db_count", "db_time", "phases")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.db_count = 0
+        self.db_time = 0.0
+        self.phases = {}
+
+    def add_phase(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+
+def begin_request():
+    """Start collecting stats for the current request; returns (stats, token)."""
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+@contextmanager
+def timed(phase):
+    """
+    Time a block of view code and attribute it to `phase`
+    (e.g. "serialize"). No-op outside of an instrumented request.
+    """
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add_phase(phase, time.perf_counter() - t0)
+
+
+# ── database query accounting ─────────────────────────────────────────────
+
+def _query_timer(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    t0 = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_count += 1
+        stats.db_time += time.perf_counter() - t0
+
+
+def _install_query_timer(sender, connection, **kwargs):
+    # connection_created fires on every (re)connect of the same wrapper,
+    # so only install once per DatabaseWrapper.
+    if _query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_timer)
+
+
+connection_created.connect(_install_query_timer, dispatch_uid="instrumentation_query_timer")
+
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def fingerprint_sql(sql):
+    """
+    Normalise a SQL statement so that queries differing only in literal values
+    collapse to the same fingerprint (useful to spot N+1 patterns).
+    """
+    fp = _LITERAL_RE.sub("?", sql)
+    fp = _IN_LIST_RE.sub("(?...)", fp)
+    return _SPACE_RE.sub(" ", fp).strip()
+
+
+# ── metrics registry ──────────────────────────────────────────────────────
+
+MULTIPROCESS_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+if MULTIPROCESS_DIR and not find_spec("prometheus_client"):
+    raise ImproperlyConfigured("PROMETHEUS_MULTIPROC_DIR is set but prometheus_client is not installed")
+
+
+class Histogram:
+    """Per-view histogram; prometheus_client-backed in multiprocess mode."""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+        self._shared = None
+        if MULTIPROCESS_DIR:
+            from prometheus_client import Histogram as SharedHistogram
+
+            # registry=None: collected through MultiProcessCollector instead
+            self._shared = SharedHistogram(name, help_text, ["view"], buckets=buckets, registry=None)
+
+    def observe(self, label, value):
+        if self._shared is not None:
+            self._shared.labels(label).observe(value)
+            return
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                # one counter per bucket + the implicit +Inf bucket, then sum
+                series = self._series[label] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][idx] += 1
+            series[1] += value
+
+    def render(self, label_name):
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            snapshot = {k: (list(v[0]), v[1]) for k, v in self._series.items()}
+        for label, (counts, total) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_name}="{label}",le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{label_name}="{label}",le="+Inf"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_name}="{label}"}} {total}')
+            lines.append(f'{self.name}_count{{{label_name}="{label}"}} {cumulative}')
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "ews_http_request_duration_seconds", "Wall time spent handling a request.", LATENCY_BUCKETS
+)
+DB_TIME = Histogram(
+    "ews_db_query_duration_seconds", "Total database time per request.", LATENCY_BUCKETS
+)
+DB_QUERIES = Histogram(
+    "ews_db_queries_per_request", "Number of SQL statements per request.", QUERY_COUNT_BUCKETS
+)
+SERIALIZE_TIME = Histogram(
+    "ews_serialize_duration_seconds", "Time spent serializing the response data.", LATENCY_BUCKETS
+)
+RESPONSE_BYTES = Histogram(
+    "ews_http_response_size_bytes", "Size of the response body.", SIZE_BUCKETS
+)
+
+_HISTOGRAMS = (REQUEST_LATENCY, DB_TIME, DB_QUERIES, SERIALIZE_TIME, RESPONSE_BYTES)
+
+
+def record(view, stats, total, response_bytes):
+    REQUEST_LATENCY.observe(view, total)
+    DB_TIME.observe(view, stats.db_time)
+    DB_QUERIES.observe(view, stats.db_count)
+    if "serialize" in stats.phases:
+        SERIALIZE_TIME.observe(view, stats.phases["serialize"])
+    if response_bytes is not None:
+        RESPONSE_BYTES.observe(view, response_bytes)
+
+
+def server_timing_header(stats, total):
+    parts = [
+        f"total;dur={total * 1000:.1f}",
+        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.db_count} queries"',
+    ]
+    for name, seconds in stats.phases.items():
+        parts.append(f"{name};dur={seconds * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def render_metrics():
+    """Prometheus text format; merged across all workers in multiprocess mode."""
+    if MULTIPROCESS_DIR:
+        from prometheus_client import CollectorRegistry, generate_latest, multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry).decode()
+    lines = []
+    for histogram in _HISTOGRAMS:
+        lines.extend(histogram.render("view"))
+    return "\n".join(lines) + "\n"
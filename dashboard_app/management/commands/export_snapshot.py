@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard_app.snapshots import export_snapshot, prune_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        "Export AfricanCity and Watershed (GeoParquet) and the active PrecipitationRecords "
+        "(Arrow IPC) into a versioned snapshot directory with a manifest, for bulk consumers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output-dir", help="Snapshot root (default: settings.SNAPSHOT_ROOT).")
+        parser.add_argument("--compression", default="zstd", choices=["zstd", "lz4", "snappy", "none"])
+        parser.add_argument("--keep", type=int, default=5,
+                            help="Number of snapshot versions to keep (0 keeps all).")
+
+    def handle(self, *args, **options):
+        compression = None if options["compression"] == "none" else options["compression"]
+        try:
+            manifest = export_snapshot(root=options["output_dir"], compression=compression)
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        for entry in manifest["files"]:
+            self.stdout.write(f"  {entry['name']:22} {entry['rows']:>9} rows  {entry['bytes']:>12} bytes")
+        removed = prune_snapshots(options["keep"], root=options["output_dir"])
+        if removed:
+            self.stdout.write(f"Removed {len(removed)} old snapshot(s).")
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshot {manifest['snapshot']} (dataset version {manifest['dataset_version']}) written."
+        ))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from dashboard_app.benchmarks import synthetic
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with synthetic cities, watershed polygons and precipitation "
+        "records for benchmarking. All rows are prefixed with 'SYN_'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cities", type=int, default=1000)
+        parser.add_argument("--watersheds", type=int, default=100)
+        parser.add_argument("--days-back", type=int, default=3)
+        parser.add_argument("--days-ahead", type=int, default=7)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--clear", action="store_true", help="Remove existing synthetic rows first.")
+        parser.add_argument("--clear-only", action="store_true", help="Only remove synthetic rows.")
+
+    def handle(self, *args, **options):
+        if options["clear"] or options["clear_only"]:
+            cities, watersheds = synthetic.clear()
+            self.stdout.write(f"Removed {cities} synthetic city rows and {watersheds} watershed rows.")
+            if options["clear_only"]:
+                return
+
+        counts = synthetic.generate(
+            cities=options["cities"],
+            watersheds=options["watersheds"],
+            days_back=options["days_back"],
+            days_ahead=options["days_ahead"],
+            seed=options["seed"],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {counts['watersheds']} watersheds, {counts['cities']} cities "
+            f"and {counts['records']} precipitation records."
+        ))
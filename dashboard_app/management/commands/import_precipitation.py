@@ -2,22 +2,45 @@ import asyncio
 import aiohttp
 import csv
 import io
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date, datetime, timedelta
-from collections import deque, defaultdict
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.db import connection, transaction
-
-from dashboard_app.models import AfricanCity, PrecipitationRecords, Watershed
-
-OWM_URL = "https://pro.openweathermap.org/data/2.5/forecast/daily"
-MAX_CONCURRENT = 50
-RATE_LIMIT_PAUSE = 1 / 50
-
-async def fetch_one(session, city):
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
+from django.utils import timezone
+
+from dashboard_app.alerts import run_warning_phases
+from dashboard_app.archive import archive_and_prune
+from dashboard_app.import_report import FetchStats, ImportReport
+from dashboard_app.models import DatasetVersion, WarningChange
+from dashboard_app.scheduler import advisory_lock
+from dashboard_app.sharding import (
+    SHARD_KEYS,
+    clear_staging,
+    init_worker,
+    parse_shard,
+    shard_queryset,
+    shard_rate_limits,
+    stage_records,
+    staged_populations,
+    worker_stage_shard,
+)
+
+MAX_RETRIES = 2
+RETRY_BACKOFF = 0.5  # seconds, doubled on each retry
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+WARNING_CHANGE_RETENTION_DAYS = 30
+PRUNE_BATCH_SIZE = 20_000
+STALE_STAGING = timedelta(days=1)  # staged rows of abandoned runs are dropped after this
+
+async def fetch_one(session, city, stats):
     if not city.location:
         # no Point stored? skip this city
+        stats.skipped += 1
         return None
 
     lon = city.location.x
@@ -30,34 +53,57 @@ async def fetch_one(session, city):
         "units": "metric",
         "appid": settings.OWM_API_KEY,
     }
-    try:
-        async with session.get(OWM_URL, params=params, timeout=10) as resp:
-            resp.raise_for_status()
-            data = await resp.json()
-            city_info = data.get("city", {})
-            population = city_info.get("population", None)
-
-            tuples = []
-            for day in data.get("list", []):
-                dt_date = date.fromtimestamp(day["dt"])
-                rain_mm = float(day.get("rain", 0.0) or 0.0)
-                tuples.append((city.id, dt_date, rain_mm))
-
-            return (city.id, population, tuples)
-    except Exception as e:
-        print(f"[>>] {city.city}: {e}")
-        return None
-
-async def fetch_all(cities):
-    connector = aiohttp.TCPConnector(limit=MAX_CONCURRENT)
-    sem = asyncio.Semaphore(MAX_CONCURRENT)
+    for attempt in range(MAX_RETRIES + 1):
+        if attempt:
+            stats.retries += 1
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+        stats.requests += 1
+        t0 = time.perf_counter()
+        try:
+            async with session.get(settings.OWM_FORECAST_URL, params=params, timeout=10) as resp:
+                if resp.status in RETRY_STATUSES and attempt < MAX_RETRIES:
+                    stats.latencies.append(time.perf_counter() - t0)
+                    continue
+                resp.raise_for_status()
+                data = await resp.json()
+            stats.latencies.append(time.perf_counter() - t0)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            stats.latencies.append(time.perf_counter() - t0)
+            if attempt < MAX_RETRIES:
+                continue
+            stats.failures += 1
+            print(f"[>>] {city.city}: {e}")
+            return None
+        except Exception as e:
+            stats.latencies.append(time.perf_counter() - t0)
+            stats.failures += 1
+            print(f"[>>] {city.city}: {e}")
+            return None
+
+        stats.successes += 1
+        city_info = data.get("city", {})
+        population = city_info.get("population", None)
+
+        tuples = []
+        for day in data.get("list", []):
+            dt_date = date.fromtimestamp(day["dt"])
+            rain_mm = float(day.get("rain", 0.0) or 0.0)
+            tuples.append((city.id, dt_date, rain_mm))
+
+        return (city.id, population, tuples)
+
+async def fetch_all(cities, stats, shards=1):
+    """Fetch `cities` as one of `shards` concurrent fetchers sharing the OWM budget."""
+    max_concurrent, rate_limit_pause = shard_rate_limits(shards)
+    connector = aiohttp.TCPConnector(limit=max_concurrent)
+    sem = asyncio.Semaphore(max_concurrent)
     async with aiohttp.ClientSession(connector=connector) as session:
         tasks = []
         for city in cities:
             await sem.acquire()
-            task = asyncio.create_task(_wrapper(sem, fetch_one, session, city))
+            task = asyncio.create_task(_wrapper(sem, fetch_one, session, city, stats))
             tasks.append(task)
-            await asyncio.sleep(RATE_LIMIT_PAUSE)
+            await asyncio.sleep(rate_limit_pause)
         results = await asyncio.gather(*tasks)
     all_records = []
     pop_map = {}
@@ -70,15 +116,28 @@ async def fetch_all(cities):
             pop_map[city_id] = population
     return all_records, pop_map
 
-async def _wrapper(sem, coro, session, city):
+async def _wrapper(sem, coro, session, city, stats):
     try:
-        return await coro(session, city)
+        return await coro(session, city, stats)
     finally:
         sem.release()
 
+def copy_csv(cursor, sql, buffer):
+    """
+    Stream a CSV buffer into COPY ... FROM STDIN on either driver: psycopg 3
+    (used when connection pooling is enabled) or psycopg2.
+    """
+    if is_psycopg3:
+        with cursor.copy(sql) as copy:
+            copy.write(buffer.getvalue())
+    else:
+        buffer.seek(0)
+        cursor.copy_expert(sql, buffer)
+
 def bulk_upsert(records):
+    """COPY the fetched rows into a temp table and upsert them. Returns rows upserted."""
     if not records:
-        return
+        return 0
     with connection.cursor() as cursor:
         cursor.execute("""
             CREATE TEMP TABLE tmp_precip (
@@ -91,8 +150,8 @@ def bulk_upsert(records):
         writer = csv.writer(buffer)
         for city_id, dt_date, precip in records:
             writer.writerow([city_id, dt_date.isoformat(), precip])
-        buffer.seek(0)
-        cursor.copy_expert(
+        copy_csv(
+            cursor,
             "COPY tmp_precip (city_id, date, precipitation) FROM STDIN WITH CSV",
             buffer
         )
@@ -100,106 +159,247 @@ def bulk_upsert(records):
             INSERT INTO dashboard_app_precipitationrecords (city_id, date, precipitation)
             SELECT city_id, date, precipitation FROM tmp_precip
             ON CONFLICT (city_id, date)
-            DO UPDATE SET precipitation = EXCLUDED.precipitation;
+            DO UPDATE SET precipitation = EXCLUDED.precipitation
+            WHERE dashboard_app_precipitationrecords.precipitation IS DISTINCT FROM EXCLUDED.precipitation;
         """)
+        upserted = cursor.rowcount
+        # drop explicitly so the helper can run more than once per transaction
+        cursor.execute("DROP TABLE tmp_precip;")
+        return upserted
+
+def merge_staged(run_id):
+    """
+    Upsert the rows staged for `run_id`. DISTINCT ON keeps the latest staged
+    value should two shards ever overlap; unchanged rows are not rewritten
+    (no row lock, no dead tuple). Returns rows inserted or changed.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO dashboard_app_precipitationrecords (city_id, date, precipitation)
+            SELECT DISTINCT ON (city_id, date) city_id, date, precipitation
+            FROM dashboard_app_stagedprecipitation
+            WHERE run_id = %s
+            ORDER BY city_id, date, id DESC
+            ON CONFLICT (city_id, date)
+            DO UPDATE SET precipitation = EXCLUDED.precipitation
+            WHERE dashboard_app_precipitationrecords.precipitation IS DISTINCT FROM EXCLUDED.precipitation;
+        """, [run_id])
+        return cursor.rowcount
+
+def prune_records(today, batch_size=PRUNE_BATCH_SIZE):
+    """
+    Drop precipitation records outside [today - 3 days, today + 7 days] in
+    batches of `batch_size`, each in its own transaction. Past rows are moved
+    into the history archive (and their monthly rollups refreshed) rather
+    than lost. Then drop warning-change log entries past their retention.
+    Returns records pruned.
+    """
+    lower_cutoff = today - timedelta(days=3)
+    upper_cutoff = today + timedelta(days=7)
+    pruned, _ = archive_and_prune(lower_cutoff, upper_cutoff, batch_size)
+    WarningChange.objects.filter(
+        changed_at__lt=timezone.now() - timedelta(days=WARNING_CHANGE_RETENTION_DAYS)
+    ).delete()
+    return pruned
+
+def update_populations(pop_map, version=None):
+    """
+    Set the OWM-reported populations in one statement, stamping changed cities
+    with `version` (a new one, bumped in the caller's transaction, if None).
+    Returns rows changed.
+    """
+    if not pop_map:
+        return 0
+    if version is None:
+        version = DatasetVersion.bump()
+    city_ids = list(pop_map)
+    populations = [pop_map[city_id] for city_id in city_ids]
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            UPDATE dashboard_app_africancity AS c
+            SET population = v.population, updated_version = %s
+            FROM unnest(%s::bigint[], %s::bigint[]) AS v(id, population)
+            WHERE c.id = v.id AND c.population IS DISTINCT FROM v.population;
+        """, [version, city_ids, populations])
+        return cursor.rowcount
 
 class Command(BaseCommand):
-    help = "Fetch forecasts, update population, recompute warnings (cities + watersheds), prune old/future, and report completion time."
+    help = (
+        "Fetch forecasts, update population, recompute warnings (cities + watersheds), prune old/future, "
+        "and report completion time. Supports sharded fetching across processes or hosts "
+        "(--shard/--stage-only + --finalize, or --workers N)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--report-file",
+            default="-",
+            help="Append the per-phase JSON-lines report to this file ('-' for stdout, the default).",
+        )
+        parser.add_argument(
+            "--record-history",
+            action="store_true",
+            help="Also store the run report in the ImportRun history table.",
+        )
+        parser.add_argument(
+            "--shard",
+            help="Only fetch shard i of n ('i/n'), e.g. --shard 0/4.",
+        )
+        parser.add_argument(
+            "--shard-by",
+            choices=SHARD_KEYS,
+            default="id",
+            help="Split cities by id %% n (default) or by watershed_id %% n.",
+        )
+        parser.add_argument(
+            "--stage-only",
+            action="store_true",
+            help="Worker mode: fetch and write to the staging tables only (needs --run-id).",
+        )
+        parser.add_argument(
+            "--finalize",
+            action="store_true",
+            help="Coordinator mode: merge the rows staged for --run-id and recompute warnings, without fetching.",
+        )
+        parser.add_argument(
+            "--run-id",
+            help="Identifier shared by the shard workers and the coordinator of one run.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Fetch with N local worker processes (one shard each), then merge once.",
+        )
 
     def handle(self, *args, **options):
-        cities = list(AfricanCity.objects.all())
+        if options["shard"]:
+            try:
+                options["shard"] = parse_shard(options["shard"])
+            except ValueError as e:
+                raise CommandError(str(e))
+        if (options["stage_only"] or options["finalize"]) and not options["run_id"]:
+            raise CommandError("--stage-only and --finalize need --run-id.")
+        if options["stage_only"] and options["finalize"]:
+            raise CommandError("--stage-only and --finalize are mutually exclusive.")
+        if options["workers"] > 1 and (options["shard"] or options["stage_only"] or options["finalize"]):
+            raise CommandError("--workers runs every shard itself; don't combine it with --shard/--stage-only/--finalize.")
+
+        if not options["finalize"] and not settings.OWM_API_KEY:
+            raise CommandError("OWM_API_KEY is not set (environment or .env file); it is needed to fetch forecasts.")
+
+        if options["stage_only"]:
+            # shard workers only touch their own staging rows; the coordinator takes the lock
+            self.run_import(options)
+            return
+
+        # Advisory locks are re-entrant per session, so this also succeeds when
+        # run_scheduler already holds the job lock on this connection.
+        with advisory_lock("import_precipitation") as acquired:
+            if not acquired:
+                raise CommandError("Another import_precipitation run is in progress; not starting.")
+            self.run_import(options)
+
+    def run_import(self, options):
+        report = ImportReport("import_precipitation")
+        run_id = options["run_id"] or report.run_id
         start = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.stdout.write(f"[>>] Starting fetch for {len(cities)} cities at {start}")
-
-        all_records, pop_map = asyncio.run(fetch_all(cities))
-
-        with transaction.atomic():
-            # 1) bulk upsert precipitation values
-            bulk_upsert(all_records)
-
-            # 2) prune old / future precipitation records
-            today = date.today()
-            lower_cutoff = today - timedelta(days=3)
-            upper_cutoff = today + timedelta(days=7)
-            PrecipitationRecords.objects.filter(date__lt=lower_cutoff).delete()
-            PrecipitationRecords.objects.filter(date__gt=upper_cutoff).delete()
-
-            # 3) update each city's population (if provided by OWM)
-            for city_id, population in pop_map.items():
-                AfricanCity.objects.filter(id=city_id).update(population=population)
-
-            # 4) recompute each city's own warning_level (4‐day rolling sum)
-            for city in AfricanCity.objects.all():
-                recs = PrecipitationRecords.objects.filter(city=city).order_by("date")
-                vals = [r.precipitation for r in recs if r.precipitation is not None]
-
-                max_sum = 0.0
-                window_sum = 0.0
-                dq = deque()
-
-                for v in vals:
-                    dq.append(v)
-                    window_sum += v
-                    if len(dq) > 4:
-                        window_sum -= dq.popleft()
-                    if window_sum > max_sum:
-                        max_sum = window_sum
-
-                new_level = "green"
-                if max_sum > 40:
-                    new_level = "red"
-                elif max_sum > 10:
-                    new_level = "orange"
-
-                if city.warning_level != new_level:
-                    AfricanCity.objects.filter(id=city.id).update(warning_level=new_level)
-
-            for ws in Watershed.objects.all():
-                city_ids = list(ws.cities.values_list("id", flat=True))
-                if not city_ids:
-                    continue
 
-                # Get precipitation records for these cities
-                records = PrecipitationRecords.objects.filter(city_id__in=city_ids)
-
-                # Group by date: {date -> list of precip values from all cities}
-                daily_precip = defaultdict(list)
-                for r in records:
-                    if r.precipitation is not None:
-                        daily_precip[r.date].append(r.precipitation)
-
-                # Average per day: {date -> avg precipitation}
-                daily_avg = {}
-                for dt, values in daily_precip.items():
-                    if values:
-                        daily_avg[dt] = sum(values) / len(values)
-
-                # Sort by date
-                sorted_dates = sorted(daily_avg.keys())
-                values = [daily_avg[dt] for dt in sorted_dates]
-
-                max_sum = 0.0
-                window_sum = 0.0
-                dq = deque()
-
-                for v in values:
-                    dq.append(v)
-                    window_sum += v
-                    if len(dq) > 4:
-                        window_sum -= dq.popleft()
-                    if window_sum > max_sum:
-                        max_sum = window_sum
-
-                new_level = "green"
-                if max_sum > 40:
-                    new_level = "red"
-                elif max_sum > 10:
-                    new_level = "orange"
-
-                if ws.warning_level != new_level:
-                    ws.warning_level = new_level
-                    ws.save(update_fields=["warning_level"])
-            # ───────────────────────────────────────────────────────────────────
+        try:
+            if options["finalize"]:
+                self.stdout.write(f"[>>] Finalizing staged run {run_id} at {start}")
+
+            elif options["workers"] > 1:
+                self.stdout.write(f"[>>] Starting fetch with {options['workers']} workers at {start}")
+                with report.phase("fetch") as phase:
+                    phase.update(self.fetch_with_workers(run_id, options["workers"], options["shard_by"]))
+
+            else:
+                index, count = options["shard"] or (0, 1)
+                cities = list(shard_queryset(index, count, options["shard_by"]))
+                self.stdout.write(f"[>>] Starting fetch for {len(cities)} cities at {start}")
+
+                with report.phase("fetch") as phase:
+                    fetch_stats = FetchStats()
+                    all_records, pop_map = asyncio.run(fetch_all(cities, fetch_stats, shards=count))
+                    phase.update(fetch_stats.as_dict())
+                    phase["records_fetched"] = len(all_records)
+                    phase["shard"] = f"{index}/{count}"
+
+                # Stage off to the side (UNLOGGED table, autocommit): no locks
+                # on the tables the API reads while the data is being loaded.
+                with report.phase("stage") as phase:
+                    stage_records(run_id, all_records, pop_map)
+                    phase["rows_staged"] = len(all_records)
+
+            if not options["stage_only"]:
+                self.write_phases(report, run_id=run_id)
+                clear_staging(run_id, stale_after=STALE_STAGING)
+        except BaseException:
+            if not (options["stage_only"] or options["finalize"]):
+                # no coordinator will ever merge this run's rows; a failed
+                # --finalize keeps them so it can be retried
+                clear_staging(run_id)
+            report.finish("failed")
+            self.write_report(report, options)
+            raise
+
+        report.finish()
+        self.write_report(report, options)
 
         end = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         self.stdout.write(f"Update complete at {end}")
+
+    def fetch_with_workers(self, run_id, workers, shard_by):
+        """Run one fetch-and-stage shard per worker process; returns merged fetch counters."""
+        totals = FetchStats()
+        rows = 0
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=init_worker) as pool:
+            futures = [
+                pool.submit(worker_stage_shard, run_id, index, workers, shard_by)
+                for index in range(workers)
+            ]
+            for future in futures:
+                stats, staged, _ = future.result()
+                totals.merge(stats)
+                rows += staged
+        return {**totals.as_dict(), "records_fetched": rows, "workers": workers}
+
+    def write_report(self, report, options):
+        report.write(options["report_file"], self.stdout, options["record_history"])
+
+    def write_phases(self, report, all_records=(), pop_map=None, run_id=None):
+        """
+        Apply fetched data: either the rows staged under `run_id` (the normal
+        path) or the in-memory `all_records`/`pop_map`.
+
+        Each phase runs in its own short transaction (pruning in batches), so
+        row locks are held for seconds rather than for the whole import and
+        API readers/vacuum are never blocked behind one long transaction.
+        Readers may briefly see new precipitation with the previous warnings.
+
+        A phase that changes city/watershed rows bumps the dataset version
+        inside its own transaction, so a new version only becomes visible
+        together with the rows stamped with it: a `?since=` client can never
+        read version N before all of N's rows are committed and then skip
+        them on its next sync.
+        """
+        # 1) merge the new precipitation values
+        with report.phase("upsert") as phase, transaction.atomic():
+            if run_id is not None:
+                phase["rows_upserted"] = merge_staged(run_id)
+                pop_map = staged_populations(run_id)
+            else:
+                phase["rows_upserted"] = bulk_upsert(all_records)
+
+        # 2) prune old / future precipitation records (batched, one transaction per batch)
+        with report.phase("prune") as phase:
+            phase["rows_pruned"] = prune_records(date.today())
+
+        # 3) update each city's population (if provided by OWM)
+        with report.phase("populations") as phase, transaction.atomic():
+            phase["populations_updated"] = update_populations(pop_map)
+
+        # 4-7) city warnings, area weights, watershed warnings, country summaries
+        run_warning_phases(report)
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard_app.alerts import run_warning_phases
+from dashboard_app.import_report import ImportReport
+from dashboard_app.scheduler import advisory_lock
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-evaluate the warning rules against the precipitation already in the database "
+        "(no fetch) and update city/watershed warning levels and the country summaries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--report-file", default="-",
+                            help="Append the timing report to this file ('-' for stdout).")
+        parser.add_argument("--record-history", action="store_true",
+                            help="Also store the report in the ImportRun table.")
+
+    def handle(self, *args, **options):
+        # same lock as the import: both write warning levels
+        with advisory_lock("import_precipitation") as acquired:
+            if not acquired:
+                raise CommandError("import_precipitation is running; try again when it finishes.")
+
+            report = ImportReport("recompute_warnings")
+            try:
+                # the same phases the import runs after its data phases
+                run_warning_phases(report)
+            except BaseException:
+                report.finish("failed")
+                report.write(options["report_file"], self.stdout, options["record_history"])
+                raise
+            report.finish()
+            report.write(options["report_file"], self.stdout, options["record_history"])
@@ -0,0 +1,141 @@
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard_app.benchmarks import scenarios, startup, synthetic
+
+SCENARIOS = ("endpoints", "write_phases", "import", "startup")
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the benchmark scenarios (API endpoints, import write phases, import end-to-end "
+        "against a local OWM stub, cold start of manage.py and WSGI workers) and save the results as JSON for comparison between commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scenario", action="append", choices=SCENARIOS,
+                            help="Scenario(s) to run (default: all).")
+        parser.add_argument("--generate", action="store_true",
+                            help="Replace the synthetic dataset before running.")
+        parser.add_argument("--cities", type=int, default=1000)
+        parser.add_argument("--watersheds", type=int, default=100)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--latency-ms", type=float, default=50.0, help="OWM stub mean latency.")
+        parser.add_argument("--jitter-ms", type=float, default=10.0, help="OWM stub latency std-dev.")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="OWM stub 5xx probability.")
+        parser.add_argument("--rate-limited", action="store_true",
+                            help="Keep the import's client-side rate-limit pause.")
+        parser.add_argument("--output", help="Results file (default: bench_results/<commit>-<time>.json).")
+        parser.add_argument("--compare", help="Previous results file to print deltas against.")
+        parser.add_argument("--allow-real-data", action="store_true",
+                            help="Run even if non-synthetic cities/watersheds exist. The import "
+                                 "scenario overwrites their records with stub data.")
+
+    def handle(self, *args, **options):
+        if synthetic.has_real_data() and not options["allow_real_data"]:
+            raise CommandError(
+                "The database contains non-synthetic data; refusing to benchmark against it. "
+                "Use a dedicated database or pass --allow-real-data."
+            )
+
+        if options["generate"]:
+            synthetic.clear()
+            generated = synthetic.generate(
+                cities=options["cities"], watersheds=options["watersheds"], seed=options["seed"]
+            )
+            self.stdout.write(f"Generated {generated}")
+
+        selected = options["scenario"] or SCENARIOS
+        results = {
+            "commit": _git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "dataset": synthetic.counts(),
+            "scenarios": {},
+        }
+
+        if "endpoints" in selected:
+            endpoints = {}
+            for name, path in scenarios.endpoint_paths().items():
+                endpoints[name] = scenarios.bench_endpoint(path, repeat=options["repeat"])
+                self.stdout.write(
+                    f"  endpoint {name:18} median {endpoints[name]['median_s'] * 1000:8.1f} ms  "
+                    f"{endpoints[name]['queries']:3} queries  {endpoints[name]['bytes']:>10} B"
+                )
+            results["scenarios"]["endpoints"] = endpoints
+
+        if "write_phases" in selected:
+            phases = scenarios.bench_write_phases(repeat=options["repeat"])
+            for name, stats in phases.items():
+                self.stdout.write(
+                    f"  phase    {name:18} median {stats['median_s'] * 1000:8.1f} ms  "
+                    f"{stats['queries']:3} queries"
+                )
+            results["scenarios"]["write_phases"] = phases
+
+        if "import" in selected:
+            run = scenarios.bench_import(
+                latency_ms=options["latency_ms"],
+                jitter_ms=options["jitter_ms"],
+                error_rate=options["error_rate"],
+                rate_limited=options["rate_limited"],
+            )
+            self.stdout.write(f"  import end-to-end {run['seconds']:.2f} s, {run['queries']} queries")
+            results["scenarios"]["import"] = run
+
+        if "startup" in selected:
+            boot = startup.bench_startup(repeat=options["repeat"])
+            for name, stats in boot.items():
+                self.stdout.write(f"  startup  {name:32} median {stats['median_s'] * 1000:8.1f} ms")
+            results["scenarios"]["startup"] = boot
+
+        output = options["output"]
+        if not output:
+            stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            output = os.path.join("bench_results", f"{results['commit'] or 'nogit'}-{stamp}.json")
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        with open(output, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as fh:
+                self.print_comparison(json.load(fh), results)
+
+    def print_comparison(self, before, after):
+        self.stdout.write(f"Comparison {before.get('commit')} → {after.get('commit')}:")
+        for group in ("endpoints", "write_phases", "startup"):
+            old_group = before["scenarios"].get(group, {})
+            for name, new in after["scenarios"].get(group, {}).items():
+                old = old_group.get(name)
+                if not old:
+                    continue
+                change = (new["median_s"] - old["median_s"]) / old["median_s"] * 100 if old["median_s"] else 0.0
+                self.stdout.write(
+                    f"  {group}/{name:18} {old['median_s'] * 1000:8.1f} → {new['median_s'] * 1000:8.1f} ms "
+                    f"({change:+.0f}%)  queries {old.get('queries', '-')} → {new.get('queries', '-')}"
+                )
+        old_import = before["scenarios"].get("import")
+        new_import = after["scenarios"].get("import")
+        if old_import and new_import:
+            self.stdout.write(
+                f"  import end-to-end {old_import['seconds']:.2f} → {new_import['seconds']:.2f} s, "
+                f"queries {old_import['queries']} → {new_import['queries']}"
+            )
@@ -0,0 +1,65 @@
+import signal
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from dashboard_app.scheduler import Job
+
+TICK_SECONDS = 5
+
+
+class Command(BaseCommand):
+    help = (
+        "Long-running scheduler: triggers the jobs in settings.SCHEDULER_JOBS on their cron "
+        "schedules, holding a PostgreSQL advisory lock per job so runs never overlap, "
+        "and records each run's duration in the ImportRun table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--run-now", action="append", default=[], metavar="JOB",
+                            help="Trigger this job immediately on start-up (repeatable).")
+        parser.add_argument("--list", action="store_true", help="Print the jobs and their next run, then exit.")
+
+    def handle(self, *args, **options):
+        jobs = [Job.from_setting(spec) for spec in getattr(settings, "SCHEDULER_JOBS", [])]
+        if not jobs:
+            raise CommandError("settings.SCHEDULER_JOBS is empty.")
+        by_name = {job.name: job for job in jobs}
+
+        for job in jobs:
+            self.log(f"[{job.name}] '{job.schedule}' → {job.command} {' '.join(job.args)} "
+                     f"(overlap={job.overlap}), next run {job.next_run:%Y-%m-%d %H:%M}")
+        if options["list"]:
+            return
+
+        stopping = []
+        def request_stop(signum, frame):
+            stopping.append(signum)
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+
+        for name in options["run_now"]:
+            if name not in by_name:
+                raise CommandError(f"Unknown job {name!r}.")
+            by_name[name].trigger(self.log)
+
+        while not stopping:
+            now = datetime.now()
+            for job in jobs:
+                if now >= job.next_run:
+                    job.next_run = job.schedule.next_after(now)
+                    job.trigger(self.log)
+                elif job.pending and not job.running:
+                    job.trigger(self.log)
+            close_old_connections()
+            time.sleep(TICK_SECONDS)
+
+        self.log("Stopping; waiting for running jobs to finish…")
+        while any(job.running for job in jobs):
+            time.sleep(1)
+
+    def log(self, message):
+        self.stdout.write(f"{datetime.now():%Y-%m-%d %H:%M:%S} {message}")
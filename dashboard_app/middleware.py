@@ -0,0 +1,157 @@
+# dashboard_app/middleware.py
+
+import re
+import time
+from importlib.util import find_spec
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+from . import instrumentation, routers
+
+
+class PerformanceMiddleware:
+    """
+    Record per-view wall time, DB query count/time, serialization time and
+    response size. Feeds the Prometheus histograms served at /metrics and,
+    with settings.SERVER_TIMING_ENABLED, adds a `Server-Timing` header.
+
+    Works for both the sync DRF views and the async views.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats, token = instrumentation.begin_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            instrumentation.end_request(token)
+        return self._finish(request, response, stats)
+
+    async def __acall__(self, request):
+        stats, token = instrumentation.begin_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            instrumentation.end_request(token)
+        return self._finish(request, response, stats)
+
+    def _finish(self, request, response, stats):
+        total = time.perf_counter() - stats.start
+        if settings.SERVER_TIMING_ENABLED:
+            response["Server-Timing"] = instrumentation.server_timing_header(stats, total)
+
+        match = getattr(request, "resolver_match", None)
+        if match is None or match.url_name == "metrics":
+            return response
+
+        size = None if response.streaming else len(response.content)
+        instrumentation.record(match.view_name, stats, total, size)
+        return response
+
+
+class ReadYourWritesMiddleware:
+    """
+    After a successful write request (POST/PUT/PATCH/DELETE), pin the client
+    to the primary database for REPLICA_PIN_SECONDS with a cookie, so views
+    that normally read from the replica (see routers.py) show it its own
+    changes despite replication lag. No-op without a replica.
+    """
+    sync_capable = True
+    async_capable = True
+
+    UNSAFE_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self._finish(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self._finish(request, await self.get_response(request))
+
+    def _finish(self, request, response):
+        if (
+            request.method in self.UNSAFE_METHODS
+            and response.status_code < 400
+            and routers.replica_alias() is not None
+        ):
+            response.set_cookie(
+                routers.PIN_COOKIE, "1",
+                max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite="Lax",
+            )
+        return response
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Brotli-compress API payloads for clients that accept `br` (when the
+    `brotli` package is installed), gzip for the rest (Django's
+    GZipMiddleware). Ranged/immutable file downloads and event streams are
+    left alone: compressing them would break byte ranges or delay events.
+
+    Brotli is limited to the API media types in BROTLI_MEDIA_TYPES: HTML
+    pages (the admin) carry CSRF tokens, and compressing secrets alongside
+    attacker-influenced content is what BREACH exploits. Those keep Django's
+    gzip, which pads its output against it.
+    """
+    BROTLI_QUALITY = 5  # close to gzip's speed, noticeably smaller output
+    BROTLI_MEDIA_TYPES = {
+        "application/json",
+        "application/vnd.ews.series+json",
+        "application/msgpack",
+        "application/vnd.apache.arrow.stream",
+    }
+    MIN_SIZE = 200
+    _accepts_br = re.compile(r"\bbr\b")
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.brotli = None
+        if find_spec("brotli"):
+            import brotli
+
+            self.brotli = brotli
+
+    def process_response(self, request, response):
+        if response.has_header("Accept-Ranges") or response.get("Content-Type", "").startswith("text/event-stream"):
+            return response
+        if (
+            self.brotli is None
+            or response.get("Content-Type", "").split(";")[0].strip() not in self.BROTLI_MEDIA_TYPES
+            or response.streaming
+            or response.has_header("Content-Encoding")
+            or len(response.content) < self.MIN_SIZE
+            or not self._accepts_br.search(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        ):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        compressed = self.brotli.compress(response.content, quality=self.BROTLI_QUALITY)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = "br"
+        # the representation changed: a strong ETag would now be wrong
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        return response
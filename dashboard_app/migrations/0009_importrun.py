@@ -0,0 +1,39 @@
+# Generated by Django 5.2.1 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dashboard_app", "0008_alter_watershed_geom_alter_watershed_name_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("run_id", models.CharField(max_length=32, unique=True)),
+                (
+                    "command",
+                    models.CharField(default="import_precipitation", max_length=50),
+                ),
+                ("status", models.CharField(default="success", max_length=10)),
+                ("started_at", models.DateTimeField(db_index=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                ("duration_seconds", models.FloatField(blank=True, null=True)),
+                ("report", models.JSONField(blank=True, default=dict)),
+            ],
+            options={
+                "ordering": ["-started_at"],
+            },
+        ),
+    ]
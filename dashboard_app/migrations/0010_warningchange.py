@@ -0,0 +1,41 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dashboard_app", "0009_importrun"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WarningChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "entity_type",
+                    models.CharField(
+                        choices=[("city", "City"), ("watershed", "Watershed")],
+                        max_length=10,
+                    ),
+                ),
+                ("entity_id", models.BigIntegerField()),
+                ("entity_name", models.CharField(max_length=100)),
+                ("old_level", models.CharField(max_length=6)),
+                ("new_level", models.CharField(max_length=6)),
+                ("changed_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                "ordering": ["id"],
+            },
+        ),
+    ]
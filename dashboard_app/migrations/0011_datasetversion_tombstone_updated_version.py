@@ -0,0 +1,62 @@
+# Generated by Django 5.2.1 on 2026-10-19 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dashboard_app", "0010_warningchange"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DatasetVersion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("version", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="Tombstone",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "entity_type",
+                    models.CharField(
+                        choices=[("city", "City"), ("watershed", "Watershed")],
+                        max_length=10,
+                    ),
+                ),
+                ("entity_id", models.BigIntegerField()),
+                ("version", models.BigIntegerField(db_index=True)),
+                ("deleted_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="africancity",
+            name="updated_version",
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="watershed",
+            name="updated_version",
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+    ]
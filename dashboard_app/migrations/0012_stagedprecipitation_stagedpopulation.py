@@ -0,0 +1,71 @@
+# Generated by Django 5.2.1 on 2026-10-19 15:20
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dashboard_app", "0011_datasetversion_tombstone_updated_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StagedPopulation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("run_id", models.CharField(db_index=True, max_length=32)),
+                ("city_id", models.BigIntegerField()),
+                ("population", models.BigIntegerField()),
+                (
+                    "staged_at",
+                    models.DateTimeField(
+                        db_default=django.db.models.functions.datetime.Now()
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="StagedPrecipitation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("run_id", models.CharField(db_index=True, max_length=32)),
+                ("city_id", models.BigIntegerField()),
+                ("date", models.DateField()),
+                ("precipitation", models.FloatField(blank=True, null=True)),
+                (
+                    "staged_at",
+                    models.DateTimeField(
+                        db_default=django.db.models.functions.datetime.Now()
+                    ),
+                ),
+            ],
+        ),
+        # Staging data is disposable: skip WAL for faster COPY/merge.
+        migrations.RunSQL(
+            sql=[
+                "ALTER TABLE dashboard_app_stagedprecipitation SET UNLOGGED;",
+                "ALTER TABLE dashboard_app_stagedpopulation SET UNLOGGED;",
+            ],
+            reverse_sql=[
+                "ALTER TABLE dashboard_app_stagedprecipitation SET LOGGED;",
+                "ALTER TABLE dashboard_app_stagedpopulation SET LOGGED;",
+            ],
+        ),
+    ]
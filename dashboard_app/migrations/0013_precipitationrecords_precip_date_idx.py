@@ -0,0 +1,16 @@
+# Generated by Django 5.2.1 on 2026-10-19 16:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dashboard_app", "0012_stagedprecipitation_stagedpopulation"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="precipitationrecords",
+            index=models.Index(fields=["date"], name="precip_date_idx"),
+        ),
+    ]
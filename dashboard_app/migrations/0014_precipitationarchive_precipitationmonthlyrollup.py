@@ -0,0 +1,78 @@
+# Generated by Django 5.2.1 on 2026-10-19 18:02
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dashboard_app", "0013_precipitationrecords_precip_date_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PrecipitationArchive",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("city_id", models.BigIntegerField()),
+                ("date", models.DateField()),
+                ("precipitation", models.FloatField(blank=True, null=True)),
+                (
+                    "archived_at",
+                    models.DateTimeField(
+                        db_default=django.db.models.functions.datetime.Now()
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    django.contrib.postgres.indexes.BrinIndex(
+                        fields=["date"], name="precip_archive_date_brin"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("city_id", "date"), name="precip_archive_city_date_uniq"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="PrecipitationMonthlyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("city_id", models.BigIntegerField()),
+                ("month", models.DateField(help_text="First day of the month")),
+                ("days", models.IntegerField()),
+                ("wet_days", models.IntegerField()),
+                ("total", models.FloatField()),
+                ("mean", models.FloatField(blank=True, null=True)),
+                ("max", models.FloatField(blank=True, null=True)),
+            ],
+            options={
+                "ordering": ["month"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("city_id", "month"), name="precip_rollup_city_month_uniq"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.1 on 2026-10-19 19:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dashboard_app", "0014_precipitationarchive_precipitationmonthlyrollup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CountrySummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("country_code", models.CharField(max_length=10, unique=True)),
+                ("country", models.CharField(max_length=50)),
+                ("region", models.CharField(blank=True, max_length=20)),
+                ("cities", models.IntegerField(default=0)),
+                ("green", models.IntegerField(default=0)),
+                ("orange", models.IntegerField(default=0)),
+                ("red", models.IntegerField(default=0)),
+                (
+                    "population_at_risk",
+                    models.BigIntegerField(
+                        default=0, help_text="Population of orange + red cities"
+                    ),
+                ),
+                ("worst_watershed_level", models.CharField(blank=True, max_length=6)),
+                ("dataset_version", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "worst_watershed",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="dashboard_app.watershed",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["country"],
+            },
+        ),
+    ]
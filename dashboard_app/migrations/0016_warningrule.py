@@ -0,0 +1,107 @@
+# Generated by Django 5.2.1 on 2026-10-19 20:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dashboard_app", "0015_countrysummary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WarningRule",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                (
+                    "scope",
+                    models.CharField(
+                        choices=[
+                            ("global", "Global"),
+                            ("country", "Country"),
+                            ("watershed", "Watershed"),
+                        ],
+                        default="global",
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "country_code",
+                    models.CharField(
+                        blank=True,
+                        help_text="For country rules: AfricanCity.country_code",
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "window_days",
+                    models.PositiveSmallIntegerField(
+                        default=4, help_text="Rolling window length in days"
+                    ),
+                ),
+                (
+                    "orange_threshold",
+                    models.FloatField(default=10, help_text="mm over the window"),
+                ),
+                (
+                    "red_threshold",
+                    models.FloatField(default=40, help_text="mm over the window"),
+                ),
+                ("active", models.BooleanField(default=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "watershed",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="warning_rules",
+                        to="dashboard_app.watershed",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["scope", "country_code", "watershed_id", "id"],
+                "constraints": [
+                    models.CheckConstraint(
+                        condition=models.Q(
+                            ("window_days__gte", 1),
+                            ("red_threshold__gt", models.F("orange_threshold")),
+                        ),
+                        name="warning_rule_valid_thresholds",
+                    ),
+                    models.CheckConstraint(
+                        condition=models.Q(
+                            models.Q(
+                                ("country_code", ""),
+                                ("scope", "global"),
+                                ("watershed__isnull", True),
+                            ),
+                            models.Q(
+                                ("scope", "country"),
+                                ("watershed__isnull", True),
+                                models.Q(("country_code", ""), _negated=True),
+                            ),
+                            models.Q(
+                                ("country_code", ""),
+                                ("scope", "watershed"),
+                                ("watershed__isnull", False),
+                            ),
+                            _connector="OR",
+                        ),
+                        name="warning_rule_scope_target",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.1 on 2026-10-19 20:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dashboard_app", "0016_warningrule"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="watershed",
+            name="population_warning_level",
+            field=models.CharField(
+                choices=[("green", "Green"), ("orange", "Orange"), ("red", "Red")],
+                default="green",
+                help_text="Warning from the population-weighted mean of the basin's cities",
+                max_length=6,
+            ),
+        ),
+        migrations.AddField(
+            model_name="watershed",
+            name="area_warning_level",
+            field=models.CharField(
+                choices=[("green", "Green"), ("orange", "Orange"), ("red", "Red")],
+                default="green",
+                help_text="Warning from the Voronoi-area-weighted mean of the basin's cities",
+                max_length=6,
+            ),
+        ),
+        migrations.CreateModel(
+            name="CityAreaWeight",
+            fields=[
+                (
+                    "city",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="area_weight",
+                        serialize=False,
+                        to="dashboard_app.africancity",
+                    ),
+                ),
+                ("area_km2", models.FloatField()),
+                ("signature", models.CharField(max_length=32)),
+                (
+                    "watershed",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="dashboard_app.watershed",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.1 on 2026-10-19 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("dashboard_app", "0017_watershed_weighted_levels_cityareaweight"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="africancity",
+            name="country_code",
+            field=models.CharField(db_index=True, default="N/A", max_length=10),
+        ),
+        migrations.AlterField(
+            model_name="africancity",
+            name="warning_level",
+            field=models.CharField(
+                choices=[("green", "Green"), ("orange", "Orange"), ("red", "Red")],
+                db_index=True,
+                default="green",
+                help_text="Precomputed 4-day precipitation warning",
+                max_length=6,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="watershed",
+            name="warning_level",
+            field=models.CharField(
+                choices=[("green", "Green"), ("orange", "Orange"), ("red", "Red")],
+                db_index=True,
+                default="green",
+                help_text="Precomputed 4-day precipitation warning for the watershed",
+                max_length=6,
+            ),
+        ),
+    ]
@@ -1,10 +1,130 @@
 # dashboard_app/models.py
 
+from contextlib import contextmanager
+from contextvars import ContextVar
+
 from django.contrib.gis.db import models as gis_models
-from django.db import models
-from django.db.models import Avg, Q
+from django.contrib.postgres.indexes import BrinIndex
+from django.db import connection, models, router, transaction
+from django.db.models import Avg, F, Q, Sum
+from django.db.models.functions import Now
+
+
+class DatasetVersion(models.Model):
+    """
+    Single-row, monotonically increasing version of the city/watershed dataset.
+    Every change to those rows stamps them with a fresh version so clients can
+    ask for "everything since version N".
+    """
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def current(cls):
+        return cls.objects.filter(pk=1).values_list("version", flat=True).first() or 0
+
+    @classmethod
+    async def acurrent(cls):
+        return await cls.objects.filter(pk=1).values_list("version", flat=True).afirst() or 0
+
+    @classmethod
+    def bump(cls):
+        """Atomically increment the version and return the new value."""
+        table = cls._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {table} (id, version, updated_at) VALUES (1, 1, now())
+                ON CONFLICT (id) DO UPDATE
+                SET version = {table}.version + 1, updated_at = now()
+                RETURNING version;
+            """)
+            return cursor.fetchone()[0]
+
+
+class VersionedQuerySet(models.QuerySet):
+    def delete(self):
+        # one version bump and one tombstone INSERT for the whole deletion
+        with Tombstone.batch(using=self.db):
+            return super().delete()
+
+
+class VersionedModel(models.Model):
+    """
+    Rows stamped with the dataset version of their last change. save() bumps
+    the version; bulk .update() callers must set `updated_version` themselves.
+    Deletions leave Tombstones (see signals.py).
+    """
+    updated_version = models.BigIntegerField(default=0, db_index=True, editable=False)
+
+    objects = VersionedQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "updated_version"}
+        # the new version must not become visible before the row stamped with it
+        with transaction.atomic(using=kwargs.get("using") or router.db_for_write(type(self), instance=self)):
+            self.updated_version = DatasetVersion.bump()
+            super().save(*args, **kwargs)
+
+    def delete(self, using=None, keep_parents=False):
+        # cascaded deletions included: one version bump, one tombstone INSERT
+        with Tombstone.batch(using=using or self._state.db or "default"):
+            return super().delete(using=using, keep_parents=keep_parents)
+
+
+_pending_tombstones = ContextVar("pending_tombstones", default=None)
+
+
+class Tombstone(models.Model):
+    """Deleted city/watershed ids, so delta clients can drop them."""
+    entity_type = models.CharField(max_length=10, choices=[("city", "City"), ("watershed", "Watershed")])
+    entity_id = models.BigIntegerField()
+    version = models.BigIntegerField(db_index=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.entity_type} {self.entity_id} deleted at v{self.version}"
+
+    @classmethod
+    @contextmanager
+    def batch(cls, using="default"):
+        """
+        Collect the tombstones recorded inside the block and write them, all
+        stamped with a single new version, in one INSERT at its end, in the
+        same transaction as the deletion. Nested blocks join the outer one.
+        """
+        if _pending_tombstones.get() is not None:
+            yield
+            return
+        pending = []
+        token = _pending_tombstones.set(pending)
+        try:
+            with transaction.atomic(using=using):
+                yield
+                if pending:
+                    version = DatasetVersion.bump()
+                    cls.objects.using(using).bulk_create(
+                        [cls(entity_type=entity_type, entity_id=pk, version=version) for entity_type, pk in pending]
+                    )
+        finally:
+            _pending_tombstones.reset(token)
+
+    @classmethod
+    def record(cls, entity_type, entity_id, using="default"):
+        """Tombstone a deleted row (deferred to the enclosing batch, if any)."""
+        pending = _pending_tombstones.get()
+        if pending is None:
+            with cls.batch(using=using):
+                _pending_tombstones.get().append((entity_type, entity_id))
+        else:
+            pending.append((entity_type, entity_id))
+
 
-class Watershed(models.Model):
+class Watershed(VersionedModel):
     name = models.CharField(
         max_length=100,
         unique=True,
@@ -21,23 +141,50 @@ class Watershed(models.Model):
         max_length=6,
         choices=[("green", "Green"), ("orange", "Orange"), ("red", "Red")],
         default="green",
+        db_index=True,
         help_text="Precomputed 4-day precipitation warning for the watershed"
     )
+    population_warning_level = models.CharField(
+        max_length=6,
+        choices=[("green", "Green"), ("orange", "Orange"), ("red", "Red")],
+        default="green",
+        help_text="Warning from the population-weighted mean of the basin's cities"
+    )
+    area_warning_level = models.CharField(
+        max_length=6,
+        choices=[("green", "Green"), ("orange", "Orange"), ("red", "Red")],
+        default="green",
+        help_text="Warning from the Voronoi-area-weighted mean of the basin's cities"
+    )
 
     def __str__(self):
         return self.name
 
-    def average_precipitation_on(self, date):
+    def average_precipitation_on(self, date, weighting="mean"):
         """
         Return the average precipitation (Float) over all cities in this watershed
         for a given `date`. If no records exist, returns None.
+
+        `weighting` is "mean" (plain average), "population" or "area" (the
+        cached Voronoi-cell areas, see CityAreaWeight); cities without a
+        weight are left out of weighted averages.
         """
+        records = PrecipitationRecords.objects.filter(city__watershed=self, date=date)
+        if weighting == "mean":
+            return records.aggregate(avg_precip=Avg("precipitation"))["avg_precip"]
+
+        weight = {"population": "city__population", "area": "city__area_weight__area_km2"}[weighting]
         result = (
-            PrecipitationRecords.objects
-                .filter(city__watershed=self, date=date)
-                .aggregate(avg_precip=Avg("precipitation"))
+            records
+                .filter(precipitation__isnull=False, **{f"{weight}__gt": 0})
+                .aggregate(
+                    weighted=Sum(F("precipitation") * F(weight), output_field=models.FloatField()),
+                    total=Sum(weight, output_field=models.FloatField()),
+                )
         )
-        return result["avg_precip"]
+        if not result["total"]:
+            return None
+        return result["weighted"] / result["total"]
 
     @classmethod
     def annotate_avg_precip_for_date(cls, date):
@@ -55,9 +202,9 @@ class Watershed(models.Model):
         )
 
 
-class AfricanCity(models.Model):
+class AfricanCity(VersionedModel):
     city = models.CharField(max_length=100)
-    country_code = models.CharField(max_length=10, default="N/A")
+    country_code = models.CharField(max_length=10, default="N/A", db_index=True)
     country = models.CharField(max_length=50)
 
     # Allow existing rows to remain NULL; you'll populate them in the import step
@@ -83,6 +230,7 @@ class AfricanCity(models.Model):
         max_length=6,
         choices=[("green", "Green"), ("orange", "Orange"), ("red", "Red")],
         default="green",
+        db_index=True,
         help_text="Precomputed 4-day precipitation warning"
     )
 
@@ -90,6 +238,27 @@ class AfricanCity(models.Model):
         return f"{self.city}, {self.country}"
 
 
+class CityAreaWeight(models.Model):
+    """
+    Cached area weight of a city inside its watershed: the city's Voronoi
+    cell (built from the basin's cities) clipped to the basin. Rebuilt per
+    watershed by weights.refresh_area_weights when the basin geometry or its
+    cities' locations change, which `signature` tracks.
+    """
+    city = models.OneToOneField(
+        AfricanCity,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="area_weight",
+    )
+    watershed = models.ForeignKey(Watershed, on_delete=models.CASCADE, related_name="+")
+    area_km2 = models.FloatField()
+    signature = models.CharField(max_length=32)
+
+    def __str__(self):
+        return f"city {self.city_id} in watershed {self.watershed_id}: {self.area_km2:.0f} km²"
+
+
 class PrecipitationRecords(models.Model):
     city = models.ForeignKey(
         AfricanCity,
@@ -102,11 +271,206 @@ class PrecipitationRecords(models.Model):
     class Meta:
         unique_together = ('city', 'date')  # Avoid one row per city+date
         ordering = ['date']
+        indexes = [
+            # range scans by date: pruning and archiving
+            models.Index(fields=['date'], name='precip_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.city.city} on {self.date}: {self.precipitation} mm"
 
 
+class CountrySummary(models.Model):
+    """
+    Per-country warning rollup, rebuilt at the end of every import so the
+    summary API never has to scan AfricanCity.
+    """
+    country_code = models.CharField(max_length=10, unique=True)
+    country = models.CharField(max_length=50)
+    region = models.CharField(max_length=20, blank=True)
+    cities = models.IntegerField(default=0)
+    green = models.IntegerField(default=0)
+    orange = models.IntegerField(default=0)
+    red = models.IntegerField(default=0)
+    population_at_risk = models.BigIntegerField(
+        default=0, help_text="Population of orange + red cities"
+    )
+    worst_watershed = models.ForeignKey(
+        Watershed,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    worst_watershed_level = models.CharField(max_length=6, blank=True)
+    dataset_version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['country']
+
+    def __str__(self):
+        return f"{self.country}: {self.red} red / {self.orange} orange / {self.green} green"
+
+
+class PrecipitationArchive(models.Model):
+    """
+    History of precipitation records pruned from the hot table, one row per
+    city and day (archiving a day again replaces its value).
+    Rows arrive roughly in date order, so a BRIN index on date stays tiny and
+    still makes date-range scans cheap. city_id is a plain column (no FK) so
+    history survives city deletion.
+    """
+    city_id = models.BigIntegerField()
+    date = models.DateField()
+    precipitation = models.FloatField(null=True, blank=True)
+    archived_at = models.DateTimeField(db_default=Now())
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['city_id', 'date'], name='precip_archive_city_date_uniq'),
+        ]
+        indexes = [
+            BrinIndex(fields=['date'], name='precip_archive_date_brin'),
+        ]
+
+    def __str__(self):
+        return f"city {self.city_id} on {self.date}: {self.precipitation} mm (archived)"
+
+
+class PrecipitationMonthlyRollup(models.Model):
+    """Per-city monthly aggregates of the archive; what the history API reads."""
+    city_id = models.BigIntegerField()
+    month = models.DateField(help_text="First day of the month")
+    days = models.IntegerField()
+    wet_days = models.IntegerField()
+    total = models.FloatField()
+    mean = models.FloatField(null=True, blank=True)
+    max = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['city_id', 'month'], name='precip_rollup_city_month_uniq'),
+        ]
+        ordering = ['month']
+
+    def __str__(self):
+        return f"city {self.city_id} {self.month:%Y-%m}: {self.total} mm"
+
+
+class StagedPrecipitation(models.Model):
+    """
+    UNLOGGED staging table: shard workers COPY their fetched forecasts here
+    (tagged with the run id) and the coordinator merges them in one step.
+    """
+    run_id = models.CharField(max_length=32, db_index=True)
+    city_id = models.BigIntegerField()
+    date = models.DateField()
+    precipitation = models.FloatField(null=True, blank=True)
+    staged_at = models.DateTimeField(db_default=Now())
+
+
+class StagedPopulation(models.Model):
+    """UNLOGGED staging table for the populations reported by OWM."""
+    run_id = models.CharField(max_length=32, db_index=True)
+    city_id = models.BigIntegerField()
+    population = models.BigIntegerField()
+    staged_at = models.DateTimeField(db_default=Now())
+
+
+class WarningChange(models.Model):
+    """
+    Log of warning-level transitions applied by the imports. The auto-increment
+    id doubles as the SSE event id for /api/warnings/stream/.
+    """
+    ENTITY_CHOICES = [("city", "City"), ("watershed", "Watershed")]
+
+    entity_type = models.CharField(max_length=10, choices=ENTITY_CHOICES)
+    entity_id = models.BigIntegerField()
+    entity_name = models.CharField(max_length=100)
+    old_level = models.CharField(max_length=6)
+    new_level = models.CharField(max_length=6)
+    changed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.entity_type} {self.entity_name}: {self.old_level} → {self.new_level}"
+
+
+class WarningRule(models.Model):
+    """
+    Window length and thresholds used to turn precipitation into a warning
+    level. The most specific active rule wins: watershed, then country, then
+    global; with no global rule the defaults in alerts.py apply. Watersheds
+    themselves use their own rule or the global one.
+    """
+    SCOPE_CHOICES = [("global", "Global"), ("country", "Country"), ("watershed", "Watershed")]
+
+    name = models.CharField(max_length=100)
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES, default="global")
+    country_code = models.CharField(
+        max_length=10, blank=True, help_text="For country rules: AfricanCity.country_code"
+    )
+    watershed = models.ForeignKey(
+        Watershed,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="warning_rules",
+    )
+    window_days = models.PositiveSmallIntegerField(default=4, help_text="Rolling window length in days")
+    orange_threshold = models.FloatField(default=10, help_text="mm over the window")
+    red_threshold = models.FloatField(default=40, help_text="mm over the window")
+    active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['scope', 'country_code', 'watershed_id', 'id']
+        constraints = [
+            models.CheckConstraint(
+                condition=Q(window_days__gte=1) & Q(red_threshold__gt=F("orange_threshold")),
+                name="warning_rule_valid_thresholds",
+            ),
+            models.CheckConstraint(
+                condition=(
+                    Q(scope="global", country_code="", watershed__isnull=True)
+                    | (Q(scope="country", watershed__isnull=True) & ~Q(country_code=""))
+                    | Q(scope="watershed", country_code="", watershed__isnull=False)
+                ),
+                name="warning_rule_scope_target",
+            ),
+        ]
+
+    def __str__(self):
+        target = {"country": self.country_code, "watershed": self.watershed_id}.get(self.scope, "")
+        return (
+            f"{self.name} ({self.scope} {target}".rstrip()
+            + f"): {self.window_days}d > {self.orange_threshold:g}/{self.red_threshold:g} mm"
+        )
+
+
+class ImportRun(models.Model):
+    """
+    One row per import run, with the per-phase timing report as JSON.
+    Used to track throughput over time and spot regressions.
+    """
+    run_id = models.CharField(max_length=32, unique=True)
+    command = models.CharField(max_length=50, default="import_precipitation")
+    status = models.CharField(max_length=10, default="success")
+    started_at = models.DateTimeField(db_index=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_seconds = models.FloatField(null=True, blank=True)
+    report = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"{self.command} {self.started_at:%Y-%m-%d %H:%M} ({self.status})"
+
+
 class TestGeo(models.Model):
     name = models.CharField(max_length=50)
     location = gis_models.PointField(srid=4326)
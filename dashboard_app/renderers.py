@@ -0,0 +1,144 @@
+# dashboard_app/renderers.py
+"""
+Compact renderers for precipitation series.
+
+The forecast endpoints negotiate (Accept header or `?format=`) between the
+legacy JSON list of {"date", "precipitation"} objects and these formats,
+which all encode the same columnar payload built by `forecast_series`:
+
+    {"start_date": "2026-10-19", "days": 8,
+     "series": [{"city_id": 1, "values": [0.0, 3.2, null, ...]}, ...]}
+
+  columnar  application/vnd.ews.series+json   the payload as JSON
+  msgpack   application/msgpack               needs `msgpack`
+  arrow     application/vnd.apache.arrow.stream   long table (city_id, date,
+                                              precipitation); needs `pyarrow`
+
+The optional formats are only offered when their package is installed.
+Error responses are not series and are always sent as plain JSON (see
+SeriesErrorsAsJSONMixin).
+"""
+
+from datetime import date, timedelta
+from importlib.util import find_spec
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.settings import api_settings
+
+
+def forecast_series(rows):
+    """
+    [(city_id, date, precipitation)] ordered by city then date → the
+    columnar payload. Values are dense from the earliest date to the latest;
+    days without a record are None.
+    """
+    rows = list(rows)
+    if not rows:
+        return {"start_date": None, "days": 0, "series": []}
+    start = min(r[1] for r in rows)
+    days = (max(r[1] for r in rows) - start).days + 1
+    series = {}
+    for city_id, day, precip in rows:
+        values = series.get(city_id)
+        if values is None:
+            values = series[city_id] = [None] * days
+        values[(day - start).days] = precip
+    return {
+        "start_date": start,
+        "days": days,
+        "series": [{"city_id": pk, "values": values} for pk, values in series.items()],
+    }
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    media_type = "application/vnd.ews.series+json"
+    format = "columnar"
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        import msgpack
+
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=_msgpack_default, use_bin_type=True)
+
+
+def _msgpack_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"can't serialize {type(value).__name__}")
+
+
+class ArrowStreamRenderer(BaseRenderer):
+    media_type = "application/vnd.apache.arrow.stream"
+    format = "arrow"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        import pyarrow as pa
+
+        start, days = data["start_date"], data["days"]
+        dates = [start + timedelta(days=i) for i in range(days)]
+        city_ids, all_dates, values = [], [], []
+        for entry in data["series"]:
+            city_ids.extend([entry["city_id"]] * days)
+            all_dates.extend(dates)
+            values.extend(entry["values"])
+        table = pa.table({
+            "city_id": pa.array(city_ids, pa.int64()),
+            "date": pa.array(all_dates, pa.date32()),
+            "precipitation": pa.array(values, pa.float32()),
+        })
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+
+SERIES_RENDERERS = [ColumnarJSONRenderer]
+if find_spec("msgpack"):
+    SERIES_RENDERERS.append(MessagePackRenderer)
+if find_spec("pyarrow"):
+    SERIES_RENDERERS.append(ArrowStreamRenderer)
+
+# legacy JSON (default) first, then the compact formats
+FORECAST_RENDERERS = [*api_settings.DEFAULT_RENDERER_CLASSES, *SERIES_RENDERERS]
+
+
+class SeriesErrorsAsJSONMixin:
+    """
+    For DRF views offering the series renderers: error bodies (400/404/…)
+    are rendered with the JSON renderer whatever format was negotiated, so
+    they are never labelled as MessagePack or Arrow.
+    """
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        renderer = getattr(request, "accepted_renderer", None)
+        if response.status_code >= 400 and isinstance(renderer, tuple(SERIES_RENDERERS)):
+            request.accepted_renderer = JSONRenderer()
+            request.accepted_media_type = JSONRenderer.media_type
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+def select_series_renderer(request):
+    """
+    Content negotiation for plain Django (async) views: the series renderer
+    named by `?format=` or first matching the Accept header, else None
+    (legacy JSON).
+    """
+    requested = request.GET.get(api_settings.URL_FORMAT_OVERRIDE)
+    if requested:
+        return next((r() for r in SERIES_RENDERERS if r.format == requested), None)
+    accept = request.headers.get("Accept", "")
+    for media_range in (part.split(";")[0].strip() for part in accept.split(",")):
+        for renderer in SERIES_RENDERERS:
+            if media_range == renderer.media_type:
+                return renderer()
+    return None
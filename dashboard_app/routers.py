@@ -0,0 +1,78 @@
+# dashboard_app/routers.py
+"""
+Primary/replica routing.
+
+Reads go to the primary unless code runs inside `reading_from_replica()`,
+which the read-only API views enter through ReplicaReadMixin; writes always
+go to the primary. Management commands never enter it, so imports and their
+reads stay on the primary.
+
+Read-your-writes: after a client's write request ReadYourWritesMiddleware
+sets a short-lived cookie, and while it is present that client's reads stay
+on the primary so it doesn't see replication lag.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PIN_COOKIE = "db_pin_primary"
+
+_read_alias = ContextVar("read_alias", default=None)
+
+
+def replica_alias():
+    """The configured replica alias, or None if there is no replica."""
+    alias = getattr(settings, "REPLICA_DATABASE", None)
+    return alias if alias in settings.DATABASES else None
+
+
+def is_pinned(request):
+    return request is not None and PIN_COOKIE in request.COOKIES
+
+
+@contextmanager
+def reading_from_replica(request=None):
+    """Route this context's reads to the replica (unless none or `request` is pinned)."""
+    alias = replica_alias()
+    if alias is None or is_pinned(request):
+        yield
+        return
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # same data on both aliases
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
+
+
+class ReplicaReadMixin:
+    """
+    For read-only views: run the handler with reads routed to the replica.
+    Works for DRF APIViews and for async Django views.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if getattr(self, "view_is_async", False):
+            return self._replica_adispatch(request, *args, **kwargs)
+        with reading_from_replica(request):
+            return super().dispatch(request, *args, **kwargs)
+
+    async def _replica_adispatch(self, request, *args, **kwargs):
+        with reading_from_replica(request):
+            return await super().dispatch(request, *args, **kwargs)
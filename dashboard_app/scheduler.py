@@ -0,0 +1,224 @@
+# dashboard_app/scheduler.py
+"""
+Minimal cron-style scheduler used by `manage.py run_scheduler`.
+
+Jobs come from settings.SCHEDULER_JOBS:
+
+    SCHEDULER_JOBS = [
+        {
+            "name": "import_precipitation",
+            "schedule": "5 * * * *",        # minute hour day-of-month month day-of-week
+            "command": "import_precipitation",
+            "args": ["--record-history"],
+            "overlap": "skip",              # or "queue": run once more when the current run ends
+        },
+    ]
+
+Overlap protection uses a PostgreSQL session-level advisory lock per job
+(see `advisory_lock`), so it also covers runs started by hand or from
+another host against the same database.
+
+Every trigger (run, failure or skip) is recorded in ImportRun under the
+command "scheduler:<job name>", apart from the rows a command such as
+`import_precipitation --record-history` writes for itself, so throughput
+queries on command="import_precipitation" count each import once.
+"""
+
+import hashlib
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+
+RECORD_PREFIX = "scheduler:"
+
+CRON_FIELDS = (
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day", 1, 31),
+    ("month", 1, 12),
+    ("weekday", 0, 7),  # 0 and 7 are both Sunday, as in cron
+)
+
+
+def _parse_field(spec, low, high):
+    """Parse one cron field (`*`, `5`, `1-5`, `*/15`, `0-30/10`, lists) into a set."""
+    values = set()
+    for part in spec.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f"invalid step in {spec!r}")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start_text, end_text = part.split("-", 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if not (low <= start <= end <= high):
+            raise ValueError(f"{spec!r} is out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronSchedule:
+    """A parsed 5-field cron expression."""
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        for (name, low, high), spec in zip(CRON_FIELDS, fields):
+            setattr(self, name, _parse_field(spec, low, high))
+        self.weekday = frozenset(d % 7 for d in self.weekday)
+        # cron semantics: if both day fields are restricted, either may match
+        self._any_day = fields[2] == "*" or fields[4] == "*"
+
+    def matches(self, when):
+        if when.minute not in self.minute or when.hour not in self.hour or when.month not in self.month:
+            return False
+        day_ok = when.day in self.day
+        weekday_ok = (when.isoweekday() % 7) in self.weekday
+        return (day_ok and weekday_ok) if self._any_day else (day_ok or weekday_ok)
+
+    def next_after(self, when):
+        """First matching minute strictly after `when`."""
+        candidate = when.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # at most ~4 years of minutes; plenty for any valid expression
+        for _ in range(4 * 366 * 24 * 60):
+            if self.matches(candidate):
+                return candidate
+            candidate += timedelta(minutes=1)
+        raise ValueError(f"{self.expression!r} never matches")
+
+    def __str__(self):
+        return self.expression
+
+
+def advisory_key(name):
+    """Stable signed 64-bit advisory-lock key for a job name."""
+    return int.from_bytes(hashlib.sha1(f"ews:{name}".encode()).digest()[:8], "big", signed=True)
+
+
+@contextmanager
+def advisory_lock(name, wait=False):
+    """
+    Hold the job's advisory lock on this thread's connection. Yields True if
+    the lock was obtained, False if another session holds it (wait=False).
+    """
+    key = advisory_key(name)
+    with connection.cursor() as cursor:
+        if wait:
+            cursor.execute("SELECT pg_advisory_lock(%s)", [key])
+            acquired = True
+        else:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", [key])
+            acquired = cursor.fetchone()[0]
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", [key])
+
+
+class Job:
+    """
+    One scheduled management command. `trigger()` starts it on a worker
+    thread; the run holds the job's advisory lock for its whole duration and
+    is recorded in the ImportRun history table (as "scheduler:<name>").
+    """
+
+    def __init__(self, name, schedule, command, args=(), overlap="skip"):
+        if overlap not in ("skip", "queue"):
+            raise ValueError(f"job {name!r}: overlap must be 'skip' or 'queue'")
+        self.name = name
+        self.schedule = CronSchedule(schedule)
+        self.command = command
+        self.args = list(args)
+        self.overlap = overlap
+        self.next_run = self.schedule.next_after(datetime.now())
+        self.pending = False
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_setting(cls, spec):
+        return cls(
+            name=spec["name"],
+            schedule=spec["schedule"],
+            command=spec.get("command", spec["name"]),
+            args=spec.get("args", ()),
+            overlap=spec.get("overlap", "skip"),
+        )
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def trigger(self, log):
+        """Start a run unless one is in progress (then skip or queue)."""
+        with self._lock:
+            if self.running:
+                if self.overlap == "queue":
+                    self.pending = True
+                    log(f"[{self.name}] previous run still going; queued")
+                else:
+                    log(f"[{self.name}] previous run still going; skipped")
+                    _record(self.name, "skipped", datetime.now(), 0.0, {"reason": "overlap"})
+                return
+            self.pending = False
+            self._thread = threading.Thread(target=self._run, args=(log,), name=f"job-{self.name}", daemon=True)
+            self._thread.start()
+
+    def _run(self, log):
+        started = datetime.now()
+        t0 = time.perf_counter()
+        try:
+            with advisory_lock(self.name) as acquired:
+                if not acquired:
+                    # held by another process/host (e.g. a manual run)
+                    if self.overlap == "queue":
+                        self.pending = True
+                        log(f"[{self.name}] locked by another session; will retry")
+                    else:
+                        log(f"[{self.name}] locked by another session; skipped")
+                        _record(self.name, "skipped", started, 0.0, {"reason": "locked"})
+                    return
+                log(f"[{self.name}] started")
+                status, detail = "success", {}
+                try:
+                    call_command(self.command, *self.args)
+                except Exception as e:
+                    status, detail = "failed", {"error": repr(e)}
+                    log(f"[{self.name}] failed: {e!r}")
+                duration = time.perf_counter() - t0
+                _record(self.name, status, started, duration, detail)
+                log(f"[{self.name}] {status} in {duration:.1f}s")
+        finally:
+            connection.close()
+
+
+def _record(name, status, started, duration, detail):
+    from .models import ImportRun
+
+    started = timezone.make_aware(started) if timezone.is_naive(started) else started
+    ImportRun.objects.create(
+        run_id=uuid.uuid4().hex,
+        command=f"{RECORD_PREFIX}{name}",
+        status=status,
+        started_at=started,
+        finished_at=started + timedelta(seconds=duration),
+        duration_seconds=round(duration, 3),
+        report={"scheduler": True, **detail},
+    )
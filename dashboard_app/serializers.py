@@ -1,5 +1,12 @@
 from rest_framework import serializers
-from .models import AfricanCity, PrecipitationRecords, Watershed
+from .models import (
+    AfricanCity,
+    PrecipitationArchive,
+    PrecipitationMonthlyRollup,
+    PrecipitationRecords,
+    WarningRule,
+    Watershed,
+)
 import json
 
 class AfricanCitySerializer(serializers.ModelSerializer):
@@ -30,6 +37,18 @@ class PrecipitationRecordSerializer(serializers.ModelSerializer):
         fields = ["date", "precipitation"]
 
 
+class PrecipitationRollupSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PrecipitationMonthlyRollup
+        fields = ["month", "days", "wet_days", "total", "mean", "max"]
+
+
+class PrecipitationArchiveSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PrecipitationArchive
+        fields = ["date", "precipitation"]
+
+
 class WatershedSerializer(serializers.ModelSerializer):
     geom = serializers.SerializerMethodField()
 
@@ -39,6 +58,8 @@ class WatershedSerializer(serializers.ModelSerializer):
             "id",
             "name",
             "warning_level",
+            "population_warning_level",
+            "area_warning_level",
             "geom",
         ]
 
@@ -52,4 +73,44 @@ class WatershedSerializer(serializers.ModelSerializer):
         if not obj.geom:
             return None
         # `geom.geojson` is a string, so we load it into a Python dict and return.
-        return json.loads(obj.geom.geojson)
\ No newline at end of file
+        return json.loads(obj.geom.geojson)
+
+class WarningRuleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WarningRule
+        fields = [
+            "id",
+            "name",
+            "scope",
+            "country_code",
+            "watershed",
+            "window_days",
+            "orange_threshold",
+            "red_threshold",
+            "active",
+            "updated_at",
+        ]
+        read_only_fields = ["id", "updated_at"]
+
+    def validate(self, attrs):
+        # mirror the model's check constraints (DRF doesn't run them); for
+        # partial updates fall back to the instance's values
+        def value(name):
+            if name in attrs:
+                return attrs[name]
+            if self.instance is not None:
+                return getattr(self.instance, name)
+            return WarningRule._meta.get_field(name).get_default()
+
+        scope, country_code, watershed = value("scope"), value("country_code"), value("watershed")
+        if scope == "country" and (not country_code or watershed is not None):
+            raise serializers.ValidationError("Country rules need a country_code and no watershed.")
+        if scope == "watershed" and (watershed is None or country_code):
+            raise serializers.ValidationError("Watershed rules need a watershed and no country_code.")
+        if scope == "global" and (watershed is not None or country_code):
+            raise serializers.ValidationError("Global rules take neither a country_code nor a watershed.")
+        if value("window_days") < 1:
+            raise serializers.ValidationError({"window_days": "Must be at least 1 day."})
+        if value("red_threshold") <= value("orange_threshold"):
+            raise serializers.ValidationError({"red_threshold": "Must be greater than orange_threshold."})
+        return attrs
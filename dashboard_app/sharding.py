@@ -0,0 +1,139 @@
+# dashboard_app/sharding.py
+"""
+Sharded precipitation fetch.
+
+Cities are split into `count` disjoint shards (by `id % count`, or by
+`watershed_id % count` so a basin's cities stay together). Each shard worker
+fetches its cities and COPYs the results into the UNLOGGED staging tables
+tagged with the run id; a single coordinator then merges the staged rows and
+recomputes warnings once (`import_precipitation --finalize --run-id …`).
+
+Workers can be separate `import_precipitation --shard i/n --stage-only`
+processes on any host, or the local process pool started by `--workers N`.
+The OWM rate budget is per run, not per process: each of the n shards gets
+1/n of it (`shard_rate_limits`), which assumes the n shards run together.
+
+Django models are imported inside the functions: with the "spawn" start
+method this module is imported in the child before django.setup() runs.
+"""
+
+import asyncio
+import csv
+import io
+
+SHARD_KEYS = ("id", "watershed")
+
+
+def parse_shard(spec):
+    """'2/8' → (2, 8)."""
+    try:
+        index_text, count_text = spec.split("/")
+        index, count = int(index_text), int(count_text)
+    except ValueError:
+        raise ValueError(f"shard must look like i/n, got {spec!r}")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"shard index must be in 0..{count - 1}, got {spec!r}")
+    return index, count
+
+
+def shard_rate_limits(count=1):
+    """
+    (requests in flight, seconds between request starts) for one of `count`
+    shards fetching at the same time, so that together they stay within
+    settings.OWM_MAX_CONCURRENT and OWM_REQUESTS_PER_SECOND.
+    """
+    from django.conf import settings
+
+    concurrent = max(1, settings.OWM_MAX_CONCURRENT // count)
+    rate = settings.OWM_REQUESTS_PER_SECOND
+    return concurrent, (count / rate if rate > 0 else 0.0)
+
+
+def shard_queryset(index, count, shard_by="id"):
+    from django.db.models import F
+    from django.db.models.functions import Coalesce, Mod
+
+    from .models import AfricanCity
+
+    qs = AfricanCity.objects.all()
+    if count == 1:
+        return qs
+    key = F("id") if shard_by == "id" else Coalesce("watershed_id", 0)
+    return qs.annotate(shard=Mod(key, count)).filter(shard=index)
+
+
+def stage_records(run_id, records, pop_map):
+    """COPY fetched (city_id, date, precip) rows and populations into staging."""
+    from django.db import connection
+
+    from .management.commands.import_precipitation import copy_csv
+    from .models import StagedPopulation
+
+    if records:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for city_id, dt_date, precip in records:
+            writer.writerow([run_id, city_id, dt_date.isoformat(), precip])
+        with connection.cursor() as cursor:
+            copy_csv(
+                cursor,
+                "COPY dashboard_app_stagedprecipitation (run_id, city_id, date, precipitation) "
+                "FROM STDIN WITH CSV",
+                buffer,
+            )
+    if pop_map:
+        StagedPopulation.objects.bulk_create(
+            StagedPopulation(run_id=run_id, city_id=city_id, population=population)
+            for city_id, population in pop_map.items()
+        )
+
+
+def staged_populations(run_id):
+    from .models import StagedPopulation
+
+    return dict(
+        StagedPopulation.objects.filter(run_id=run_id).values_list("city_id", "population")
+    )
+
+
+def clear_staging(run_id, stale_after=None):
+    """Remove this run's staged rows, plus any left over from runs older than `stale_after`."""
+    from django.db.models import Q
+    from django.utils import timezone
+
+    from .models import StagedPopulation, StagedPrecipitation
+
+    cond = Q(run_id=run_id)
+    if stale_after is not None:
+        cond |= Q(staged_at__lt=timezone.now() - stale_after)
+    StagedPrecipitation.objects.filter(cond).delete()
+    StagedPopulation.objects.filter(cond).delete()
+
+
+def fetch_and_stage(run_id, index, count, shard_by="id"):
+    """Fetch one shard and stage it. Returns (FetchStats, rows staged, cities)."""
+    from .import_report import FetchStats
+    from .management.commands.import_precipitation import fetch_all
+
+    cities = list(shard_queryset(index, count, shard_by))
+    stats = FetchStats()
+    records, pop_map = asyncio.run(fetch_all(cities, stats, shards=count))
+    stage_records(run_id, records, pop_map)
+    return stats, len(records), len(cities)
+
+
+# ── local process pool ────────────────────────────────────────────────────
+
+def init_worker():
+    import django
+
+    django.setup()
+
+
+def worker_stage_shard(run_id, index, count, shard_by):
+    from django.db import connection
+
+    try:
+        return fetch_and_stage(run_id, index, count, shard_by)
+    finally:
+        connection.close()
@@ -0,0 +1,19 @@
+# dashboard_app/signals.py
+
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import AfricanCity, Tombstone, Watershed
+
+
+# QuerySet.delete() and Model.delete() of versioned models wrap the deletion
+# in Tombstone.batch(), so these only queue the id; the tombstones are
+# written in one INSERT with one version bump when the deletion finishes.
+@receiver(post_delete, sender=AfricanCity, dispatch_uid="tombstone_city")
+def record_city_tombstone(sender, instance, using, **kwargs):
+    Tombstone.record("city", instance.pk, using=using)
+
+
+@receiver(post_delete, sender=Watershed, dispatch_uid="tombstone_watershed")
+def record_watershed_tombstone(sender, instance, using, **kwargs):
+    Tombstone.record("watershed", instance.pk, using=using)
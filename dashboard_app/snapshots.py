@@ -0,0 +1,342 @@
+# dashboard_app/snapshots.py
+"""
+Versioned bulk snapshots of the API datasets.
+
+    SNAPSHOT_ROOT/
+        latest.json                       → copy of the newest manifest
+        00000042-20261019T120000123456/   (version, UTC creation time)
+            manifest.json
+            cities.parquet                (GeoParquet, WKB points)
+            watersheds.parquet            (GeoParquet, WKB multipolygons)
+            precipitation.arrow           (Arrow IPC file, active records)
+
+The GeoParquet files carry a per-row `bbox` covering column and are written
+in small row groups sorted by location, so readers that issue HTTP range
+requests (served by `ranged_file_response`) can fetch only the row groups
+intersecting their area of interest.
+
+Writing needs `pyarrow`; it is imported lazily so the API workers don't
+depend on it.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+
+from .models import AfricanCity, DatasetVersion, PrecipitationRecords, Watershed
+
+ROW_GROUP_SIZE = 2048
+MEDIA_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+CHUNK_SIZE = 64 * 1024
+STALE_TMP_AGE = 3600  # seconds; an older temporary directory belongs to an export that died
+
+# version-timestamp; snapshots written before microseconds were added have none
+_SNAPSHOT_NAME = r"\d{8}-\d{8}T\d{6}(?:\d{6})?"
+_SNAPSHOT_NAME_RE = re.compile(rf"^{_SNAPSHOT_NAME}$")
+_TMP_NAME_RE = re.compile(rf"^\.{_SNAPSHOT_NAME}\.tmp$")
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def snapshot_root():
+    return Path(settings.SNAPSHOT_ROOT)
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as exc:
+        raise RuntimeError("export_snapshot needs pyarrow (pip install pyarrow)") from exc
+
+
+def _bbox_struct_type(pa):
+    return pa.struct([
+        ("xmin", pa.float64()), ("ymin", pa.float64()),
+        ("xmax", pa.float64()), ("ymax", pa.float64()),
+    ])
+
+
+def _geo_metadata(geometry_types, bbox):
+    return json.dumps({
+        "version": "1.1.0",
+        "primary_column": "geometry",
+        "columns": {
+            "geometry": {
+                "encoding": "WKB",
+                "geometry_types": geometry_types,
+                # CRS omitted == OGC:CRS84 (lon/lat), i.e. our EPSG:4326 data
+                "bbox": bbox,
+                "covering": {"bbox": {
+                    "xmin": ["bbox", "xmin"], "ymin": ["bbox", "ymin"],
+                    "xmax": ["bbox", "xmax"], "ymax": ["bbox", "ymax"],
+                }},
+            }
+        },
+    })
+
+
+def _write_geoparquet(path, columns, geoms, geometry_types, compression):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    extents = [g.extent if g is not None else None for g in geoms]
+    # sort by (ymin, xmin) so neighbouring features share row groups
+    order = sorted(range(len(geoms)), key=lambda i: (extents[i] or (999, 999))[1::-1])
+
+    data = {name: [values[i] for i in order] for name, values in columns.items()}
+    data["bbox"] = [
+        dict(zip(("xmin", "ymin", "xmax", "ymax"), extents[i])) if extents[i] else None
+        for i in order
+    ]
+    data["geometry"] = [bytes(geoms[i].wkb) if geoms[i] is not None else None for i in order]
+
+    present = [e for e in extents if e]
+    total_bbox = [
+        min(e[0] for e in present), min(e[1] for e in present),
+        max(e[2] for e in present), max(e[3] for e in present),
+    ] if present else []
+
+    table = pa.table(data)
+    table = table.cast(table.schema.set(
+        table.schema.get_field_index("bbox"), pa.field("bbox", _bbox_struct_type(pa))
+    ))
+    table = table.replace_schema_metadata({"geo": _geo_metadata(geometry_types, total_bbox)})
+    pq.write_table(table, path, compression=compression, row_group_size=ROW_GROUP_SIZE)
+    return table.num_rows
+
+
+def export_cities(path, compression):
+    rows = list(
+        AfricanCity.objects
+            .order_by("id")
+            .values_list("id", "city", "country_code", "country", "population",
+                         "warning_level", "watershed_id", "updated_version", "location")
+    )
+    names = ["id", "city", "country_code", "country", "population",
+             "warning_level", "watershed_id", "updated_version"]
+    columns = {name: [r[i] for r in rows] for i, name in enumerate(names)}
+    return _write_geoparquet(path, columns, [r[-1] for r in rows], ["Point"], compression)
+
+
+def export_watersheds(path, compression):
+    rows = list(
+        Watershed.objects
+            .order_by("id")
+            .values_list("id", "name", "warning_level", "updated_version", "geom")
+    )
+    names = ["id", "name", "warning_level", "updated_version"]
+    columns = {name: [r[i] for r in rows] for i, name in enumerate(names)}
+    return _write_geoparquet(path, columns, [r[-1] for r in rows], ["MultiPolygon"], compression)
+
+
+def export_precipitation(path, compression):
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    rows = list(
+        PrecipitationRecords.objects
+            .order_by("city_id", "date")
+            .values_list("city_id", "date", "precipitation")
+    )
+    table = pa.table({
+        "city_id": pa.array([r[0] for r in rows], pa.int64()),
+        "date": pa.array([r[1] for r in rows], pa.date32()),
+        "precipitation": pa.array([r[2] for r in rows], pa.float32()),
+    })
+    options = ipc.IpcWriteOptions(compression=compression if compression in ("zstd", "lz4") else None)
+    with pa.OSFile(str(path), "wb") as sink, ipc.new_file(sink, table.schema, options=options) as writer:
+        writer.write_table(table, max_chunksize=64 * 1024)
+    return table.num_rows
+
+
+EXPORTS = [
+    ("cities.parquet", "parquet", export_cities),
+    ("watersheds.parquet", "parquet", export_watersheds),
+    ("precipitation.arrow", "arrow", export_precipitation),
+]
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@contextmanager
+def consistent_reads():
+    """
+    Run the block in one REPEATABLE READ, read-only transaction, so the
+    version and every exported file come from the same database snapshot
+    even if an import commits in between. Inside an existing transaction
+    (e.g. a test) that transaction's snapshot is used as is.
+    """
+    if connection.in_atomic_block:
+        yield
+        return
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+        yield
+
+
+def export_snapshot(root=None, compression="zstd"):
+    """
+    Write a new snapshot directory and manifest, then point latest.json at it.
+    Files are written to a temporary directory and renamed into place so
+    readers never see a half-written snapshot. Returns the manifest dict.
+    """
+    _require_pyarrow()
+    root = Path(root or snapshot_root())
+    root.mkdir(parents=True, exist_ok=True)
+
+    with consistent_reads():
+        version = DatasetVersion.current()
+        created = datetime.now(timezone.utc)
+        # microseconds: two exports within one second must not share (and
+        # rmtree) each other's temporary directory
+        name = f"{version:08d}-{created:%Y%m%dT%H%M%S%f}"
+        tmp_dir = root / f".{name}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir()
+
+        files = []
+        for filename, fmt, exporter in EXPORTS:
+            path = tmp_dir / filename
+            rows = exporter(path, compression)
+            files.append({
+                "name": filename,
+                "format": fmt,
+                "media_type": MEDIA_TYPES[fmt],
+                "rows": rows,
+                "bytes": path.stat().st_size,
+                "sha256": _sha256(path),
+            })
+
+    manifest = {
+        "snapshot": name,
+        "dataset_version": version,
+        "created_at": created.isoformat(),
+        "compression": compression,
+        "files": files,
+    }
+    (tmp_dir / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp_dir, root / name)
+
+    latest_tmp = root / ".latest.json.tmp"
+    latest_tmp.write_text(json.dumps(manifest, indent=2))
+    os.replace(latest_tmp, root / "latest.json")
+    return manifest
+
+
+def prune_snapshots(keep, root=None, stale_tmp_age=STALE_TMP_AGE):
+    """
+    Delete all but the `keep` newest snapshot directories (0 keeps all) and
+    the temporary directories of exports that died, i.e. untouched for
+    `stale_tmp_age` seconds. Returns the names of the snapshots deleted.
+    """
+    root = Path(root or snapshot_root())
+    names = []
+    cutoff = time.time() - stale_tmp_age
+    for path in root.iterdir():
+        if not path.is_dir():
+            continue
+        if _SNAPSHOT_NAME_RE.match(path.name):
+            names.append(path.name)
+        elif _TMP_NAME_RE.match(path.name) and path.stat().st_mtime < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+    names.sort()
+    removed = names[:-keep] if keep > 0 else []
+    for name in removed:
+        shutil.rmtree(root / name, ignore_errors=True)
+    return removed
+
+
+def latest_manifest():
+    path = snapshot_root() / "latest.json"
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def snapshot_file_path(snapshot, filename):
+    """Resolve a file inside a snapshot directory, or raise Http404."""
+    if not _SNAPSHOT_NAME_RE.match(snapshot) or filename not in {e[0] for e in EXPORTS} | {"manifest.json"}:
+        raise Http404("No such snapshot file.")
+    path = snapshot_root() / snapshot / filename
+    if not path.is_file():
+        raise Http404("No such snapshot file.")
+    return path
+
+
+def _iter_range(path, start, length):
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = fh.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def ranged_file_response(request, path, content_type):
+    """
+    Serve `path` honouring a single `Range: bytes=…` request (206, or 416
+    when it starts past the end); anything else, including an invalid range
+    or a stale If-Range, gets the whole file. Snapshot files are immutable, so they
+    are marked cacheable forever and carry a strong ETag.
+    """
+    size = path.stat().st_size
+    etag = f'"{path.parent.name}-{path.name}-{size}"'
+    range_header = request.headers.get("Range", "")
+    if_range = request.headers.get("If-Range")
+    match = _RANGE_RE.match(range_header.strip())
+
+    if match and (not if_range or if_range == etag):
+        first, last = match.groups()
+        if (first == "" and last == "") or (first and last and int(last) < int(first)):
+            # syntactically invalid: ignored, the whole file is sent
+            match = None
+        elif first == "":
+            # suffix range: the last N bytes
+            length = min(int(last), size)
+            start, end = size - length, size - 1
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        if match is not None:
+            if start >= size:
+                response = HttpResponse(status=416)
+                response["Content-Range"] = f"bytes */{size}"
+                return response
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                _iter_range(path, start, length), status=206, content_type=content_type
+            )
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+            response["Content-Length"] = str(length)
+            response["Accept-Ranges"] = "bytes"
+            response["ETag"] = etag
+            response["Cache-Control"] = "public, max-age=31536000, immutable"
+            return response
+
+    response = FileResponse(open(path, "rb"), content_type=content_type)
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
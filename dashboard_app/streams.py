@@ -0,0 +1,161 @@
+# dashboard_app/streams.py
+"""
+Server-Sent Events stream of warning-level changes.
+
+One poller task per process reads the WarningChange table (new rows after
+the last id it has seen, every POLL_INTERVAL seconds while clients are
+connected) and fans the rows out to a queue per connected stream, so the
+number of queries does not grow with the number of clients. The streams
+themselves only touch the database to catch up on a `Last-Event-ID`
+backlog. Every read hands its connection back (to the pool) straight away:
+an open stream holds neither a connection nor a thread, only its queue.
+
+Idle clients only receive a keep-alive comment every KEEPALIVE_INTERVAL.
+
+Needs an ASGI server: under WSGI each open stream would pin a worker thread.
+"""
+
+import asyncio
+import contextvars
+import json
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.db.models import Max
+
+from .models import WarningChange
+
+POLL_INTERVAL = 2.0       # seconds between polls while clients are connected
+KEEPALIVE_INTERVAL = 15.0  # seconds of silence before a keep-alive comment
+BATCH_SIZE = 500
+QUEUE_SIZE = 100           # batches a slow client may fall behind before it re-reads from the DB
+RETRY_MS = 5000
+
+
+def _release(queryset):
+    # give the connection back now instead of at the end of the request,
+    # which for a stream is whenever the client disconnects
+    connections[queryset.db].close()
+
+
+def _changes_after(after_id, limit=BATCH_SIZE):
+    queryset = WarningChange.objects.filter(id__gt=after_id).order_by("id")
+    try:
+        return list(queryset[:limit])
+    finally:
+        _release(queryset)
+
+
+def _latest_change_id():
+    queryset = WarningChange.objects.all()
+    try:
+        return queryset.aggregate(latest=Max("id"))["latest"] or 0
+    finally:
+        _release(queryset)
+
+
+# thread_sensitive=False: not tied to (nor blocking) any request's sync thread
+changes_after = sync_to_async(_changes_after, thread_sensitive=False)
+latest_change_id = sync_to_async(_latest_change_id, thread_sensitive=False)
+
+
+class WarningChangeBroadcaster:
+    def __init__(self, interval=POLL_INTERVAL):
+        self.interval = interval
+        self.latest_id = None
+        self._queues = set()
+        self._task = None
+
+    async def subscribe(self):
+        """
+        Register a stream. Its queue receives every batch of changes with id
+        greater than `self.latest_id` at this point (None in place of a batch
+        means the stream fell behind and must re-read from the database).
+        """
+        if self.latest_id is None:
+            latest = await latest_change_id()
+            if self.latest_id is None:
+                self.latest_id = latest
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._queues.add(queue)
+        if self._task is None or self._task.done():
+            loop = asyncio.get_running_loop()
+            # an empty context: the poller outlives the request that starts it
+            # and must not inherit its context variables
+            self._task = contextvars.Context().run(loop.create_task, self._poll())
+        return queue
+
+    def unsubscribe(self, queue):
+        self._queues.discard(queue)
+
+    def _publish(self, changes):
+        for queue in list(self._queues):
+            try:
+                queue.put_nowait(changes)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+    async def _poll(self):
+        try:
+            while self._queues:
+                changes = await changes_after(self.latest_id)
+                if changes:
+                    self.latest_id = changes[-1].id
+                    self._publish(changes)
+                if len(changes) < BATCH_SIZE:
+                    await asyncio.sleep(self.interval)
+        finally:
+            # nobody is listening: forget the position, so the next first
+            # subscriber starts from the newest change instead of replaying
+            # everything logged while the stream was idle
+            self.latest_id = None
+
+
+broadcaster = WarningChangeBroadcaster()
+
+
+def format_event(change):
+    payload = {
+        "entity_type": change.entity_type,
+        "entity_id": change.entity_id,
+        "name": change.entity_name,
+        "old": change.old_level,
+        "new": change.new_level,
+        "changed_at": change.changed_at.isoformat(),
+    }
+    return f"id: {change.id}\nevent: warning\ndata: {json.dumps(payload)}\n\n"
+
+
+async def warning_events(last_event_id):
+    """
+    Async generator of SSE frames for changes after `last_event_id`
+    (None: only changes that happen from now on).
+    """
+    queue = await broadcaster.subscribe()
+    # the queue covers everything after the broadcaster's position at
+    # subscription; older changes the client asked for come from the DB
+    cursor = last_event_id if last_event_id is not None else broadcaster.latest_id
+    behind = cursor < broadcaster.latest_id
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        while True:
+            if behind:
+                changes = await changes_after(cursor)
+                behind = len(changes) == BATCH_SIZE
+            else:
+                try:
+                    changes = await asyncio.wait_for(queue.get(), KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if changes is None:
+                    behind = True
+                    continue
+            for change in changes:
+                if change.id > cursor:
+                    yield format_event(change)
+                    cursor = change.id
+    finally:
+        broadcaster.unsubscribe(queue)
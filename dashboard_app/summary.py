@@ -0,0 +1,148 @@
+# dashboard_app/summary.py
+"""
+Pre-aggregated country and regional warning summaries.
+
+`rebuild_country_summaries` recomputes the CountrySummary table in one
+set-based statement at the end of every import; the summary API then reads
+~55 rows (and groups them by region in Python) instead of aggregating
+AfricanCity on each request. Responses are cached per DatasetVersion, so a
+new import invalidates them without any explicit cache busting.
+"""
+
+from django.core.cache import cache
+from django.db import connection
+
+from .models import CountrySummary, DatasetVersion
+
+# UN geoscheme sub-regions of Africa, keyed by ISO 3166-1 alpha-2 code
+REGIONS = {
+    "Northern Africa": ("DZ", "EG", "EH", "LY", "MA", "SD", "TN"),
+    "Western Africa": ("BF", "BJ", "CI", "CV", "GH", "GM", "GN", "GW", "LR", "ML",
+                       "MR", "NE", "NG", "SH", "SL", "SN", "TG"),
+    "Middle Africa": ("AO", "CD", "CF", "CG", "CM", "GA", "GQ", "ST", "TD"),
+    "Eastern Africa": ("BI", "DJ", "ER", "ET", "KE", "KM", "MG", "MU", "MW", "MZ",
+                       "RE", "RW", "SC", "SO", "SS", "TZ", "UG", "YT", "ZM", "ZW"),
+    "Southern Africa": ("BW", "LS", "NA", "SZ", "ZA"),
+}
+REGION_OF = {code: region for region, codes in REGIONS.items() for code in codes}
+
+LEVEL_RANK = {"green": 0, "orange": 1, "red": 2}
+
+CACHE_KEY = "country-summary:v{version}"
+CACHE_TIMEOUT = 60 * 60
+
+
+def rebuild_country_summaries(version):
+    """
+    Replace the CountrySummary rows with fresh aggregates stamped with
+    `version`. The caller owns the transaction. Returns the row count.
+    """
+    codes = list(REGION_OF)
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM dashboard_app_countrysummary")
+        cursor.execute("""
+            WITH counts AS (
+                SELECT country_code,
+                       max(country) AS country,
+                       count(*) AS cities,
+                       count(*) FILTER (WHERE warning_level = 'green') AS green,
+                       count(*) FILTER (WHERE warning_level = 'orange') AS orange,
+                       count(*) FILTER (WHERE warning_level = 'red') AS red,
+                       coalesce(sum(population) FILTER (WHERE warning_level IN ('orange', 'red')), 0)
+                           AS population_at_risk
+                FROM dashboard_app_africancity
+                GROUP BY country_code
+            ), worst AS (
+                -- most severe basin holding the country's cities; ties go to
+                -- the basin with more of them
+                SELECT DISTINCT ON (c.country_code)
+                       c.country_code, w.id AS watershed_id, w.warning_level
+                FROM dashboard_app_africancity c
+                JOIN dashboard_app_watershed w ON w.id = c.watershed_id
+                GROUP BY c.country_code, w.id, w.warning_level
+                ORDER BY c.country_code,
+                         CASE w.warning_level WHEN 'red' THEN 2 WHEN 'orange' THEN 1 ELSE 0 END DESC,
+                         count(*) DESC, w.id
+            ), regions AS (
+                SELECT * FROM unnest(%(codes)s::text[], %(regions)s::text[]) AS r(country_code, region)
+            )
+            INSERT INTO dashboard_app_countrysummary
+                (country_code, country, region, cities, green, orange, red, population_at_risk,
+                 worst_watershed_id, worst_watershed_level, dataset_version, updated_at)
+            SELECT counts.country_code, counts.country, coalesce(regions.region, ''),
+                   counts.cities, counts.green, counts.orange, counts.red, counts.population_at_risk,
+                   worst.watershed_id, coalesce(worst.warning_level, ''), %(version)s, now()
+            FROM counts
+            LEFT JOIN worst USING (country_code)
+            LEFT JOIN regions USING (country_code);
+        """, {"codes": codes, "regions": [REGION_OF[c] for c in codes], "version": version})
+        return cursor.rowcount
+
+
+def _country_dict(row):
+    return {
+        "country_code": row.country_code,
+        "country": row.country,
+        "region": row.region,
+        "cities": row.cities,
+        "green": row.green,
+        "orange": row.orange,
+        "red": row.red,
+        "population_at_risk": row.population_at_risk,
+        "worst_watershed": (
+            {"id": row.worst_watershed_id, "name": row.worst_watershed.name,
+             "warning_level": row.worst_watershed_level}
+            if row.worst_watershed_id else None
+        ),
+    }
+
+
+def _region_rollup(countries):
+    regions = {}
+    for c in countries:
+        name = c["region"] or "Other"
+        region = regions.setdefault(name, {
+            "region": name, "countries": 0, "cities": 0, "green": 0, "orange": 0,
+            "red": 0, "population_at_risk": 0, "worst_watershed": None,
+        })
+        region["countries"] += 1
+        for key in ("cities", "green", "orange", "red", "population_at_risk"):
+            region[key] += c[key]
+        worst, candidate = region["worst_watershed"], c["worst_watershed"]
+        if candidate and (
+            worst is None or LEVEL_RANK[candidate["warning_level"]] > LEVEL_RANK[worst["warning_level"]]
+        ):
+            region["worst_watershed"] = candidate
+    return sorted(regions.values(), key=lambda r: r["region"])
+
+
+def build_summary():
+    """The /api/summary/ payload, straight from the CountrySummary rows."""
+    rows = list(CountrySummary.objects.select_related("worst_watershed").only(
+        "country_code", "country", "region", "cities", "green", "orange", "red",
+        "population_at_risk", "worst_watershed_level", "dataset_version", "updated_at",
+        "worst_watershed__name",
+    ))
+    countries = [_country_dict(r) for r in rows]
+    return {
+        "dataset_version": max((r.dataset_version for r in rows), default=0),
+        "updated_at": max((r.updated_at for r in rows), default=None),
+        "regions": _region_rollup(countries),
+        "countries": countries,
+    }
+
+
+def cached_summary():
+    """
+    (dataset version, payload). The payload is cached under the current
+    DatasetVersion, but only once the rollup has been rebuilt for that
+    version — an import bumps the version before it finishes writing.
+    """
+    version = DatasetVersion.current()
+    key = CACHE_KEY.format(version=version)
+    payload = cache.get(key)
+    if payload is None:
+        payload = build_summary()
+        if payload["dataset_version"] == version:
+            cache.set(key, payload, CACHE_TIMEOUT)
+    return version, payload
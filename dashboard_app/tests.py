@@ -1,3 +1,1213 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import tempfile
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from importlib.util import find_spec
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .alerts import (
+    DEFAULT_THRESHOLDS,
+    LEVELS,
+    PrecipitationMatrix,
+    RuleSet,
+    Thresholds,
+    _apply_levels,
+    classify,
+    evaluate_cities,
+    evaluate_watersheds,
+    level_for,
+    preview_rule,
+    recompute_city_warnings,
+    recompute_watershed_warnings,
+    window_maxima,
+)
+from .archive import archive_and_prune, move_batch, refresh_rollups
+from .benchmarks import synthetic
+from .import_report import percentile
+from . import instrumentation
+from .instrumentation import fingerprint_sql
+from .middleware import CompressionMiddleware
+from .management.commands.import_precipitation import (
+    bulk_upsert,
+    merge_staged,
+    prune_records,
+    update_populations,
+)
+from .models import (
+    AfricanCity,
+    DatasetVersion,
+    PrecipitationArchive,
+    PrecipitationMonthlyRollup,
+    PrecipitationRecords,
+    StagedPopulation,
+    StagedPrecipitation,
+    Tombstone,
+    WarningChange,
+    WarningRule,
+    Watershed,
+)
+from .routers import PIN_COOKIE, PrimaryReplicaRouter, reading_from_replica
+from .renderers import forecast_series
+from .scheduler import CronSchedule, _parse_field
+from .sharding import (
+    clear_staging,
+    parse_shard,
+    shard_queryset,
+    shard_rate_limits,
+    stage_records,
+    staged_populations,
+)
+from . import streams
+from .snapshots import export_snapshot, prune_snapshots, ranged_file_response, snapshot_file_path
+from .summary import rebuild_country_summaries
+from .weights import refresh_area_weights
+
+# Upper bound on SQL statements per scenario, whatever the dataset size.
+QUERY_BUDGETS = {
+    "city-list": 2,
+    "city-list-async": 2,
+    "watershed-list": 2,
+    "watershed-list-async": 2,
+    "city-forecast": 2,
+    "city-forecast-async": 2,
+    "city-forecast-columnar": 2,
+    "forecast-bulk": 1,
+    "records-admin": 5,
+    "upsert": 4,
+    "prune": 6,
+    "populations": 1,
+    "city_warnings": 6,
+    "area_weights": 3,
+    "watershed_warnings": 8,
+    "country_summaries": 2,
+    "summary": 2,
+}
+
+# The warning passes issue one UPDATE per level that actually changed, so the
+# count may differ by a few statements between datasets without scaling.
+SCALING_SLACK = 3
+
+SMALL, LARGE = 100, 10_000
+
+
+class QueryCountGuardTests(TestCase):
+    """
+    Run every API endpoint and import phase against a small and a large
+    synthetic dataset and fail if the number of SQL statements exceeds its
+    budget or grows with the number of rows (an N+1 regression).
+
+    Statements Django issues on our behalf count too: the admin scenario pays
+    for its session and user lookups, the import phases for the SAVEPOINT /
+    RELEASE pair of every atomic block.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser("admin", "admin@example.com", "admin")
+
+    def setUp(self):
+        # API scenarios run anonymously (a session would add DRF's session and
+        # user lookups to every request); only the admin scenario logs in
+        self.admin_client = Client()
+        self.admin_client.force_login(self.admin)
+
+    def scenarios(self):
+        client = self.client
+        admin_client = self.admin_client
+        city_ids = list(AfricanCity.objects.order_by("id").values_list("id", flat=True)[:100])
+        city_id = city_ids[0]
+        today = date.today()
+
+        def upsert():
+            records = PrecipitationRecords.objects.values_list("city_id", "date", "precipitation")
+            bulk_upsert([(c, d, (p or 0.0) + 1.0) for c, d, p in records])
+
+        def prune():
+            prune_records(today)
+
+        def populations():
+            update_populations({pk: 12345 for pk in AfricanCity.objects.values_list("id", flat=True)}, 1)
+
+        return {
+            "city-list": lambda: client.get(reverse("city-list")),
+            "city-list-async": lambda: client.get(reverse("city-list-async")),
+            "watershed-list": lambda: client.get(reverse("watershed-list")),
+            "watershed-list-async": lambda: client.get(reverse("watershed-list-async")),
+            "city-forecast": lambda: client.get(reverse("city-forecast", args=[city_id])),
+            "city-forecast-async": lambda: client.get(reverse("city-forecast-async", args=[city_id])),
+            "city-forecast-columnar": lambda: client.get(
+                reverse("city-forecast", args=[city_id]), {"format": "columnar"}
+            ),
+            "forecast-bulk": lambda: client.get(
+                reverse("forecast-bulk"), {"ids": ",".join(map(str, city_ids))}
+            ),
+            # session + user, count estimate + exact COUNT, one page of rows
+            # whose __str__ reads the city
+            "records-admin": lambda: admin_client.get(
+                reverse("admin:dashboard_app_precipitationrecords_changelist")
+            ),
+            # setup queries (reading the records / ids) are excluded below;
+            # CREATE TEMP, COPY, INSERT ... ON CONFLICT, DROP
+            "upsert": upsert,
+            # one batch (SAVEPOINT, move_batch, RELEASE), the empty rollup
+            # block (SAVEPOINT, RELEASE), the WarningChange retention DELETE
+            "prune": prune,
+            "populations": populations,
+            "city_warnings": recompute_city_warnings,
+            "area_weights": refresh_area_weights,
+            "watershed_warnings": recompute_watershed_warnings,
+            "country_summaries": lambda: rebuild_country_summaries(1),
+            "summary": lambda: client.get(reverse("summary")),
+        }
+
+    def measure(self, cities):
+        """Generate `cities` synthetic cities, run every scenario, roll back."""
+        sid = transaction.savepoint()
+        try:
+            synthetic.generate(cities=cities, watersheds=max(10, cities // 100))
+            results = {}
+            for name, func in self.scenarios().items():
+                with CaptureQueriesContext(connection) as ctx:
+                    func()
+                queries = [q["sql"] for q in ctx.captured_queries]
+                if name in ("upsert", "populations"):
+                    queries = queries[1:]  # the SELECT that builds the input
+                results[name] = queries
+            return results
+        finally:
+            transaction.savepoint_rollback(sid)
+
+    def format_queries(self, queries):
+        counts = Counter(fingerprint_sql(sql) for sql in queries)
+        return "\n".join(f"  {n:6d} × {fp[:300]}" for fp, n in counts.most_common())
+
+    def test_query_counts_bounded_and_constant(self):
+        small = self.measure(SMALL)
+        large = self.measure(LARGE)
+
+        for name, budget in QUERY_BUDGETS.items():
+            with self.subTest(scenario=name):
+                n_small, n_large = len(small[name]), len(large[name])
+                if n_large > budget:
+                    self.fail(
+                        f"{name}: {n_large} statements at {LARGE} cities (budget {budget}):\n"
+                        + self.format_queries(large[name])
+                    )
+                if n_large - n_small > SCALING_SLACK:
+                    self.fail(
+                        f"{name}: statement count scales with rows "
+                        f"({n_small} at {SMALL} cities, {n_large} at {LARGE}):\n"
+                        + self.format_queries(large[name])
+                    )
+
+
+class DeltaSyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.generate(cities=20, watersheds=4)
+
+    def test_bulk_delete_writes_tombstones_with_one_bump(self):
+        before = DatasetVersion.current()
+        ids = list(AfricanCity.objects.order_by("id").values_list("id", flat=True)[:5])
+        with CaptureQueriesContext(connection) as ctx:
+            AfricanCity.objects.filter(id__in=ids).delete()
+        tombstones = Tombstone.objects.filter(entity_type="city")
+        self.assertEqual(sorted(tombstones.values_list("entity_id", flat=True)), ids)
+        self.assertEqual(set(tombstones.values_list("version", flat=True)), {before + 1})
+        self.assertEqual(DatasetVersion.current(), before + 1)
+        inserts = [q for q in ctx.captured_queries if "dashboard_app_tombstone" in q["sql"]]
+        self.assertEqual(len(inserts), 1)
+
+    def test_sync_and_async_lists_agree_on_since(self):
+        since = DatasetVersion.current()
+        city = AfricanCity.objects.order_by("id").first()
+        city.population += 1
+        city.save()
+        AfricanCity.objects.order_by("-id").first().delete()
+        for name in ("city-list", "city-list-async"):
+            with self.subTest(view=name):
+                response = self.client.get(reverse(name), {"since": since})
+                self.assertEqual(response["X-Dataset-Version"], str(DatasetVersion.current()))
+                payload = response.json()
+                self.assertEqual([c["id"] for c in payload["changed"]], [city.id])
+                self.assertEqual(len(payload["deleted"]), 1)
+                self.assertEqual(self.client.get(reverse(name), {"since": "x"}).status_code, 400)
+
+
+class InstrumentationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.generate(cities=5, watersheds=2)
+        cls.city = AfricanCity.objects.order_by("id").first()
+
+    @override_settings(SERVER_TIMING_ENABLED=True)
+    def test_server_timing_header(self):
+        response = self.client.get(reverse("city-list"))
+        self.assertRegex(
+            response["Server-Timing"],
+            r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="[1-9]\d* queries", serialize;dur=[\d.]+$',
+        )
+        with override_settings(SERVER_TIMING_ENABLED=False):
+            self.assertFalse(self.client.get(reverse("city-list")).has_header("Server-Timing"))
+
+    def test_requests_are_recorded_per_view(self):
+        with mock.patch.object(instrumentation, "record") as record:
+            response = self.client.get(reverse("city-forecast", args=[self.city.id]))
+            with override_settings(METRICS_ENABLED=True, METRICS_TOKEN=""):
+                self.client.get(reverse("metrics"))
+        record.assert_called_once()   # /metrics itself is not recorded
+        view, stats, total, size = record.call_args.args
+        self.assertEqual(view, "city-forecast")
+        self.assertEqual(stats.db_count, 2)
+        self.assertIn("serialize", stats.phases)
+        self.assertGreater(total, 0)
+        self.assertEqual(size, len(response.content))
+
+    def test_serialize_phase_runs_no_queries(self):
+        phases = []
+        real_timed = instrumentation.timed
+
+        @contextmanager
+        def counting_timed(phase):
+            before = len(ctx.captured_queries)
+            with real_timed(phase):
+                yield
+            phases.append((phase, len(ctx.captured_queries) - before))
+
+        requests = [
+            ("city-list", [], {}),
+            ("city-list", [], {"since": 0}),
+            ("watershed-list", [], {}),
+            ("city-forecast", [self.city.id], {}),
+            ("city-history", [self.city.id], {}),
+            ("city-history", [self.city.id], {"granularity": "day"}),
+            ("rule-list", [], {}),
+        ]
+        with CaptureQueriesContext(connection) as ctx, mock.patch("dashboard_app.views.timed", counting_timed):
+            for name, args, params in requests:
+                with self.subTest(view=name, params=params):
+                    self.assertEqual(self.client.get(reverse(name, args=args), params).status_code, 200)
+        self.assertEqual(phases, [("serialize", 0)] * len(requests))
+
+    def test_metrics_access(self):
+        url = reverse("metrics")
+        with override_settings(METRICS_ENABLED=False, METRICS_TOKEN=""):
+            self.assertEqual(self.client.get(url).status_code, 404)
+        with override_settings(METRICS_ENABLED=True, METRICS_TOKEN=""):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        with override_settings(METRICS_ENABLED=True, METRICS_TOKEN="s3cret"):
+            for headers in ({}, {"Authorization": "Bearer wrong"}, {"Authorization": "s3cret"}):
+                with self.subTest(headers=headers):
+                    self.assertEqual(self.client.get(url, headers=headers).status_code, 401)
+            self.client.get(reverse("city-list"))
+            response = self.client.get(url, headers={"Authorization": "Bearer s3cret"})
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('ews_http_request_duration_seconds_count{view="city-list"}', response.content.decode())
+
+
+class SeriesNegotiationTests(TestCase):
+    FORECAST_VIEWS = ("city-forecast", "city-forecast-async")
+
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.generate(cities=3, watersheds=1)
+        cls.city = AfricanCity.objects.order_by("id").first()
+        cls.series = forecast_series(
+            PrecipitationRecords.objects.filter(city=cls.city)
+            .order_by("date").values_list("city_id", "date", "precipitation")
+        )
+
+    def get(self, name, **kwargs):
+        return self.client.get(reverse(name, args=[self.city.id]), **kwargs)
+
+    def test_legacy_json_by_default(self):
+        for name in self.FORECAST_VIEWS:
+            with self.subTest(view=name):
+                response = self.get(name)
+                self.assertEqual(response["Content-Type"], "application/json")
+                self.assertEqual(len(response.json()), self.series["days"])
+
+    def test_columnar_by_format_or_accept(self):
+        for name in self.FORECAST_VIEWS:
+            for kwargs in ({"data": {"format": "columnar"}},
+                           {"headers": {"Accept": "application/vnd.ews.series+json"}}):
+                with self.subTest(view=name, request=kwargs):
+                    response = self.get(name, **kwargs)
+                    self.assertEqual(response["Content-Type"], "application/vnd.ews.series+json")
+                    payload = json.loads(response.content)
+                    self.assertEqual(payload["start_date"], self.series["start_date"].isoformat())
+                    self.assertEqual(payload["series"], self.series["series"])
+
+    @skipUnless(find_spec("msgpack"), "msgpack is not installed")
+    def test_msgpack(self):
+        import msgpack
+
+        for name in self.FORECAST_VIEWS:
+            with self.subTest(view=name):
+                response = self.get(name, headers={"Accept": "application/msgpack"})
+                self.assertEqual(response["Content-Type"], "application/msgpack")
+                payload = msgpack.unpackb(response.content)
+                self.assertEqual(payload["days"], self.series["days"])
+                self.assertEqual(payload["series"], self.series["series"])
+
+    @skipUnless(find_spec("pyarrow"), "pyarrow is not installed")
+    def test_arrow(self):
+        import pyarrow as pa
+
+        values = self.series["series"][0]["values"]
+        for name in self.FORECAST_VIEWS:
+            with self.subTest(view=name):
+                response = self.get(name, data={"format": "arrow"})
+                self.assertEqual(response["Content-Type"], "application/vnd.apache.arrow.stream")
+                table = pa.ipc.open_stream(response.content).read_all()
+                self.assertEqual(table.column("city_id").to_pylist(), [self.city.id] * len(values))
+                self.assertEqual(table.column("date").to_pylist()[0], self.series["start_date"])
+                self.assertEqual(table.column("precipitation").to_pylist(),
+                                 pa.array(values, pa.float32()).to_pylist())
+
+    def test_errors_are_json_whatever_the_format(self):
+        formats = ["columnar"] + [fmt for fmt, package in (("msgpack", "msgpack"), ("arrow", "pyarrow"))
+                                  if find_spec(package)]
+        for fmt in formats:
+            with self.subTest(format=fmt):
+                for name in self.FORECAST_VIEWS:
+                    response = self.client.get(reverse(name, args=[0]), {"format": fmt})
+                    self.assertEqual(response.status_code, 404)
+                    self.assertEqual(response["Content-Type"], "application/json")
+                    self.assertEqual(response.json(), {"detail": "City not found."})
+                response = self.client.get(reverse("forecast-bulk"), {"format": fmt})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response["Content-Type"], "application/json")
+                self.assertIn("ids", response.json())
+
+
+class ShardingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.generate(cities=60, watersheds=10)
+        # a city outside every basin lands in shard 0 when sharding by watershed
+        AfricanCity.objects.filter(pk=AfricanCity.objects.order_by("id").first().pk).update(watershed=None)
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard("0/1"), (0, 1))
+        self.assertEqual(parse_shard("3/8"), (3, 8))
+        for spec in ("8/8", "-1/4", "1/0", "1", "a/b", "1/2/3"):
+            with self.subTest(spec=spec), self.assertRaises(ValueError):
+                parse_shard(spec)
+
+    def test_shards_partition_the_cities(self):
+        all_ids = set(AfricanCity.objects.values_list("id", flat=True))
+        for shard_by in ("id", "watershed"):
+            with self.subTest(shard_by=shard_by):
+                shards = [set(shard_queryset(i, 4, shard_by).values_list("id", flat=True)) for i in range(4)]
+                self.assertEqual(sum(len(ids) for ids in shards), len(all_ids))
+                self.assertEqual(set().union(*shards), all_ids)
+        self.assertEqual(set(shard_queryset(0, 1).values_list("id", flat=True)), all_ids)
+
+    def test_watershed_shards_keep_basins_together(self):
+        shard_of = {}
+        for index in range(3):
+            for watershed_id in shard_queryset(index, 3, "watershed").values_list("watershed_id", flat=True):
+                self.assertEqual(shard_of.setdefault(watershed_id, index), index)
+
+    @override_settings(OWM_MAX_CONCURRENT=50, OWM_REQUESTS_PER_SECOND=50)
+    def test_rate_budget_is_split_across_shards(self):
+        self.assertEqual(shard_rate_limits(1), (50, 0.02))
+        self.assertEqual(shard_rate_limits(4), (12, 0.08))
+        self.assertEqual(shard_rate_limits(100)[0], 1)
+        with override_settings(OWM_REQUESTS_PER_SECOND=0):
+            self.assertEqual(shard_rate_limits(4)[1], 0.0)
+
+
+class ArchiveTests(TestCase):
+    LOWER, UPPER = date(2026, 10, 16), date(2026, 10, 26)
+    AUGUST, SEPTEMBER = date(2026, 8, 1), date(2026, 9, 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.generate(cities=2, watersheds=1)
+        PrecipitationRecords.objects.all().delete()
+        cls.city, cls.other = AfricanCity.objects.order_by("id")
+        PrecipitationRecords.objects.bulk_create([
+            PrecipitationRecords(city=cls.city, date=day, precipitation=value)
+            for day, value in (
+                (date(2026, 8, 30), 0.0),
+                (date(2026, 8, 31), 4.0),
+                (date(2026, 9, 1), 2.0),
+                (date(2026, 9, 2), 6.0),
+                (date(2026, 10, 20), 1.0),   # inside the window: stays
+                (date(2026, 10, 30), 3.0),   # past the window: dropped, not archived
+            )
+        ] + [PrecipitationRecords(city=cls.other, date=date(2026, 9, 15), precipitation=None)])
+
+    def archived(self):
+        return dict(PrecipitationArchive.objects.filter(city_id=self.city.id).values_list("date", "precipitation"))
+
+    def rollup(self, city, month):
+        return PrecipitationMonthlyRollup.objects.values(
+            "days", "wet_days", "total", "mean", "max"
+        ).get(city_id=city.id, month=month)
+
+    def test_move_batch_archives_past_rows_and_drops_future_ones(self):
+        with transaction.atomic():
+            deleted, months = move_batch(self.LOWER, self.UPPER, batch_size=100)
+        self.assertEqual(deleted, 7)
+        self.assertEqual(months, {self.AUGUST, self.SEPTEMBER})
+        self.assertEqual(self.archived(), {
+            date(2026, 8, 30): 0.0, date(2026, 8, 31): 4.0, date(2026, 9, 1): 2.0, date(2026, 9, 2): 6.0,
+        })
+        self.assertEqual(list(PrecipitationRecords.objects.values_list("date", flat=True)), [date(2026, 10, 20)])
+
+    def test_archiving_a_day_again_replaces_it(self):
+        with transaction.atomic():
+            move_batch(self.LOWER, self.UPPER, batch_size=100)
+        PrecipitationRecords.objects.create(city=self.city, date=date(2026, 9, 1), precipitation=9.0)
+        with transaction.atomic():
+            self.assertEqual(move_batch(self.LOWER, self.UPPER, batch_size=100), (1, {self.SEPTEMBER}))
+        self.assertEqual(self.archived()[date(2026, 9, 1)], 9.0)
+        self.assertEqual(PrecipitationArchive.objects.filter(city_id=self.city.id).count(), 4)
+
+    def test_archive_and_prune_in_batches_refreshes_rollups(self):
+        with CaptureQueriesContext(connection) as ctx:
+            pruned, months = archive_and_prune(self.LOWER, self.UPPER, batch_size=2)
+        self.assertEqual((pruned, months), (7, {self.AUGUST, self.SEPTEMBER}))
+        moves = [q for q in ctx.captured_queries if "DELETE FROM dashboard_app_precipitationrecords" in q["sql"]]
+        self.assertEqual(len(moves), 4)   # 2 + 2 + 2 + 1
+        self.assertEqual(self.rollup(self.city, self.AUGUST),
+                         {"days": 2, "wet_days": 1, "total": 4.0, "mean": 2.0, "max": 4.0})
+        self.assertEqual(self.rollup(self.city, self.SEPTEMBER),
+                         {"days": 2, "wet_days": 2, "total": 8.0, "mean": 4.0, "max": 6.0})
+        # a month of missing values still counts its days
+        self.assertEqual(self.rollup(self.other, self.SEPTEMBER),
+                         {"days": 1, "wet_days": 0, "total": 0.0, "mean": None, "max": None})
+
+    def test_refresh_rollups_updates_existing_months(self):
+        archive_and_prune(self.LOWER, self.UPPER, batch_size=100)
+        PrecipitationArchive.objects.filter(city_id=self.city.id, date=date(2026, 8, 30)).update(precipitation=8.0)
+        self.assertEqual(refresh_rollups({self.AUGUST}), 1)
+        self.assertEqual(self.rollup(self.city, self.AUGUST),
+                         {"days": 2, "wet_days": 2, "total": 12.0, "mean": 6.0, "max": 8.0})
+        self.assertEqual(refresh_rollups(set()), 0)
+
+    def test_history_endpoint(self):
+        archive_and_prune(self.LOWER, self.UPPER, batch_size=100)
+        url = reverse("city-history", args=[self.city.id])
+        params = {"from": "2026-08-15", "to": "2026-09-30"}
+
+        payload = self.client.get(url, params).json()
+        self.assertEqual((payload["city_id"], payload["from"], payload["to"], payload["granularity"]),
+                         (self.city.id, "2026-08-15", "2026-09-30", "month"))
+        self.assertEqual([(r["month"], r["days"], r["total"]) for r in payload["results"]],
+                         [("2026-08-01", 2, 4.0), ("2026-09-01", 2, 8.0)])
+
+        payload = self.client.get(url, {**params, "from": "2026-08-31", "granularity": "day"}).json()
+        self.assertEqual(payload["results"], [
+            {"date": "2026-08-31", "precipitation": 4.0},
+            {"date": "2026-09-01", "precipitation": 2.0},
+            {"date": "2026-09-02", "precipitation": 6.0},
+        ])
+
+        self.assertEqual(self.client.get(reverse("city-history", args=[0]), params).status_code, 404)
+        for bad in ({"from": "2026-09-30", "to": "2026-08-01"}, {"to": "30/09/2026"},
+                    {"granularity": "week"},
+                    {"from": "2024-01-01", "to": "2026-01-01", "granularity": "day"}):
+            with self.subTest(params=bad):
+                self.assertEqual(self.client.get(url, bad).status_code, 400)
+
+
+class StagingTests(TestCase):
+    COMMAND = "dashboard_app.management.commands.import_precipitation"
+
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.generate(cities=3, watersheds=1)
+        cls.city, cls.other, _ = AfricanCity.objects.order_by("id")
+        cls.today = date.today()
+
+    def precipitation(self, city, day):
+        return PrecipitationRecords.objects.get(city=city, date=day).precipitation
+
+    def fetching(self, records, pop_map):
+        async def fetch_all(cities, stats, shards=1):
+            return list(records), dict(pop_map)
+
+        return mock.patch(f"{self.COMMAND}.fetch_all", fetch_all)
+
+    def import_precipitation(self, **options):
+        call_command("import_precipitation", stdout=io.StringIO(), **options)
+
+    def staged_runs(self):
+        return set(StagedPrecipitation.objects.values_list("run_id", flat=True))
+
+    def test_staging_tables_are_unlogged(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT relname, relpersistence FROM pg_class WHERE relname IN (%s, %s)",
+                [StagedPrecipitation._meta.db_table, StagedPopulation._meta.db_table],
+            )
+            self.assertEqual(dict(cursor.fetchall()), {
+                StagedPrecipitation._meta.db_table: "u",
+                StagedPopulation._meta.db_table: "u",
+            })
+
+    def test_stage_and_clear(self):
+        stage_records("run-a", [(self.city.id, self.today, 1.0), (self.city.id, self.today, None)],
+                      {self.city.id: 10})
+        stage_records("run-b", [(self.other.id, self.today, 3.0)], {})
+        stage_records("run-old", [(self.other.id, self.today, 4.0)], {self.other.id: 20})
+        long_ago = timezone.now() - timedelta(days=2)
+        StagedPrecipitation.objects.filter(run_id="run-old").update(staged_at=long_ago)
+        StagedPopulation.objects.filter(run_id="run-old").update(staged_at=long_ago)
+
+        self.assertEqual(
+            list(StagedPrecipitation.objects.filter(run_id="run-a").order_by("id").values_list("precipitation", flat=True)),
+            [1.0, None],
+        )
+        self.assertEqual(staged_populations("run-a"), {self.city.id: 10})
+        self.assertEqual(staged_populations("run-missing"), {})
+
+        clear_staging("run-a")
+        self.assertEqual(self.staged_runs(), {"run-b", "run-old"})
+        clear_staging("run-a", stale_after=timedelta(days=1))
+        self.assertEqual(self.staged_runs(), {"run-b"})
+        self.assertFalse(StagedPopulation.objects.exists())
+
+    @override_settings(OWM_API_KEY="test-key")
+    def test_finalize_merges_what_stage_only_staged(self):
+        tomorrow = self.today + timedelta(days=1)
+        population = self.city.population + 10
+        version = DatasetVersion.current()
+        with self.fetching([(self.city.id, tomorrow, 123.25)], {self.city.id: population}):
+            self.import_precipitation(stage_only=True, run_id="run-a")
+        self.assertNotEqual(self.precipitation(self.city, tomorrow), 123.25)
+        self.assertEqual(staged_populations("run-a"), {self.city.id: population})
+        self.assertEqual(DatasetVersion.current(), version)
+
+        self.import_precipitation(finalize=True, run_id="run-a")
+        self.assertEqual(self.precipitation(self.city, tomorrow), 123.25)
+        self.city.refresh_from_db()
+        self.assertEqual(self.city.population, population)
+        self.assertGreater(DatasetVersion.current(), version)
+        self.assertEqual(self.staged_runs(), set())
+        self.assertEqual(staged_populations("run-a"), {})
+
+    @override_settings(OWM_API_KEY="test-key")
+    def test_failed_run_clears_its_staging(self):
+        stage_records("run-b", [(self.other.id, self.today, 3.0)], {})   # a run still being staged
+        with (
+            self.fetching([(self.city.id, self.today, 123.25)], {self.city.id: 10}),
+            mock.patch(f"{self.COMMAND}.prune_records", side_effect=RuntimeError("boom")),
+            self.assertRaisesMessage(RuntimeError, "boom"),
+        ):
+            self.import_precipitation(run_id="run-a")
+        self.assertEqual(self.staged_runs(), {"run-b"})
+        self.assertEqual(staged_populations("run-a"), {})
+
+    def test_failed_finalize_keeps_staging_for_a_retry(self):
+        tomorrow = self.today + timedelta(days=1)
+        stage_records("run-a", [(self.city.id, tomorrow, 123.25)], {})
+        with (
+            mock.patch(f"{self.COMMAND}.prune_records", side_effect=RuntimeError("boom")),
+            self.assertRaisesMessage(RuntimeError, "boom"),
+        ):
+            self.import_precipitation(finalize=True, run_id="run-a")
+        self.assertEqual(self.staged_runs(), {"run-a"})
+
+        self.import_precipitation(finalize=True, run_id="run-a")
+        self.assertEqual(self.precipitation(self.city, tomorrow), 123.25)
+        self.assertEqual(self.staged_runs(), set())
+
+    def test_merge_staged_keeps_the_latest_staged_value(self):
+        tomorrow, later = self.today + timedelta(days=1), self.today + timedelta(days=20)
+        unchanged = self.precipitation(self.city, self.today)
+        other_before = self.precipitation(self.other, self.today)
+        before = PrecipitationRecords.objects.count()
+        version = DatasetVersion.current()
+        # two shards overlapping on (city, tomorrow): the row staged last wins
+        stage_records("run-a", [(self.city.id, self.today, unchanged), (self.city.id, tomorrow, 123.25)], {})
+        stage_records("run-a", [(self.city.id, tomorrow, 45.5), (self.city.id, later, 1.0)], {})
+        stage_records("run-b", [(self.other.id, self.today, 999.0)], {})
+
+        with transaction.atomic():
+            self.assertEqual(merge_staged("run-a"), 2)   # one update, one insert
+        self.assertEqual(self.precipitation(self.city, self.today), unchanged)
+        self.assertEqual(self.precipitation(self.city, tomorrow), 45.5)
+        self.assertEqual(self.precipitation(self.city, later), 1.0)
+        self.assertEqual(self.precipitation(self.other, self.today), other_before)   # another run's rows
+        self.assertEqual(PrecipitationRecords.objects.count(), before + 1)
+        # precipitation is not versioned: merging alone does not bump
+        self.assertEqual(DatasetVersion.current(), version)
+
+        with transaction.atomic():
+            self.assertEqual(merge_staged("run-a"), 0)   # nothing left to change
+
+    def test_staged_populations_bump_the_version_once(self):
+        version = DatasetVersion.current()
+        stage_records("run-a", [], {self.city.id: self.city.population + 10, self.other.id: self.other.population})
+        with transaction.atomic():
+            self.assertEqual(update_populations(staged_populations("run-a")), 1)
+        self.assertEqual(DatasetVersion.current(), version + 1)
+        self.city.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(self.city.updated_version, version + 1)
+        self.assertLess(self.other.updated_version, version + 1)
+
+
+def rolling_max_loop(values, window):
+    """The per-city loop window_maxima replaced, kept as the reference."""
+    max_sum = window_sum = 0.0
+    dq = deque()
+    for v in values:
+        dq.append(v)
+        window_sum += v
+        if len(dq) > window:
+            window_sum -= dq.popleft()
+        max_sum = max(max_sum, window_sum)
+    return max_sum
+
+
+class WarningEvaluationTests(SimpleTestCase):
+    def test_window_maxima_matches_rolling_loop(self):
+        rng = np.random.default_rng(7)
+        values = np.round(rng.exponential(6.0, size=(200, 11)) * (rng.random((200, 11)) < 0.6), 1)
+        windows = rng.integers(1, 12, size=200)
+        maxima = window_maxima(values, windows)
+        for row, window, got in zip(values, windows, maxima):
+            self.assertAlmostEqual(got, rolling_max_loop(row.tolist(), window), places=6)
+
+    def test_missing_days_count_as_zero(self):
+        # 8 mm on days 1 and 3, nothing recorded on day 2: a 2-day window
+        # never holds both, whereas skipping the gap would sum them to 16
+        matrix = PrecipitationMatrix(
+            [1], np.array([[8.0, 0.0, 8.0]]), np.array([[True, False, True]])
+        )
+        rules = RuleSet()
+        rules.default = Thresholds(2, 10, 40)
+        self.assertEqual(window_maxima(matrix.values, np.array([2])).tolist(), [8.0])
+        self.assertEqual(evaluate_cities([(1, "KE", None)], matrix, rules), {1: "green"})
+
+    def test_classify_matches_level_for(self):
+        maxima = np.array([0.0, 10.0, 10.000001, 40.0, 40.5, 100.0])
+        orange = np.full(len(maxima), 10.0)
+        red = np.full(len(maxima), 40.0)
+        self.assertEqual(
+            [LEVELS[i] for i in classify(maxima, orange, red)],
+            [level_for(m, DEFAULT_THRESHOLDS) for m in maxima],
+        )
+        self.assertEqual([LEVELS[i] for i in classify(maxima, orange, red)],
+                         ["green", "green", "orange", "orange", "red", "red"])
+
+    def test_rule_precedence(self):
+        rules = RuleSet([
+            WarningRule(scope="watershed", watershed_id=5, window_days=2, orange_threshold=1, red_threshold=2),
+            WarningRule(scope="global", window_days=3, orange_threshold=5, red_threshold=6),
+            WarningRule(scope="country", country_code="KE", window_days=4, orange_threshold=7, red_threshold=8),
+            # a later rule of the same scope and target replaces the earlier one
+            WarningRule(scope="country", country_code="KE", window_days=5, orange_threshold=9, red_threshold=10),
+        ])
+        self.assertEqual(rules.for_city("KE", 5), Thresholds(2, 1, 2))
+        self.assertEqual(rules.for_city("KE", 6), Thresholds(5, 9, 10))
+        self.assertEqual(rules.for_city("NG", 6), Thresholds(3, 5, 6))
+        self.assertEqual(rules.for_city("NG", None), Thresholds(3, 5, 6))
+        # watersheds skip country rules
+        self.assertEqual(rules.for_watershed(5), Thresholds(2, 1, 2))
+        self.assertEqual(rules.for_watershed(6), Thresholds(3, 5, 6))
+        self.assertEqual(RuleSet().for_city("KE", 5), DEFAULT_THRESHOLDS)
+
+    def test_watershed_means_and_weights(self):
+        # city 1: 12 mm/day, city 2: nothing; one 1-day-window basin
+        matrix = PrecipitationMatrix(
+            [1, 2], np.array([[12.0], [0.0]]), np.array([[True], [True]])
+        )
+        cities = [(1, "KE", 9), (2, "KE", 9)]
+        rules = RuleSet()
+        rules.default = Thresholds(1, 5, 10)
+        self.assertEqual(evaluate_watersheds(cities, matrix, rules), {9: "orange"})  # mean 6
+        self.assertEqual(evaluate_watersheds(cities, matrix, rules, {1: 9, 2: 1}), {9: "red"})  # 10.8
+        self.assertEqual(evaluate_watersheds(cities, matrix, rules, {1: 1, 2: 9}), {9: "green"})  # 1.2
+        # all-zero weights fall back to the plain mean
+        self.assertEqual(evaluate_watersheds(cities, matrix, rules, {1: 0, 2: 0}), {9: "orange"})
+
+
+class WarningWriteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.generate(cities=16, watersheds=2)
+        # 3 mm every day: 12 mm over the default 4-day window, i.e. orange
+        PrecipitationRecords.objects.update(precipitation=3.0)
+        AfricanCity.objects.update(warning_level="green")
+
+    def current(self, cities):
+        return {c.pk: (c.city, {"warning_level": c.warning_level}) for c in cities}
+
+    def test_apply_levels_writes_and_logs_transitions(self):
+        first, second = AfricanCity.objects.order_by("id")[:2]
+        version = DatasetVersion.current()
+        changed = _apply_levels(
+            AfricanCity, "city", self.current([first, second]),
+            {first.pk: {"warning_level": "red"}, second.pk: {"warning_level": "green"}},
+        )
+        self.assertEqual(changed, 1)
+        self.assertEqual(DatasetVersion.current(), version + 1)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.warning_level, first.updated_version), ("red", version + 1))
+        self.assertEqual(second.warning_level, "green")
+        self.assertLess(second.updated_version, version + 1)
+        log = list(WarningChange.objects.values_list("entity_type", "entity_id", "entity_name", "old_level", "new_level"))
+        self.assertEqual(log, [("city", first.pk, first.city, "green", "red")])
+
+    def test_apply_levels_without_changes_writes_nothing(self):
+        cities = list(AfricanCity.objects.order_by("id")[:3])
+        version = DatasetVersion.current()
+        with CaptureQueriesContext(connection) as ctx:
+            changed = _apply_levels(
+                AfricanCity, "city", self.current(cities),
+                {c.pk: {"warning_level": c.warning_level} for c in cities},
+            )
+        self.assertEqual((changed, len(ctx.captured_queries)), (0, 0))
+        self.assertEqual(DatasetVersion.current(), version)
+
+    def test_only_warning_level_transitions_are_logged(self):
+        watershed = Watershed.objects.order_by("id").first()
+        fields = ("warning_level", "population_warning_level", "area_warning_level")
+        current = {watershed.pk: (watershed.name, {f: getattr(watershed, f) for f in fields})}
+        new = {watershed.pk: {**current[watershed.pk][1], "area_warning_level": "red"}}
+        self.assertEqual(_apply_levels(Watershed, "watershed", current, new, version=99), 1)
+        watershed.refresh_from_db()
+        self.assertEqual((watershed.area_warning_level, watershed.updated_version), ("red", 99))
+        self.assertFalse(WarningChange.objects.exists())
+
+    def test_recompute_applies_rules(self):
+        code = AfricanCity.objects.order_by("id").values_list("country_code", flat=True).first()
+        WarningRule.objects.create(
+            name="strict", scope="country", country_code=code, window_days=4,
+            orange_threshold=5, red_threshold=11,
+        )
+        recompute_city_warnings()
+        levels = dict(AfricanCity.objects.values_list("country_code", "warning_level").distinct())
+        self.assertEqual(levels.pop(code), "red")
+        self.assertEqual(set(levels.values()), {"orange"})
+
+    def test_preview_rule_reports_without_writing(self):
+        recompute_city_warnings()
+        recompute_watershed_warnings()
+        code = AfricanCity.objects.order_by("id").values_list("country_code", flat=True).first()
+        in_country = AfricanCity.objects.filter(country_code=code).count()
+        proposed = WarningRule(
+            name="lenient", scope="country", country_code=code, window_days=4,
+            orange_threshold=20, red_threshold=40,
+        )
+        changes_before = WarningChange.objects.count()
+        with CaptureQueriesContext(connection) as ctx:
+            impact = preview_rule(proposed, limit=2)
+        self.assertFalse([q for q in ctx.captured_queries if not q["sql"].lstrip().upper().startswith("SELECT")])
+        self.assertEqual(WarningChange.objects.count(), changes_before)
+
+        cities = impact["cities"]
+        self.assertEqual(cities["changed"], in_country)
+        self.assertEqual(len(cities["changes"]), min(2, in_country))
+        self.assertEqual(cities["current"]["orange"], AfricanCity.objects.count())
+        self.assertEqual(cities["proposed"]["green"], in_country)
+        self.assertTrue(all(c["from"] == "orange" and c["to"] == "green" for c in cities["changes"]))
+        # country rules don't apply to watersheds
+        self.assertEqual(impact["watersheds"]["changed"], 0)
+        self.assertEqual(set(AfricanCity.objects.filter(country_code=code).values_list("warning_level", flat=True)),
+                         {"orange"})
+
+    def test_preview_rule_uses_the_configured_watershed_mode(self):
+        # one basin of three cities; only the most populous one gets rain
+        watershed = Watershed.objects.order_by("id").first()
+        wet, *dry = AfricanCity.objects.order_by("id")[:3]
+        AfricanCity.objects.filter(pk__in=[wet.pk, *(c.pk for c in dry)]).update(watershed=watershed)
+        AfricanCity.objects.exclude(pk=wet.pk).update(population=1)
+        AfricanCity.objects.filter(pk=wet.pk).update(population=1_000_000)
+        PrecipitationRecords.objects.update(precipitation=0.0)
+        PrecipitationRecords.objects.filter(city=wet).update(precipitation=10.0)
+        proposed = WarningRule(name="daily", scope="global", window_days=1, orange_threshold=5, red_threshold=9)
+
+        def proposed_level(mode):
+            with override_settings(WATERSHED_WARNING_MODE=mode):
+                changes = preview_rule(proposed)["watersheds"]["changes"]
+            return {c["id"]: c["to"] for c in changes}.get(watershed.pk, "unchanged")
+
+        # population-weighted: ~10 mm/day → red; plain mean of 3+ cities: at most ~3.3 mm/day
+        self.assertEqual(proposed_level("population"), "red")
+        self.assertIn(proposed_level("mean"), ("green", "unchanged"))
+
+
+# "default" stands in for the replica alias so no second database is needed
+@override_settings(REPLICA_DATABASE="default")
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    def test_reads_use_primary_outside_replica_views(self):
+        self.assertIsNone(self.router.db_for_read(AfricanCity))
+
+    def test_replica_views_read_from_replica_and_write_to_primary(self):
+        with reading_from_replica(RequestFactory().get("/api/cities/")):
+            self.assertEqual(self.router.db_for_read(AfricanCity), "default")
+            self.assertEqual(self.router.db_for_write(AfricanCity), "default")
+        self.assertIsNone(self.router.db_for_read(AfricanCity))
+
+    def test_pinned_client_reads_from_primary(self):
+        request = RequestFactory().get("/api/cities/")
+        request.COOKIES[PIN_COOKIE] = "1"
+        with reading_from_replica(request):
+            self.assertIsNone(self.router.db_for_read(AfricanCity))
+
+    @override_settings(REPLICA_DATABASE="replica")
+    def test_no_replica_configured(self):
+        with reading_from_replica(RequestFactory().get("/api/cities/")):
+            self.assertIsNone(self.router.db_for_read(AfricanCity))
+
+
+class PercentileTests(SimpleTestCase):
+    def test_nearest_rank(self):
+        values = [1, 2, 3, 4, 5]
+        self.assertEqual(percentile(values, 50), 3)
+        self.assertEqual(percentile(values, 95), 5)
+        self.assertEqual(percentile(values, 20), 1)
+        self.assertEqual(percentile(values, 21), 2)
+        self.assertEqual(percentile(values, 0), 1)
+        self.assertEqual(percentile(values, 100), 5)
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertIsNone(percentile([], 50))
+
+
+class RangedFileResponseTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "00000001-20261019T120000" / "cities.parquet"
+        self.path.parent.mkdir()
+        self.path.write_bytes(bytes(range(100)))
+        self.etag = f'"{self.path.parent.name}-{self.path.name}-100"'
+
+    def get(self, **headers):
+        request = RequestFactory().get("/", headers=headers)
+        response = ranged_file_response(request, self.path, "application/octet-stream")
+        body = b"".join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, body
+
+    def test_ranges(self):
+        cases = [
+            ("bytes=10-19", 206, bytes(range(10, 20)), "bytes 10-19/100"),
+            ("bytes=90-", 206, bytes(range(90, 100)), "bytes 90-99/100"),
+            ("bytes=-5", 206, bytes(range(95, 100)), "bytes 95-99/100"),
+            ("bytes=95-500", 206, bytes(range(95, 100)), "bytes 95-99/100"),
+            ("bytes=100-", 416, b"", "bytes */100"),
+        ]
+        for header, status_code, body, content_range in cases:
+            with self.subTest(range=header):
+                response, content = self.get(Range=header)
+                self.assertEqual(response.status_code, status_code)
+                self.assertEqual(content, body)
+                self.assertEqual(response["Content-Range"], content_range)
+
+    def test_invalid_or_unsupported_range_sends_whole_file(self):
+        for header in ("bytes=20-10", "bytes=-", "bytes=0-1,5-6", "items=0-5"):
+            with self.subTest(range=header):
+                response, content = self.get(Range=header)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(content, bytes(range(100)))
+
+    def test_if_range(self):
+        response, content = self.get(Range="bytes=0-9", If_Range=self.etag)
+        self.assertEqual((response.status_code, content), (206, bytes(range(10))))
+        response, content = self.get(Range="bytes=0-9", If_Range='"stale"')
+        self.assertEqual((response.status_code, len(content)), (200, 100))
+        self.assertEqual(response["ETag"], self.etag)
+
+
+class SnapshotPruneTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+
+    def make(self, name, age=0):
+        path = self.root / name
+        path.mkdir()
+        if age:
+            mtime = datetime.now().timestamp() - age
+            os.utime(path, (mtime, mtime))
+        return path
+
+    def test_keeps_the_newest_snapshots_of_either_name_format(self):
+        for name in ("00000001-20261018T120000", "00000002-20261019T120000000001",
+                     "00000002-20261019T120000500000", "00000003-20261019T130000", "not-a-snapshot"):
+            self.make(name)
+        self.assertEqual(prune_snapshots(2, root=self.root),
+                         ["00000001-20261018T120000", "00000002-20261019T120000000001"])
+        self.assertEqual(sorted(p.name for p in self.root.iterdir()),
+                         ["00000002-20261019T120000500000", "00000003-20261019T130000", "not-a-snapshot"])
+        self.assertEqual(prune_snapshots(0, root=self.root), [])
+
+    def test_removes_stale_temporary_directories(self):
+        stale = self.make(".00000004-20261019T140000000000.tmp", age=2 * 3600)
+        running = self.make(".00000004-20261019T140500000000.tmp")
+        self.assertEqual(prune_snapshots(0, root=self.root, stale_tmp_age=3600), [])
+        self.assertFalse(stale.exists())
+        self.assertTrue(running.exists())
+
+    def test_snapshot_file_path(self):
+        for name in ("00000001-20261018T120000", "00000002-20261019T120000500000"):
+            (self.make(name) / "manifest.json").write_text("{}")
+        with override_settings(SNAPSHOT_ROOT=str(self.root)):
+            for name in ("00000001-20261018T120000", "00000002-20261019T120000500000"):
+                with self.subTest(snapshot=name):
+                    self.assertEqual(snapshot_file_path(name, "manifest.json"), self.root / name / "manifest.json")
+            for name, filename in (("00000002-20261019T1200005", "manifest.json"),
+                                   ("..", "manifest.json"),
+                                   ("00000001-20261018T120000", "cities.parquet"),
+                                   ("00000001-20261018T120000", "secret.txt")):
+                with self.subTest(snapshot=name, filename=filename), self.assertRaises(Http404):
+                    snapshot_file_path(name, filename)
+
+
+@skipUnless(find_spec("pyarrow"), "pyarrow is not installed")
+class SnapshotExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.generate(cities=5, watersheds=2)
+
+    def test_consecutive_exports_get_their_own_directory(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            first = export_snapshot(root=root)
+            second = export_snapshot(root=root)
+            self.assertNotEqual(first["snapshot"], second["snapshot"])
+            self.assertEqual(first["dataset_version"], second["dataset_version"])
+            for manifest in (first, second):
+                self.assertRegex(manifest["snapshot"], r"^\d{8}-\d{8}T\d{12}$")
+                self.assertEqual(json.loads((root / manifest["snapshot"] / "manifest.json").read_text()), manifest)
+            self.assertEqual(json.loads((root / "latest.json").read_text()), second)
+            self.assertEqual(sorted(p.name for p in root.iterdir()),
+                             sorted([first["snapshot"], second["snapshot"], "latest.json"]))
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    BODY = json.dumps([{"date": "2026-10-19", "precipitation": 1.5}] * 50)
+
+    def compress(self, response, accept_encoding="gzip, deflate, br", brotli=True):
+        request = RequestFactory().get("/", headers={"Accept-Encoding": accept_encoding})
+        middleware = CompressionMiddleware(lambda request: response)
+        if not brotli:
+            middleware.brotli = None
+        return middleware(request)
+
+    @skipUnless(find_spec("brotli"), "brotli is not installed")
+    def test_brotli_for_api_payloads(self):
+        import brotli
+
+        for content_type in CompressionMiddleware.BROTLI_MEDIA_TYPES:
+            with self.subTest(content_type=content_type):
+                response = HttpResponse(self.BODY, content_type=content_type)
+                response["ETag"] = '"v42"'
+                response = self.compress(response)
+                self.assertEqual(response["Content-Encoding"], "br")
+                self.assertEqual(brotli.decompress(response.content).decode(), self.BODY)
+                self.assertIn("Accept-Encoding", response["Vary"])
+                self.assertEqual(response["ETag"], 'W/"v42"')
+
+    def test_gzip_without_br_support(self):
+        cases = [
+            ("application/json", "gzip, deflate", True),
+            ("application/json", "gzip, deflate, br", False),   # brotli not installed
+            ("text/html; charset=utf-8", "gzip, deflate, br", True),   # BREACH: never brotli for pages
+        ]
+        for content_type, accept_encoding, brotli in cases:
+            with self.subTest(content_type=content_type, accept_encoding=accept_encoding, brotli=brotli):
+                response = self.compress(HttpResponse(self.BODY, content_type=content_type),
+                                         accept_encoding, brotli)
+                self.assertEqual(response["Content-Encoding"], "gzip")
+                self.assertEqual(gzip.decompress(response.content).decode(), self.BODY)
+
+    def test_small_or_unaccepted_bodies_are_sent_as_is(self):
+        for body, accept_encoding in (("[]", "gzip, br"), (self.BODY, "identity")):
+            with self.subTest(body=body[:10], accept_encoding=accept_encoding):
+                response = self.compress(HttpResponse(body, content_type="application/json"), accept_encoding)
+                self.assertFalse(response.has_header("Content-Encoding"))
+                self.assertEqual(response.content.decode(), body)
+
+    def test_event_streams_and_ranged_files_are_left_alone(self):
+        stream = StreamingHttpResponse(iter([self.BODY]), content_type="text/event-stream")
+        response = self.compress(stream)
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(b"".join(response.streaming_content).decode(), self.BODY)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "cities.json"
+            path.write_text(self.BODY)
+            request = RequestFactory().get("/")
+            response = self.compress(ranged_file_response(request, path, "application/json"))
+            self.assertEqual(response["Accept-Ranges"], "bytes")
+            self.assertFalse(response.has_header("Content-Encoding"))
+            body = b"".join(response.streaming_content) if response.streaming else response.content
+            response.close()
+        self.assertEqual(body.decode(), self.BODY)
+
+
+class CronScheduleTests(SimpleTestCase):
+    def test_parse_field(self):
+        cases = [
+            ("*", 0, 5, {0, 1, 2, 3, 4, 5}),
+            ("5", 0, 59, {5}),
+            ("1-3", 0, 59, {1, 2, 3}),
+            ("*/15", 0, 59, {0, 15, 30, 45}),
+            ("0-30/10", 0, 59, {0, 10, 20, 30}),
+            ("10/20", 0, 59, {10, 30, 50}),
+            ("1,5,10-11", 0, 59, {1, 5, 10, 11}),
+        ]
+        for spec, low, high, expected in cases:
+            with self.subTest(spec=spec):
+                self.assertEqual(_parse_field(spec, low, high), expected)
+
+    def test_parse_field_rejects_invalid(self):
+        for spec in ("60", "5-1", "*/0", "x", "1-"):
+            with self.subTest(spec=spec), self.assertRaises(ValueError):
+                _parse_field(spec, 0, 59)
+
+    def test_expression_needs_five_fields(self):
+        with self.assertRaises(ValueError):
+            CronSchedule("* * * *")
+
+    def test_next_after(self):
+        hourly = CronSchedule("5 * * * *")
+        self.assertEqual(hourly.next_after(datetime(2026, 10, 19, 12, 4, 59)), datetime(2026, 10, 19, 12, 5))
+        self.assertEqual(hourly.next_after(datetime(2026, 10, 19, 12, 5)), datetime(2026, 10, 19, 13, 5))
+        # 2026-10-19 is a Monday; 7 is Sunday like 0
+        self.assertEqual(
+            CronSchedule("0 6 * * 7").next_after(datetime(2026, 10, 19)), datetime(2026, 10, 25, 6, 0)
+        )
+        self.assertEqual(
+            CronSchedule("30 23 31 12 *").next_after(datetime(2026, 10, 19)), datetime(2026, 12, 31, 23, 30)
+        )
+
+    def test_restricted_day_fields_match_either(self):
+        # the 1st of the month or any Friday
+        schedule = CronSchedule("0 0 1 * 5")
+        self.assertTrue(schedule.matches(datetime(2026, 10, 1)))    # Thursday the 1st
+        self.assertTrue(schedule.matches(datetime(2026, 10, 23)))   # Friday
+        self.assertFalse(schedule.matches(datetime(2026, 10, 22)))  # Thursday
+        # with one day field unrestricted both must hold
+        self.assertFalse(CronSchedule("0 0 * * 5").matches(datetime(2026, 10, 1)))
+
+
+class FakeChangeLog:
+    """In-memory stand-in for the WarningChange reads made by streams.py."""
+
+    def __init__(self):
+        self.changes = []
+
+    def add(self, count=1):
+        for _ in range(count):
+            self.changes.append(SimpleNamespace(
+                id=len(self.changes) + 1, entity_type="city", entity_id=1, entity_name="Nairobi",
+                old_level="green", new_level="red", changed_at=datetime(2026, 10, 19, 12, 0),
+            ))
+
+    async def changes_after(self, after_id, limit=streams.BATCH_SIZE):
+        return [c for c in self.changes if c.id > after_id][:limit]
+
+    async def latest_change_id(self):
+        return self.changes[-1].id if self.changes else 0
+
+
+def event_id(frame):
+    return int(frame.split("\n", 1)[0].removeprefix("id: "))
+
+
+class WarningStreamTests(SimpleTestCase):
+    def setUp(self):
+        self.log = FakeChangeLog()
+        self.broadcaster = streams.WarningChangeBroadcaster(interval=0.01)
+        patcher = mock.patch.multiple(
+            streams,
+            changes_after=self.log.changes_after,
+            latest_change_id=self.log.latest_change_id,
+            broadcaster=self.broadcaster,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_subscribers_get_new_changes_and_restart_from_the_newest(self):
+        async def scenario():
+            self.log.add(3)
+            queue = await self.broadcaster.subscribe()
+            self.assertEqual(self.broadcaster.latest_id, 3)
+            self.log.add()
+            batch = await asyncio.wait_for(queue.get(), 1)
+            self.assertEqual([c.id for c in batch], [4])
+
+            self.broadcaster.unsubscribe(queue)
+            await asyncio.wait_for(self.broadcaster._task, 1)
+            self.assertIsNone(self.broadcaster.latest_id)
+
+            # changes logged while nobody listened are not replayed
+            self.log.add(2)
+            queue = await self.broadcaster.subscribe()
+            self.assertEqual(self.broadcaster.latest_id, 6)
+            self.broadcaster.unsubscribe(queue)
+            await asyncio.wait_for(self.broadcaster._task, 1)
+
+        asyncio.run(scenario())
+
+    def test_overflowing_queue_is_replaced_by_a_reread_marker(self):
+        async def scenario():
+            queue = asyncio.Queue(maxsize=streams.QUEUE_SIZE)
+            self.broadcaster._queues.add(queue)
+            for n in range(streams.QUEUE_SIZE + 1):
+                self.broadcaster._publish([SimpleNamespace(id=n + 1)])
+            self.assertEqual(queue.qsize(), 1)
+            self.assertIsNone(queue.get_nowait())
+
+        asyncio.run(scenario())
+
+    def test_resume_from_last_event_id_then_follow_live_changes(self):
+        async def scenario():
+            self.log.add(5)
+            events = streams.warning_events(2)
+            self.assertTrue((await events.__anext__()).startswith("retry:"))
+            backlog = [event_id(await events.__anext__()) for _ in range(3)]
+            self.assertEqual(backlog, [3, 4, 5])
+            self.log.add()
+            self.assertEqual(event_id(await asyncio.wait_for(events.__anext__(), 1)), 6)
+            await events.aclose()
+            await asyncio.wait_for(self.broadcaster._task, 1)
+
+        asyncio.run(scenario())
+
+    def test_without_last_event_id_only_new_changes_are_sent(self):
+        async def scenario():
+            self.log.add(5)
+            events = streams.warning_events(None)
+            await events.__anext__()  # retry
+            self.log.add()
+            self.assertEqual(event_id(await asyncio.wait_for(events.__anext__(), 1)), 6)
+            await events.aclose()
+            await asyncio.wait_for(self.broadcaster._task, 1)
+
+        asyncio.run(scenario())
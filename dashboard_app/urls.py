@@ -1,5 +1,20 @@
 from django.urls import path
-from .views import AfricanCityListAPIView, PrecipitationForecastAPIView, WatershedListAPIView
+from .views import (
+    AfricanCityListAPIView,
+    AfricanCityListAsyncView,
+    BulkForecastAPIView,
+    CountrySummaryAPIView,
+    PrecipitationForecastAPIView,
+    PrecipitationForecastAsyncView,
+    PrecipitationHistoryAPIView,
+    SnapshotManifestView,
+    WarningRuleListAPIView,
+    WarningRulePreviewAPIView,
+    WarningStreamView,
+    WatershedListAPIView,
+    WatershedListAsyncView,
+    snapshot_file_view,
+)
 
 urlpatterns = [
     path('cities/', AfricanCityListAPIView.as_view(), name='city-list'),
@@ -8,5 +23,30 @@ urlpatterns = [
         PrecipitationForecastAPIView.as_view(),
         name="city-forecast",
     ),
+    path(
+        "cities/<int:city_id>/history/",
+        PrecipitationHistoryAPIView.as_view(),
+        name="city-history",
+    ),
     path("watersheds/", WatershedListAPIView.as_view(), name="watershed-list"),
+    path("forecasts/", BulkForecastAPIView.as_view(), name="forecast-bulk"),
+
+    # Async (ASGI) variants of the same endpoints
+    path("async/cities/", AfricanCityListAsyncView.as_view(), name="city-list-async"),
+    path(
+        "async/cities/<int:city_id>/forecast/",
+        PrecipitationForecastAsyncView.as_view(),
+        name="city-forecast-async",
+    ),
+    path("async/watersheds/", WatershedListAsyncView.as_view(), name="watershed-list-async"),
+
+    path("summary/", CountrySummaryAPIView.as_view(), name="summary"),
+
+    path("rules/", WarningRuleListAPIView.as_view(), name="rule-list"),
+    path("rules/preview/", WarningRulePreviewAPIView.as_view(), name="rule-preview"),
+
+    path("warnings/stream/", WarningStreamView.as_view(), name="warning-stream"),
+
+    path("snapshots/latest/", SnapshotManifestView.as_view(), name="snapshot-latest"),
+    path("snapshots/<str:snapshot>/<str:filename>", snapshot_file_view, name="snapshot-file"),
 ]
\ No newline at end of file
@@ -1,32 +1,237 @@
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from django.views import View
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .models import AfricanCity, PrecipitationRecords, Watershed
-from .serializers import AfricanCitySerializer, PrecipitationRecordSerializer, WatershedSerializer
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+
+from .alerts import preview_rule
+from .archive import daily_history, monthly_history
+from .instrumentation import render_metrics, timed
+from .models import (
+    AfricanCity,
+    DatasetVersion,
+    PrecipitationRecords,
+    Tombstone,
+    WarningRule,
+    Watershed,
+)
+from .renderers import (
+    FORECAST_RENDERERS,
+    SERIES_RENDERERS,
+    SeriesErrorsAsJSONMixin,
+    forecast_series,
+    select_series_renderer,
+)
+from .routers import ReplicaReadMixin
+from .serializers import (
+    AfricanCitySerializer,
+    PrecipitationArchiveSerializer,
+    PrecipitationRecordSerializer,
+    PrecipitationRollupSerializer,
+    WarningRuleSerializer,
+    WatershedSerializer,
+)
+from .snapshots import MEDIA_TYPES, latest_manifest, ranged_file_response, snapshot_file_path
+from .streams import warning_events
+from .summary import cached_summary
+
+SERIES_FORMATS = {renderer.format for renderer in SERIES_RENDERERS}
+
+
+def parse_since(params):
+    """Return the `?since=<version>` query parameter as an int (None if absent)."""
+    raw = params.get("since")
+    if raw in (None, ""):
+        return None
+    try:
+        since = int(raw)
+    except ValueError:
+        raise ValidationError({"since": "Must be an integer dataset version."})
+    if since < 0:
+        raise ValidationError({"since": "Must be >= 0."})
+    return since
+
+
+def versioned_list_response(request, queryset, serializer_class, entity_type):
+    """
+    Full list by default; with `?since=<version>` only the rows changed after
+    that version plus the ids deleted since, e.g.
+        {"version": 42, "since": 40, "changed": [...], "deleted": [17]}
+    The current dataset version is also returned in the X-Dataset-Version header.
+    """
+    since = parse_since(request.query_params)
+    # read the version first: rows stamped later are simply re-sent next time
+    version = DatasetVersion.current()
+
+    # evaluate the querysets first: the serialize phase times serialization only
+    if since is None:
+        rows = list(queryset)
+    else:
+        rows = list(queryset.filter(updated_version__gt=since))
+        deleted = list(
+            Tombstone.objects.filter(entity_type=entity_type, version__gt=since).values_list("entity_id", flat=True)
+        )
+    serializer = serializer_class(rows, many=True)
+    with timed("serialize"):
+        data = serializer.data
+    if since is not None:
+        data = {"version": version, "since": since, "changed": data, "deleted": deleted}
+
+    response = Response(data)
+    response["X-Dataset-Version"] = str(version)
+    return response
+
 
-class AfricanCityListAPIView(APIView):
+async def aversioned_list_response(request, queryset, serializer_class, entity_type):
+    """versioned_list_response for the async views, on the async ORM."""
+    try:
+        since = parse_since(request.GET)
+    except ValidationError as exc:
+        return JsonResponse(exc.detail, status=status.HTTP_400_BAD_REQUEST)
+    version = await DatasetVersion.acurrent()
+
+    if since is None:
+        rows = [row async for row in queryset]
+    else:
+        rows = [row async for row in queryset.filter(updated_version__gt=since)]
+        deleted = [
+            pk async for pk in
+            Tombstone.objects.filter(entity_type=entity_type, version__gt=since).values_list("entity_id", flat=True)
+        ]
+    serializer = serializer_class(rows, many=True)
+    with timed("serialize"):
+        data = serializer.data
+    if since is not None:
+        data = {"version": version, "since": since, "changed": data, "deleted": deleted}
+
+    response = JsonResponse(data, safe=False)
+    response["X-Dataset-Version"] = str(version)
+    return response
+
+
+class AfricanCityListAPIView(ReplicaReadMixin, APIView):
+    """
+    URL: /api/cities/            → every city
+         /api/cities/?since=<v>  → cities changed after dataset version v (+ deletions)
+    """
     def get(self, request):
-        cities = AfricanCity.objects.all()
-        serializer = AfricanCitySerializer(cities, many=True)
-        return Response(serializer.data)
+        return versioned_list_response(
+            request, AfricanCity.objects.all(), AfricanCitySerializer, "city"
+        )
 
-class PrecipitationForecastAPIView(APIView):
+class PrecipitationForecastAPIView(SeriesErrorsAsJSONMixin, ReplicaReadMixin, APIView):
     """
     Returns the next 7 days of precipitation for a given city ID.
     URL: /api/cities/<int:city_id>/forecast/
+
+    JSON list of {"date", "precipitation"} by default; the compact series
+    formats (columnar JSON, MessagePack, Arrow; see renderers.py) are chosen
+    with the Accept header or `?format=columnar|msgpack|arrow`.
     """
+    renderer_classes = FORECAST_RENDERERS
+
     def get(self, request, city_id):
+        if request.accepted_renderer.format in SERIES_FORMATS:
+            if not AfricanCity.objects.filter(pk=city_id).exists():
+                return Response({"detail": "City not found."}, status=status.HTTP_404_NOT_FOUND)
+            return Response(forecast_series(
+                PrecipitationRecords.objects
+                    .filter(city_id=city_id)
+                    .order_by("date")
+                    .values_list("city_id", "date", "precipitation")
+            ))
+
         try:
             city = AfricanCity.objects.get(pk=city_id)
         except AfricanCity.DoesNotExist:
             return Response({"detail": "City not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        records = PrecipitationRecords.objects.filter(city=city).order_by("date")
+        records = list(PrecipitationRecords.objects.filter(city=city).order_by("date"))
         serializer = PrecipitationRecordSerializer(records, many=True)
-        return Response(serializer.data)
+        with timed("serialize"):
+            data = serializer.data
+        return Response(data)
 
 
-class WatershedListAPIView(APIView):
+class BulkForecastAPIView(SeriesErrorsAsJSONMixin, ReplicaReadMixin, APIView):
+    """
+    Forecast series of many cities in one response.
+    URL: /api/forecasts/?ids=1,2,3   (`ids` required, at most MAX_IDS)
+
+    Always the columnar payload (see renderers.forecast_series); JSON by
+    default, MessagePack or Arrow through the Accept header or `?format=`.
+    """
+    renderer_classes = [JSONRenderer, *SERIES_RENDERERS]
+    MAX_IDS = 5000
+
+    def get(self, request):
+        raw_ids = request.query_params.get("ids", "")
+        try:
+            ids = sorted({int(part) for part in raw_ids.split(",") if part.strip()})
+        except ValueError:
+            raise ValidationError({"ids": "Must be a comma-separated list of city ids."})
+        if not ids:
+            raise ValidationError({"ids": "Required: a comma-separated list of city ids."})
+        if len(ids) > self.MAX_IDS:
+            raise ValidationError({"ids": f"At most {self.MAX_IDS} ids per request."})
+        records = PrecipitationRecords.objects.filter(city_id__in=ids)
+        return Response(forecast_series(
+            records.order_by("city_id", "date").values_list("city_id", "date", "precipitation")
+        ))
+
+
+class PrecipitationHistoryAPIView(APIView):
+    """
+    Archived precipitation for a city.
+    URL: /api/cities/<int:city_id>/history/?from=YYYY-MM-DD&to=YYYY-MM-DD[&granularity=day]
+
+    Monthly rollups by default (`from` defaults to one year before `to`,
+    `to` to today); `granularity=day` returns the archived daily values for
+    ranges of up to MAX_DAILY_DAYS.
+    """
+    MAX_DAILY_DAYS = 366
+
+    def get(self, request, city_id):
+        try:
+            end = date.fromisoformat(request.query_params.get("to") or date.today().isoformat())
+            start = date.fromisoformat(request.query_params.get("from") or (end - timedelta(days=365)).isoformat())
+        except ValueError:
+            raise ValidationError({"detail": "`from` and `to` must be YYYY-MM-DD dates."})
+        if start > end:
+            raise ValidationError({"detail": "`from` must not be after `to`."})
+        granularity = request.query_params.get("granularity", "month")
+        if granularity not in ("month", "day"):
+            raise ValidationError({"granularity": "Must be 'month' or 'day'."})
+
+        if not AfricanCity.objects.filter(pk=city_id).exists():
+            return Response({"detail": "City not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        if granularity == "day":
+            if (end - start).days > self.MAX_DAILY_DAYS:
+                raise ValidationError({"detail": f"Daily history is limited to {self.MAX_DAILY_DAYS} days."})
+            serializer = PrecipitationArchiveSerializer(list(daily_history(city_id, start, end)), many=True)
+        else:
+            serializer = PrecipitationRollupSerializer(list(monthly_history(city_id, start, end)), many=True)
+        with timed("serialize"):
+            data = serializer.data
+        return Response({
+            "city_id": city_id,
+            "from": start,
+            "to": end,
+            "granularity": granularity,
+            "results": data,
+        })
+
+
+class WatershedListAPIView(ReplicaReadMixin, APIView):
     def get(self, request):
         """
         Returns a list of all BV_… watersheds, each with:
@@ -34,9 +239,203 @@ class WatershedListAPIView(APIView):
           "id": ..,
           "name": "..",
           "warning_level": "..",
+          "population_warning_level": "..",   # population-weighted mean of its cities
+          "area_warning_level": "..",         # Voronoi-area-weighted mean
           "geom": { …GeoJSON MultiPolygon… }
         }
+        With `?since=<version>` only the watersheds changed after that dataset
+        version are returned, together with the ids deleted since
+        (see versioned_list_response).
         """
-        qs = Watershed.objects.all()
-        serializer = WatershedSerializer(qs, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        return versioned_list_response(
+            request, Watershed.objects.all(), WatershedSerializer, "watershed"
+        )
+
+# ───────────────────────────────────────────────────────────────────────────
+# Async variants (served under /api/async/…) for ASGI deployments.
+# DRF's APIView is sync-only, so these are plain Django class-based views
+# using the async ORM; the DRF serializers are reused on the fetched rows
+# (they don't touch the database) to keep the payloads identical.
+# ───────────────────────────────────────────────────────────────────────────
+
+class AfricanCityListAsyncView(ReplicaReadMixin, View):
+    """Async counterpart of AfricanCityListAPIView (`?since=` included)."""
+    async def get(self, request):
+        return await aversioned_list_response(
+            request, AfricanCity.objects.all(), AfricanCitySerializer, "city"
+        )
+
+
+class PrecipitationForecastAsyncView(ReplicaReadMixin, View):
+    """
+    Async counterpart of PrecipitationForecastAPIView.
+    URL: /api/async/cities/<int:city_id>/forecast/
+    """
+    async def get(self, request, city_id):
+        if not await AfricanCity.objects.filter(pk=city_id).aexists():
+            return JsonResponse({"detail": "City not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        renderer = select_series_renderer(request)
+        if renderer is not None:
+            rows = [
+                row async for row in
+                PrecipitationRecords.objects
+                    .filter(city_id=city_id)
+                    .order_by("date")
+                    .values_list("city_id", "date", "precipitation")
+            ]
+            with timed("serialize"):
+                body = renderer.render(forecast_series(rows))
+            return HttpResponse(body, content_type=renderer.media_type)
+
+        records = [
+            rec async for rec in PrecipitationRecords.objects.filter(city_id=city_id).order_by("date")
+        ]
+        serializer = PrecipitationRecordSerializer(records, many=True)
+        with timed("serialize"):
+            data = serializer.data
+        return JsonResponse(data, safe=False)
+
+
+class WatershedListAsyncView(ReplicaReadMixin, View):
+    """Async counterpart of WatershedListAPIView (`?since=` included)."""
+    async def get(self, request):
+        return await aversioned_list_response(
+            request, Watershed.objects.all(), WatershedSerializer, "watershed"
+        )
+
+
+class CountrySummaryAPIView(APIView):
+    """
+    Per-country and per-region warning counts, population at risk and the
+    worst watershed, read from the rollup rebuilt by each import.
+    URL: /api/summary/
+
+    The ETag follows the dataset version the rollup was built for, so
+    clients revalidating with If-None-Match get a 304 until the next import.
+    """
+    def get(self, request):
+        version, payload = cached_summary()
+        etag = f'"summary-{payload["dataset_version"]}"'
+        if etag in request.headers.get("If-None-Match", ""):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(payload)
+        response["ETag"] = etag
+        response["Cache-Control"] = "public, max-age=60"
+        response["X-Dataset-Version"] = str(version)
+        return response
+
+
+class WarningRuleListAPIView(APIView):
+    """
+    The warning rules (thresholds and window lengths) in the database.
+    URL: /api/rules/
+    """
+    def get(self, request):
+        serializer = WarningRuleSerializer(list(WarningRule.objects.all()), many=True)
+        with timed("serialize"):
+            data = serializer.data
+        return Response(data)
+
+
+class WarningRulePreviewAPIView(APIView):
+    """
+    Dry-run a rule change against the current precipitation data.
+    URL: POST /api/rules/preview/
+
+    The body is a rule (as in /api/rules/); with an `id` it is a partial
+    edit of that rule, otherwise a new one. Nothing is written: the response
+    has per-level counts under the active rules and under the proposed set,
+    plus the cities and watersheds whose level would change, e.g.
+        {"cities": {"current": {...}, "proposed": {...}, "changed": 12, "changes": [...]},
+         "watersheds": {...}}
+    """
+    def post(self, request):
+        instance = None
+        rule_id = request.data.get("id")
+        if rule_id is not None:
+            instance = WarningRule.objects.filter(pk=rule_id).first()
+            if instance is None:
+                return Response({"detail": "Rule not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = WarningRuleSerializer(instance, data=request.data, partial=instance is not None)
+        serializer.is_valid(raise_exception=True)
+        proposed = instance or WarningRule()
+        for field, value in serializer.validated_data.items():
+            setattr(proposed, field, value)
+
+        with timed("evaluate"):
+            impact = preview_rule(proposed)
+        return Response({"rule": WarningRuleSerializer(proposed).data, **impact})
+
+
+class WarningStreamView(View):
+    """
+    Server-Sent Events stream of warning-level transitions.
+    URL: /api/warnings/stream/
+
+    Each event has the WarningChange id as its SSE id; reconnecting clients
+    send it back in `Last-Event-ID` (or `?last_event_id=`) to resume without
+    gaps. Without one, only changes from now on are sent.
+
+    ASGI only: a WSGI server would buffer the endless response (and hold a
+    worker), so there the endpoint answers 503.
+    """
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse(
+                {"detail": "The warning stream needs the ASGI server."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        raw = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+        try:
+            last_event_id = int(raw) if raw else None
+        except ValueError:
+            return JsonResponse({"detail": "Invalid Last-Event-ID."}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(warning_events(last_event_id), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # don't let nginx buffer the stream
+        return response
+
+
+class SnapshotManifestView(APIView):
+    """
+    Manifest of the newest bulk snapshot (see export_snapshot).
+    URL: /api/snapshots/latest/
+    """
+    def get(self, request):
+        manifest = latest_manifest()
+        if manifest is None:
+            return Response({"detail": "No snapshot has been exported yet."}, status=status.HTTP_404_NOT_FOUND)
+        for entry in manifest["files"]:
+            entry["url"] = request.build_absolute_uri(
+                reverse("snapshot-file", args=[manifest["snapshot"], entry["name"]])
+            )
+        return Response(manifest)
+
+
+def snapshot_file_view(request, snapshot, filename):
+    """
+    Download a snapshot file; supports HTTP Range requests so GeoParquet
+    readers can fetch just the footer and the row groups they need.
+    URL: /api/snapshots/<snapshot>/<filename>
+    """
+    path = snapshot_file_path(snapshot, filename)
+    fmt = filename.rsplit(".", 1)[-1]
+    return ranged_file_response(request, path, MEDIA_TYPES.get(fmt, "application/json"))
+
+
+def metrics_view(request):
+    """
+    Prometheus text exposition of the request histograms. 404 unless
+    settings.METRICS_ENABLED; with METRICS_TOKEN set the scraper must send
+    `Authorization: Bearer <token>`.
+    """
+    if not settings.METRICS_ENABLED:
+        raise Http404()
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
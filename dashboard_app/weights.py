@@ -0,0 +1,106 @@
+# dashboard_app/weights.py
+"""
+Per-city weights for weighted watershed aggregation.
+
+Population weights are read straight from AfricanCity.population. Area
+weights are the areas of the cities' Voronoi cells (ST_VoronoiPolygons over
+the basin's cities, extended to the basin) clipped to the basin outline;
+they only depend on geometry, so they are cached in CityAreaWeight and
+rebuilt per watershed when an md5 of the basin geometry and its cities'
+ids/locations differs from the one stored with the weights.
+"""
+
+from django.db import connection
+
+from .models import CityAreaWeight
+
+_SIGNATURES = """
+    SELECT w.id,
+           md5(coalesce(ST_AsEWKB(w.geom), ''::bytea)
+               || coalesce(string_agg(int8send(c.id) || ST_AsEWKB(c.location), ''::bytea ORDER BY c.id),
+                           ''::bytea)) AS signature,
+           count(c.id) AS cities
+    FROM dashboard_app_watershed w
+    LEFT JOIN dashboard_app_africancity c ON c.watershed_id = w.id AND c.location IS NOT NULL
+    GROUP BY w.id
+"""
+
+
+def stale_watersheds():
+    """{watershed id: signature} of the basins whose cached weights are out of date."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            WITH current AS ({_SIGNATURES}),
+            stored AS (
+                SELECT watershed_id, min(signature) AS signature
+                FROM dashboard_app_cityareaweight
+                GROUP BY watershed_id
+            )
+            SELECT current.id, current.signature
+            FROM current LEFT JOIN stored ON stored.watershed_id = current.id
+            WHERE current.signature IS DISTINCT FROM stored.signature
+              AND (current.cities > 0 OR stored.watershed_id IS NOT NULL);
+        """)
+        return dict(cursor.fetchall())
+
+
+def refresh_area_weights():
+    """
+    Rebuild the Voronoi area weights of every stale watershed in two
+    statements. The caller owns the transaction. Returns the number of
+    watersheds rebuilt.
+    """
+    stale = stale_watersheds()
+    if not stale:
+        return 0
+    ids, signatures = list(stale), list(stale.values())
+    with connection.cursor() as cursor:
+        # also drops rows of cities that moved into one of these basins
+        cursor.execute("""
+            DELETE FROM dashboard_app_cityareaweight
+            WHERE watershed_id = ANY(%(ids)s)
+               OR city_id IN (SELECT id FROM dashboard_app_africancity WHERE watershed_id = ANY(%(ids)s));
+        """, {"ids": ids})
+        cursor.execute("""
+            WITH stale AS (
+                SELECT * FROM unnest(%(ids)s::bigint[], %(signatures)s::text[]) AS s(watershed_id, signature)
+            ), cells AS (
+                SELECT watershed_id, geom, (dump).path[1] AS cell_no, (dump).geom AS cell
+                FROM (
+                    SELECT w.id AS watershed_id, w.geom,
+                           ST_Dump(ST_VoronoiPolygons(ST_Collect(c.location), 0, w.geom)) AS dump
+                    FROM dashboard_app_watershed w
+                    JOIN stale ON stale.watershed_id = w.id
+                    JOIN dashboard_app_africancity c ON c.watershed_id = w.id AND c.location IS NOT NULL
+                    GROUP BY w.id, w.geom
+                    HAVING count(*) > 1
+                ) diagrams
+            ), shares AS (
+                -- cities sharing a location split their cell evenly
+                SELECT c.id AS city_id, cells.watershed_id,
+                       ST_Area(ST_Intersection(cells.cell, cells.geom)::geography) / 1e6
+                           / count(*) OVER (PARTITION BY cells.watershed_id, cells.cell_no) AS area_km2
+                FROM cells
+                JOIN dashboard_app_africancity c
+                  ON c.watershed_id = cells.watershed_id AND ST_Intersects(cells.cell, c.location)
+                UNION ALL
+                -- a lone city gets the whole basin (no Voronoi diagram of one point)
+                SELECT min(c.id), w.id, ST_Area(w.geom::geography) / 1e6
+                FROM dashboard_app_watershed w
+                JOIN stale ON stale.watershed_id = w.id
+                JOIN dashboard_app_africancity c ON c.watershed_id = w.id AND c.location IS NOT NULL
+                GROUP BY w.id, w.geom
+                HAVING count(*) = 1
+            )
+            INSERT INTO dashboard_app_cityareaweight (city_id, watershed_id, area_km2, signature)
+            SELECT DISTINCT ON (shares.city_id) shares.city_id, shares.watershed_id,
+                   coalesce(shares.area_km2, 0), stale.signature
+            FROM shares JOIN stale USING (watershed_id)
+            ORDER BY shares.city_id, shares.area_km2 DESC;
+        """, {"ids": ids, "signatures": signatures})
+    return len(ids)
+
+
+def area_weights():
+    """{city id: area in km²} from the cache (refresh_area_weights first)."""
+    return dict(CityAreaWeight.objects.values_list("city_id", "area_km2"))
@@ -0,0 +1,93 @@
+# gunicorn.conf.py
+"""
+Gunicorn settings for the API (`gunicorn -c gunicorn.conf.py`).
+
+The app is served over ASGI by uvicorn workers (dashboard.asgi): the
+/api/warnings/stream/ SSE endpoint and the /api/async/ views need an event
+loop, and under sync WSGI workers a stream would be buffered whole and pin
+a worker for as long as the client stays connected. Sync views still work,
+Django runs them in a thread. GUNICORN_ASGI=0 falls back to the WSGI app
+with sync workers, where the SSE endpoint answers 503.
+
+The application is loaded once in the master (preload_app) and the workers
+are forked from it, so Django, DRF, GDAL/GEOS and numpy are imported once
+and their pages shared copy-on-write instead of each worker booting its own
+copy. Everything is overridable through GUNICORN_* environment variables.
+
+With prometheus_client installed the workers share their /metrics samples
+through files in PROMETHEUS_MULTIPROC_DIR (see dashboard_app.instrumentation),
+so a scrape sees every worker, not whichever one answered it.
+"""
+
+import gc
+import multiprocessing
+import os
+import shutil
+import tempfile
+from importlib.util import find_spec
+
+if find_spec("prometheus_client"):
+    # must be set before the app (and so prometheus_client) is imported
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "ews-metrics"))
+
+ASGI = os.getenv("GUNICORN_ASGI", "1").strip().lower() in ("1", "true", "yes", "on")
+
+if ASGI:
+    wsgi_app = "dashboard.asgi:application"
+    # uvicorn's worker moved to the uvicorn-worker package; use it when present
+    default_worker = (
+        "uvicorn_worker.UvicornWorker" if find_spec("uvicorn_worker") else "uvicorn.workers.UvicornWorker"
+    )
+    # Django's persistent connections don't work under ASGI (every request
+    # runs its sync code on its own thread); use the psycopg pool instead
+    os.environ.setdefault("DB_CONN_MAX_AGE", "0")
+else:
+    wsgi_app = "dashboard.wsgi:application"
+    default_worker = "sync"
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", "1"))  # sync/gthread workers only
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", default_worker)
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+accesslog = os.getenv("GUNICORN_ACCESSLOG", "-")
+
+preload_app = True
+
+
+def on_starting(server):
+    """Start with an empty metrics directory; old workers' files would be merged in."""
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def when_ready(server):
+    """Finish warming the app in the master before any worker is forked."""
+    from django.db import connections
+    from django.urls import get_resolver
+
+    # import the URLconf and every view module now rather than on each
+    # worker's first request
+    get_resolver().url_patterns
+    # nothing opened in the master may be shared with the workers
+    connections.close_all()
+    # keep the collector from touching (and so copying) the preloaded objects
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from django.db import connections
+
+    connections.close_all()
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)